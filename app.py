@@ -6,16 +6,44 @@ from bedrock_agent_project.stacks.state_machine_stack import StateMachineStack
 from bedrock_agent_project.stacks.websocket_api_stack import WebSocketApiStack
 from bedrock_agent_project.stacks.event_bridge_stack import EventBridgeStack
 from bedrock_agent_project.stacks.custom_resource_stack import CustomResourceStack
+from bedrock_agent_project.stacks.provisioning_queue_stack import ProvisioningQueueStack
 
 app = cdk.App()
 
 # Create stacks
 database_stack = DatabaseStack(app, "DatabaseStack")
-lambda_stack = LambdaStack(app, "LambdaStack", database_stack.chatbot_table, database_stack.agent_table)
+lambda_stack = LambdaStack(
+    app, "LambdaStack",
+    database_stack.chatbot_table,
+    database_stack.agent_table,
+    database_stack.response_cache_table,
+    database_stack.stream_session_table,
+    database_stack.cache_bucket,
+    database_stack.collection_pool_table,
+    database_stack.readiness_table,
+    database_stack.documents_bucket,
+    database_stack.provisioning_ledger_table
+)
 # The StateMachineStack now includes steps for OpenSearch collection creation and status checking
-state_machine_stack = StateMachineStack(app, "StateMachineStack", lambda_stack.functions)
-websocket_api_stack = WebSocketApiStack(app, "WebSocketApiStack", lambda_stack.functions["invoke_agent"])
-event_bridge_stack = EventBridgeStack(app, "EventBridgeStack", lambda_stack.functions["trigger_creation"])
+state_machine_stack = StateMachineStack(
+    app, "StateMachineStack",
+    lambda_stack.functions,
+    database_stack.provisioning_ledger_table,
+    database_stack.documents_bucket
+)
+websocket_api_stack = WebSocketApiStack(app, "WebSocketApiStack", lambda_stack.invocation_targets["invoke_agent"])
+provisioning_queue_stack = ProvisioningQueueStack(
+    app, "ProvisioningQueueStack",
+    state_machine_stack.state_machine,
+    database_stack.documents_bucket,
+    lambda_stack.shared_layer
+)
+event_bridge_stack = EventBridgeStack(
+    app, "EventBridgeStack",
+    lambda_stack.functions["manage_collection_pool"],
+    lambda_stack.functions["readiness_poller"],
+    lambda_stack.functions["sync_knowledge_base"]
+)
 
 # Create CustomResourceStack to update Lambda environment variables
 custom_resource_stack = CustomResourceStack(
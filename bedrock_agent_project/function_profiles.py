@@ -0,0 +1,105 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from aws_cdk import Duration, aws_lambda as lambda_, aws_logs as logs
+
+@dataclass(frozen=True)
+class FunctionProfile:
+    """How one function of LambdaStack is built and run.
+
+    Functions sharing a code directory differ only by ``handler``. ``in_vpc`` is reserved for
+    functions that call OpenSearch Serverless collection endpoints, which are only reachable
+    through the collection VPC endpoint; everything else talks to public AWS APIs and skips
+    the VPC and NAT hop. ``provisioned_concurrency`` publishes a version behind a ``live``
+    alias, which is then what callers should invoke.
+    """
+    directory: str
+    handler: str = "index.handler"
+    memory_size: int = 256
+    timeout: Duration = field(default_factory=lambda: Duration.minutes(5))
+    runtime: lambda_.Runtime = field(default_factory=lambda: lambda_.Runtime.PYTHON_3_12)
+    architecture: lambda_.Architecture = field(default_factory=lambda: lambda_.Architecture.ARM_64)
+    in_vpc: bool = False
+    reserved_concurrency: Optional[int] = None
+    provisioned_concurrency: int = 0
+    log_retention: logs.RetentionDays = logs.RetentionDays.TWO_WEEKS
+    needs_numpy: bool = False
+
+# Bytecode left behind by local runs would otherwise change asset hashes and redeploy unchanged code
+ASSET_EXCLUDES = ["**/__pycache__", "**/*.pyc"]
+
+def asset_code(path) -> lambda_.Code:
+    """Code for a directory, hashed from its sources only."""
+    return lambda_.Code.from_asset(path, exclude=ASSET_EXCLUDES)
+
+def shared_layer_version() -> str:
+    """Version of the shared runtime layer built from lib/, kept in lib/VERSION."""
+    with open(os.path.join("lib", "VERSION")) as version_file:
+        return version_file.read().strip()
+
+def function_profiles(chat_provisioned_concurrency=0) -> Dict[str, FunctionProfile]:
+    return {
+        # Chat path: more memory buys CPU for the stream pipeline and the semantic cache
+        "invoke_agent": FunctionProfile(
+            "invoke_bedrock_agent", memory_size=1024, needs_numpy=True,
+            provisioned_concurrency=chat_provisioned_concurrency,
+            log_retention=logs.RetentionDays.ONE_MONTH
+        ),
+        "lite_retrieval": FunctionProfile("lite_vector_store", memory_size=1024, needs_numpy=True),
+
+        # Provisioning steps are short control-plane calls
+        "trigger_creation": FunctionProfile("trigger_bedrock_agent_creation", timeout=Duration.minutes(1)),
+        "create_agent": FunctionProfile("create_agent"),
+        "create_knowledge_base": FunctionProfile("create_knowledge_base"),
+        "create_action_group": FunctionProfile("create_action_group"),
+        "prepare_agent": FunctionProfile("prepare_agent"),
+        "create_agent_alias": FunctionProfile("create_agent_alias"),
+        "update_chatbot": FunctionProfile("update_chatbot"),
+        "associate_knowledge_base": FunctionProfile("associate_knowledge_base"),
+        "check_collection_status": FunctionProfile("check_collection_status"),
+        "ingest_documents": FunctionProfile("ingest_documents"),
+
+        # Vector index creation goes through the collection VPC endpoint
+        "create_opensearch_collection": FunctionProfile("create_opensearch_collection", in_vpc=True),
+        "create_vector_index": FunctionProfile(
+            "create_opensearch_collection", handler="index.create_index_handler", in_vpc=True
+        ),
+        # Scheduled singletons: one run at a time is enough and keeps them from racing each other
+        "manage_collection_pool": FunctionProfile(
+            "create_opensearch_collection", handler="pool.handler", in_vpc=True, reserved_concurrency=1
+        ),
+        "readiness_poller": FunctionProfile(
+            "check_collection_status", handler="poller.handler", timeout=Duration.minutes(2),
+            reserved_concurrency=1
+        ),
+
+        # Document transfers and embedding are I/O bound and run many requests in parallel
+        "stage_documents": FunctionProfile(
+            "ingest_documents", handler="staging.handler", memory_size=1024, timeout=Duration.minutes(15)
+        ),
+        "sync_knowledge_base": FunctionProfile(
+            "ingest_documents", handler="sync.handler", memory_size=1024, timeout=Duration.minutes(15),
+            reserved_concurrency=10
+        ),
+        "build_lite_index": FunctionProfile(
+            "lite_vector_store", handler="build.handler", memory_size=2048, timeout=Duration.minutes(15),
+            needs_numpy=True
+        ),
+    }
+
+def describe_profiles(profiles: Dict[str, FunctionProfile]) -> List[str]:
+    """One line per function, for the synth-time report."""
+    lines = [f"{'Function':<30}{'Runtime':<12}{'Arch':<8}{'Memory':>7}{'Timeout':>9}  {'VPC':<5}{'Concurrency':<16}Logs"]
+    for function_id, profile in profiles.items():
+        if profile.provisioned_concurrency:
+            concurrency = f"provisioned {profile.provisioned_concurrency}"
+        elif profile.reserved_concurrency is not None:
+            concurrency = f"reserved {profile.reserved_concurrency}"
+        else:
+            concurrency = "-"
+        lines.append(
+            f"{function_id:<30}{profile.runtime.name:<12}{profile.architecture.name:<8}"
+            f"{profile.memory_size:>7}{int(profile.timeout.to_seconds()):>8}s  "
+            f"{'yes' if profile.in_vpc else 'no':<5}{concurrency:<16}{profile.log_retention.name}"
+        )
+    return lines
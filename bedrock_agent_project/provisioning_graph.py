@@ -0,0 +1,242 @@
+from aws_cdk import aws_stepfunctions as sfn
+from constructs import Construct
+
+class ProvisioningGraph:
+    """Declarative DAG of provisioning steps, compiled into the most parallel state machine definition.
+
+    Each step is a chainable (a task or a chain of states) plus the steps whose output it
+    actually needs and a rough duration estimate. Step Functions can only express
+    series-parallel structure, so ``plan`` decomposes the graph recursively: unrelated groups
+    of steps become branches of a Parallel state, and a connected group is split into two
+    stages at the cut that keeps the estimated critical path shortest. Branch results are
+    merged back into one state with ``States.JsonMerge``.
+
+    Steps added with a ``None`` chainable are placeholders, e.g. readiness waits that are not
+    used in every mode; their dependents inherit their dependencies.
+    """
+
+    def __init__(self):
+        self.steps = {}
+
+    def add(self, name, chainable, depends_on=(), estimated_seconds=1):
+        self.steps[name] = {
+            'chainable': chainable,
+            'depends_on': list(depends_on),
+            'estimated_seconds': estimated_seconds,
+        }
+        return self
+
+    def dependencies(self):
+        """Direct dependencies between the steps that have a chainable, with placeholders resolved."""
+        def resolve(name):
+            step = self.steps[name]
+            if step['chainable'] is not None:
+                return {name}
+            resolved = set()
+            for dependency in step['depends_on']:
+                resolved |= resolve(dependency)
+            return resolved
+
+        graph = {}
+        for name, step in self.steps.items():
+            if step['chainable'] is None:
+                continue
+            graph[name] = set()
+            for dependency in step['depends_on']:
+                if dependency not in self.steps:
+                    raise ValueError(f"Step {name} depends on unknown step {dependency}")
+                graph[name] |= resolve(dependency)
+        self.topological_order(graph)
+        return graph
+
+    def topological_order(self, graph):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Provisioning steps have a dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in sorted(graph[name]):
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in sorted(graph, key=list(self.steps).index):
+            visit(name)
+        return order
+
+    def finish_times(self, graph, nodes):
+        """Earliest estimated finish of each step in ``nodes`` and the dependency that gates its start."""
+        finish, previous = {}, {}
+        for name in self.topological_order(graph):
+            if name not in nodes:
+                continue
+            before = [dependency for dependency in graph[name] if dependency in nodes]
+            previous[name] = max(before, key=lambda dependency: finish[dependency]) if before else None
+            start = finish[previous[name]] if before else 0
+            finish[name] = start + self.steps[name]['estimated_seconds']
+        return finish, previous
+
+    def critical_path(self, graph=None, nodes=None):
+        """Returns ``(seconds, steps)`` of the longest estimated dependency chain."""
+        graph = graph if graph is not None else self.dependencies()
+        nodes = set(graph) if nodes is None else nodes
+        finish, previous = self.finish_times(graph, nodes)
+        if not finish:
+            return 0, []
+        name = max(finish, key=finish.get)
+        seconds, path = finish[name], []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return seconds, list(reversed(path))
+
+    def plan(self, graph=None, nodes=None, memo=None):
+        """Series-parallel plan: a step name, ``('series', [plans])`` or ``('parallel', [plans])``."""
+        graph = graph if graph is not None else self.dependencies()
+        nodes = frozenset(graph if nodes is None else nodes)
+        memo = {} if memo is None else memo
+        if nodes in memo:
+            return memo[nodes]
+        order = [name for name in self.topological_order(graph) if name in nodes]
+        if len(order) == 1:
+            return order[0]
+
+        components = self.components(graph, nodes)
+        if len(components) > 1:
+            components.sort(key=lambda component: min(order.index(name) for name in component))
+            memo[nodes] = ('parallel', [self.plan(graph, component, memo) for component in components])
+            return memo[nodes]
+
+        # Split into two stages in series; keep the shortest plan, among equal ones the plan that
+        # starts steps earliest, and then the plan that makes the fewest steps wait on steps they
+        # don't depend on, since those waits delay them whenever the estimates are off
+        best = None
+        for first in self.cuts(graph, nodes, order):
+            stages = []
+            for stage in (self.plan(graph, first, memo), self.plan(graph, nodes - first, memo)):
+                # Flatten nested series so the plan reads as one sequence
+                stages.extend(stage[1] if isinstance(stage, tuple) and stage[0] == 'series' else [stage])
+            candidate = ('series', stages)
+            finish = self.schedule(candidate)
+            cost = (max(finish.values()), sum(finish.values()), self.false_waits(graph, candidate, nodes))
+            if best is None or cost < best[0]:
+                best = (cost, candidate)
+        memo[nodes] = best[1]
+        return memo[nodes]
+
+    def cuts(self, graph, nodes, order):
+        """Candidate first stages, each closed under dependencies so all edges cross the cut forwards:
+        the ancestors of a step, the steps that could finish by some time, and their unions."""
+        finish, _ = self.finish_times(graph, nodes)
+        ancestor_sets = [frozenset(self.ancestors(graph, name, nodes)) for name in order]
+        finished_by = [frozenset(name for name in nodes if finish[name] <= seconds) for seconds in sorted(set(finish.values()))]
+        candidates = set(ancestor_sets) | set(finished_by)
+        candidates |= {ancestors | finished for ancestors in ancestor_sets for finished in finished_by}
+        candidates = [cut for cut in candidates if cut and cut != nodes]
+        return sorted(candidates, key=lambda cut: (len(cut), sorted(order.index(name) for name in cut)))
+
+    def schedule(self, plan, start=0):
+        """Estimated finish time of each step when the plan runs as compiled."""
+        if isinstance(plan, str):
+            return {plan: start + self.steps[plan]['estimated_seconds']}
+        kind, parts = plan
+        finish = {}
+        for part in parts:
+            part_finish = self.schedule(part, start)
+            finish.update(part_finish)
+            if kind == 'series':
+                start = max(part_finish.values())
+        return finish
+
+    def waits(self, plan, before=frozenset()):
+        """The steps each step waits for when the plan runs as compiled."""
+        if isinstance(plan, str):
+            return {plan: before}
+        kind, parts = plan
+        waits = {}
+        for part in parts:
+            part_waits = self.waits(part, before)
+            waits.update(part_waits)
+            if kind == 'series':
+                before = before | frozenset(part_waits)
+        return waits
+
+    def false_waits(self, graph, plan, nodes):
+        """Number of (step, step it waits for) pairs the plan imposes without a dependency between them."""
+        return sum(len(waited - self.ancestors(graph, name, nodes)) for name, waited in self.waits(plan).items())
+
+    def plan_seconds(self, plan):
+        """Estimated wall-clock time of a compiled plan, including waits the structure imposes."""
+        return max(self.schedule(plan).values())
+
+    @staticmethod
+    def ancestors(graph, name, nodes):
+        found, stack = set(), [name]
+        while stack:
+            for dependency in graph[stack.pop()]:
+                if dependency in nodes and dependency not in found:
+                    found.add(dependency)
+                    stack.append(dependency)
+        return found
+
+    @staticmethod
+    def components(graph, nodes):
+        neighbours = {name: set() for name in nodes}
+        for name in nodes:
+            for dependency in graph[name]:
+                if dependency in nodes:
+                    neighbours[name].add(dependency)
+                    neighbours[dependency].add(name)
+        components, seen = [], set()
+        for name in nodes:
+            if name in seen:
+                continue
+            component, stack = set(), [name]
+            while stack:
+                current = stack.pop()
+                if current in component:
+                    continue
+                component.add(current)
+                stack.extend(neighbours[current] - component)
+            seen |= component
+            components.append(component)
+        return components
+
+    def compile(self, scope: Construct, plan=None):
+        """Builds the chain for a plan; Parallel states are named after the steps they run."""
+        plan = plan if plan is not None else self.plan()
+        if isinstance(plan, str):
+            return self.steps[plan]['chainable']
+        kind, parts = plan
+        if kind == 'series':
+            chain = sfn.Chain.start(self.compile(scope, parts[0]))
+            for part in parts[1:]:
+                chain = chain.next(self.compile(scope, part))
+            return chain
+
+        # Every branch starts from the same input and adds its own results; merge them back
+        merged = '$[0]'
+        for index in range(1, len(parts)):
+            merged = f"States.JsonMerge({merged}, $[{index}], false)"
+        parallel = sfn.Parallel(
+            scope, "Run " + " | ".join(self.first_step(part) for part in parts),
+            result_selector={"merged.$": merged},
+            output_path="$.merged"
+        )
+        for part in parts:
+            parallel.branch(self.compile(scope, part))
+        return parallel
+
+    def first_step(self, plan):
+        return plan if isinstance(plan, str) else self.first_step(plan[1][0])
+
+    def describe(self, plan=None):
+        plan = plan if plan is not None else self.plan()
+        if isinstance(plan, str):
+            return plan
+        separator = ' -> ' if plan[0] == 'series' else ' | '
+        return '(' + separator.join(self.describe(part) for part in plan[1]) + ')'
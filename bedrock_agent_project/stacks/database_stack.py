@@ -1,5 +1,6 @@
 import aws_cdk as cdk
 from aws_cdk import aws_dynamodb as dynamodb
+from aws_cdk import aws_s3 as s3
 from constructs import Construct
 
 class DatabaseStack(cdk.Stack):
@@ -17,4 +18,77 @@ class DatabaseStack(cdk.Stack):
             self, "AgentTable",
             partition_key=dynamodb.Attribute(name="chatbotId", type=dynamodb.AttributeType.STRING),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
-        )
\ No newline at end of file
+        )
+
+        # Exact-match answer cache for invoke_bedrock_agent; items expire through DynamoDB TTL
+        self.response_cache_table = dynamodb.Table(
+            self, "ResponseCacheTable",
+            partition_key=dynamodb.Attribute(name="cacheKey", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+        # Resumable chat sessions and their buffered frames, see invoke_bedrock_agent/sessions.py
+        self.stream_session_table = dynamodb.Table(
+            self, "StreamSessionTable",
+            partition_key=dynamodb.Attribute(name="sessionToken", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+
+        # Warm pool of pre-provisioned OpenSearch Serverless collections, see create_opensearch_collection/pool.py
+        self.collection_pool_table = dynamodb.Table(
+            self, "CollectionPoolTable",
+            partition_key=dynamodb.Attribute(name="collectionName", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+        self.collection_pool_table.add_global_secondary_index(
+            index_name="status-index",
+            partition_key=dynamodb.Attribute(name="status", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="createdAt", type=dynamodb.AttributeType.NUMBER),
+        )
+
+        # Provisioning executions parked on a task token until their resource is ready, see check_collection_status/readiness.py
+        self.readiness_table = dynamodb.Table(
+            self, "ReadinessTable",
+            partition_key=dynamodb.Attribute(name="waiterId", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+        )
+        # Sparse: only waiters that are still pending carry pendingType
+        self.readiness_table.add_global_secondary_index(
+            index_name="pending-index",
+            partition_key=dynamodb.Attribute(name="pendingType", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="registeredAt", type=dynamodb.AttributeType.NUMBER),
+        )
+
+        # Output of every completed provisioning step per chatbot, so re-runs skip finished steps
+        self.provisioning_ledger_table = dynamodb.Table(
+            self, "ProvisioningLedgerTable",
+            partition_key=dynamodb.Attribute(name="chatbotId", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="step", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        )
+
+        # Snapshots of the semantic answer cache indexes, memory-mapped by cold invoke_bedrock_agent instances
+        self.cache_bucket = s3.Bucket(
+            self, "CacheBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            lifecycle_rules=[s3.LifecycleRule(prefix="semantic-cache/", expiration=cdk.Duration.days(30))],
+        )
+
+        # Chatbot documents staged for knowledge base ingestion under documents/<chatbotId>/, and
+        # the per-chatbot document manifests the provisioning workflow reads under manifests/
+        self.documents_bucket = s3.Bucket(
+            self, "DocumentsBucket",
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            enforce_ssl=True,
+            lifecycle_rules=[
+                s3.LifecycleRule(abort_incomplete_multipart_upload_after=cdk.Duration.days(1)),
+                s3.LifecycleRule(prefix="staging-results/", expiration=cdk.Duration.days(7)),
+            ],
+        )
@@ -8,17 +8,32 @@ from aws_cdk import aws_events_targets as targets
 from constructs import Construct
 
 class EventBridgeStack(cdk.Stack):
-    def __init__(self, scope: Construct, construct_id: str, trigger_creation_lambda, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, collection_pool_lambda, readiness_poller_lambda,
+                 sync_knowledge_base_lambda, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        rule = events.Rule(
-            self, "ChatbotCreatedRule",
+        # ChatbotCreated events are routed to the provisioning queue, see provisioning_queue_stack.py
+
+        # Changed document sets are synced incrementally instead of reprovisioning the chatbot
+        documents_rule = events.Rule(
+            self, "ChatbotDocumentsUpdatedRule",
             event_pattern=events.EventPattern(
                 source=["com.myapp.chatbot"],
-                detail_type=["ChatbotCreated"],
-                detail={
-                    "type": ["BEDROCK_AGENT"]
-                }
+                detail_type=["ChatbotDocumentsUpdated"]
             )
         )
-        rule.add_target(targets.LambdaFunction(trigger_creation_lambda))
\ No newline at end of file
+        documents_rule.add_target(targets.LambdaFunction(sync_knowledge_base_lambda))
+
+        # Keep the warm pool of OpenSearch Serverless collections topped up
+        pool_rule = events.Rule(
+            self, "CollectionPoolSchedule",
+            schedule=events.Schedule.rate(cdk.Duration.minutes(5))
+        )
+        pool_rule.add_target(targets.LambdaFunction(collection_pool_lambda))
+
+        # Resume provisioning executions waiting on a task token; each run polls for up to a minute
+        poller_rule = events.Rule(
+            self, "ReadinessPollerSchedule",
+            schedule=events.Schedule.rate(cdk.Duration.minutes(1))
+        )
+        poller_rule.add_target(targets.LambdaFunction(readiness_poller_lambda))
@@ -1,15 +1,20 @@
 from aws_cdk import (
     Stack,
-    Duration,
     aws_lambda as lambda_,
     aws_dynamodb as dynamodb,
     aws_iam as iam,
     aws_ec2 as ec2,
+    aws_s3 as s3,
 )
 from constructs import Construct
+from bedrock_agent_project.function_profiles import asset_code, describe_profiles, function_profiles, shared_layer_version
 
 class LambdaStack(Stack):
-    def __init__(self, scope: Construct, id: str, chatbot_table: dynamodb.Table, agent_table: dynamodb.Table, **kwargs) -> None:
+    def __init__(self, scope: Construct, id: str, chatbot_table: dynamodb.Table, agent_table: dynamodb.Table,
+                 response_cache_table: dynamodb.Table, stream_session_table: dynamodb.Table,
+                 cache_bucket: s3.Bucket, collection_pool_table: dynamodb.Table,
+                 readiness_table: dynamodb.Table, documents_bucket: s3.Bucket,
+                 provisioning_ledger_table: dynamodb.Table, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
         # Create a VPC
@@ -67,6 +72,9 @@ class LambdaStack(Stack):
             resources=[chatbot_table.table_arn, agent_table.table_arn]
         ))
 
+        # Knowledge bases ingest the chatbot documents staged in the documents bucket
+        documents_bucket.grant_read(knowledge_base_role)
+
         # Add necessary permissions to the knowledge base role
         knowledge_base_role.add_to_policy(iam.PolicyStatement(
             actions=[
@@ -89,19 +97,12 @@ class LambdaStack(Stack):
         ))
 
         self.functions = {}
-        function_configs = [
-            ("create_agent", "create_agent"),
-            ("create_knowledge_base", "create_knowledge_base"),
-            ("create_action_group", "create_action_group"),
-            ("prepare_agent", "prepare_agent"),
-            ("create_agent_alias", "create_agent_alias"),
-            ("update_chatbot", "update_chatbot"),
-            ("trigger_creation", "trigger_bedrock_agent_creation"),
-            ("invoke_agent", "invoke_bedrock_agent"),
-            ("create_opensearch_collection", "create_opensearch_collection"),
-            ("check_collection_status", "check_collection_status"),
-            ("associate_knowledge_base", "associate_knowledge_base"),
-        ]
+        self.invocation_targets = {}
+        # Memory, runtime, VPC attachment and concurrency of every function, see function_profiles.py.
+        # chatProvisionedConcurrency keeps that many chat instances initialized
+        profiles = function_profiles(
+            chat_provisioned_concurrency=int(self.node.try_get_context("chatProvisionedConcurrency") or 0)
+        )
 
         # Define the ARN of your Step Functions state machine
         state_machine_arn = 'arn:aws:states:us-east-1:178115124427:stateMachine:BedrockAgentStateMachineE8A150FE-dZSAkl5o8j51'
@@ -109,6 +110,28 @@ class LambdaStack(Stack):
         # Define the ARN of your embedding model (replace with the correct ARN)
         embedding_model_arn = 'arn:aws:bedrock:us-east-1::foundation-model/amazon.titan-embed-text-v1'
 
+        # Vector indexes derive their dimension from the embedding model unless embeddingDimension
+        # is set, and use the indexProfile context (latency, recall or memory) unless a chatbot picks one
+        index_environment = {'DEFAULT_INDEX_PROFILE': self.node.try_get_context("indexProfile") or "recall"}
+        document_source_buckets = [bucket for bucket in (self.node.try_get_context("documentSourceBuckets") or "").split(",") if bucket]
+        # Chunking used when knowledge bases ingest documents, unless a chatbot sets its own
+        ingestion_environment = {
+            'CHUNKING_STRATEGY': self.node.try_get_context("chunkingStrategy") or "FIXED_SIZE",
+            'CHUNK_MAX_TOKENS': str(self.node.try_get_context("chunkMaxTokens") or 300),
+            'CHUNK_OVERLAP_PERCENTAGE': str(self.node.try_get_context("chunkOverlapPercentage") or 20),
+            # Where documents may be fetched from: HTTPS and S3 by default, S3 only from the listed buckets
+            'DOCUMENT_SOURCE_SCHEMES': self.node.try_get_context("documentSourceSchemes") or "https,s3",
+            'DOCUMENT_SOURCE_BUCKETS': ','.join(document_source_buckets),
+        }
+        # Small document sets skip OpenSearch; knowledgeBaseBackend is auto, lite or opensearch
+        backend_environment = {
+            'KNOWLEDGE_BASE_BACKEND': self.node.try_get_context("knowledgeBaseBackend") or "auto",
+            'LITE_MAX_DOCUMENTS': str(self.node.try_get_context("liteMaxDocuments") or 25),
+            'LITE_MAX_BYTES': str(self.node.try_get_context("liteMaxBytes") or 5 * 1024 * 1024),
+        }
+        if self.node.try_get_context("embeddingDimension"):
+            index_environment['EMBEDDING_DIMENSION'] = str(self.node.try_get_context("embeddingDimension"))
+
         # Create a policy for Bedrock permissions
         bedrock_policy = iam.PolicyStatement(
             actions=[
@@ -118,10 +141,22 @@ class LambdaStack(Stack):
                 "bedrock:PrepareAgent",
                 "bedrock:CreateAgentAlias",
                 "bedrock:InvokeAgent",
+                "bedrock:InvokeModel",
                 "bedrock:ListAgents",
+                "bedrock:ListKnowledgeBases",
                 "bedrock:GetAgent",
+                "bedrock:GetKnowledgeBase",
+                "bedrock:ListAgentActionGroups",
+                "bedrock:GetAgentActionGroup",
+                "bedrock:ListAgentAliases",
+                "bedrock:GetAgentAlias",
                 "bedrock:AssociateAgentKnowledgeBase",
                 "bedrock:ListAgentVersions",
+                "bedrock:CreateDataSource",
+                "bedrock:ListDataSources",
+                "bedrock:StartIngestionJob",
+                "bedrock:GetIngestionJob",
+                "bedrock:ListIngestionJobs",
             ],
             resources=["*"]  # Scope this down to specific resources if possible
         )
@@ -151,6 +186,8 @@ class LambdaStack(Stack):
                 "aoss:DescribeCollection",
                 "aoss:CreateVpcEndpoint",
                 "aoss:DeleteVpcEndpoint",
+                "aoss:TagResource",
+                "aoss:ListTagsForResource",
                 "ec2:CreateVpcEndpoint",
                 "ec2:DeleteVpcEndpoints",
                 "ec2:DescribeVpcEndpoints",
@@ -169,37 +206,111 @@ class LambdaStack(Stack):
         )
 
 
+        # NumPy for the lite vector store and the semantic cache, from the AWS SDK for pandas layer
+        # matching each function's runtime and architecture unless numpyLayerArn points at another layer
+        numpy_layers = {}
+
+        def numpy_layer(profile):
+            python_version = profile.runtime.name.replace("python", "Python").replace(".", "")
+            suffix = "-Arm64" if profile.architecture == lambda_.Architecture.ARM_64 else ""
+            layer_name = f"AWSSDKPandas-{python_version}{suffix}"
+            if layer_name not in numpy_layers:
+                numpy_layers[layer_name] = lambda_.LayerVersion.from_layer_version_arn(
+                    self, f"{layer_name}Layer",
+                    self.node.try_get_context("numpyLayerArn")
+                    or f"arn:aws:lambda:{self.region}:336392948345:layer:{layer_name}:"
+                       f"{self.node.try_get_context('numpyLayerVersion') or 13}"
+                )
+            return numpy_layers[layer_name]
+
+        # Runtime shared by every function: pooled lazy clients, retry policies, event helpers, chatbot
+        # settings and the Bedrock agent wrapper, see lib/python. A new layer version is published only
+        # when lib/ changes
+        layer_version = shared_layer_version()
+        self.shared_layer = lambda_.LayerVersion(
+            self, "SharedRuntimeLayer",
+            layer_version_name="chatbot-shared-runtime",
+            code=asset_code("lib"),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+            compatible_architectures=[lambda_.Architecture.ARM_64, lambda_.Architecture.X86_64],
+            description=f"Shared runtime modules for the chatbot Lambda functions, v{layer_version}"
+        )
+        print(f"Shared runtime layer v{layer_version}")
+
+        # One asset per code directory, shared by the functions using it
+        function_code = {}
+
         lambda_list_functions_policy = iam.PolicyStatement(
             actions=["lambda:ListFunctions"],
             resources=["*"]
         )
 
-        for function_id, directory_name in function_configs:
+        for function_id, profile in profiles.items():
+            directory_name = profile.directory
+            if directory_name not in function_code:
+                function_code[directory_name] = asset_code(f"lambda/{directory_name}")
             function = lambda_.Function(
                 self, f"{function_id.capitalize()}Lambda",
-                runtime=lambda_.Runtime.PYTHON_3_9,
-                handler="index.handler",
-                code=lambda_.Code.from_asset(f"lambda/{directory_name}"),
-                timeout=Duration.minutes(5),
-                memory_size=256,
+                runtime=profile.runtime,
+                architecture=profile.architecture,
+                handler=profile.handler,
+                code=function_code[directory_name],
+                timeout=profile.timeout,
+                memory_size=profile.memory_size,
+                reserved_concurrent_executions=profile.reserved_concurrency,
+                log_retention=profile.log_retention,
                 environment={
                     'CHATBOT_TABLE_NAME': chatbot_table.table_name,
                     'AGENT_TABLE_NAME': agent_table.table_name,
+                    'RESPONSE_CACHE_TABLE_NAME': response_cache_table.table_name,
+                    'STREAM_SESSION_TABLE_NAME': stream_session_table.table_name,
+                    'SEMANTIC_CACHE_BUCKET': cache_bucket.bucket_name,
+                    'COLLECTION_POOL_TABLE_NAME': collection_pool_table.table_name,
+                    'READINESS_TABLE_NAME': readiness_table.table_name,
+                    'COLLECTION_TENANCY_MODE': self.node.try_get_context("collectionTenancyMode") or "dedicated",
                     'STATE_MACHINE_ARN': state_machine_arn,
                     'AGENT_ROLE_ARN': agent_role.role_arn,
                     'KNOWLEDGE_BASE_ROLE_ARN': knowledge_base_role.role_arn,
                     'EMBEDDING_MODEL_ARN': embedding_model_arn,
+                    **index_environment,
+                    **ingestion_environment,
+                    **backend_environment,
+                    'DOCUMENTS_BUCKET': documents_bucket.bucket_name,
+                    'PROVISIONING_LEDGER_TABLE_NAME': provisioning_ledger_table.table_name,
                     'VPC_ID': self.vpc.vpc_id,
                     'SUBNET_IDS': ','.join([subnet.subnet_id for subnet in self.vpc.private_subnets]),
                     'SECURITY_GROUP_ID': self.opensearch_sg.security_group_id,
                 },
-                vpc=self.vpc,
-                vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_NAT)
+                layers=[self.shared_layer, *([numpy_layer(profile)] if profile.needs_numpy else [])],
+                vpc=self.vpc if profile.in_vpc else None,
+                vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_NAT) if profile.in_vpc else None
             )
 
             # Grant permissions
             chatbot_table.grant_read_write_data(function)
             agent_table.grant_read_write_data(function)
+            if function_id == "invoke_agent":
+                response_cache_table.grant_read_write_data(function)
+                stream_session_table.grant_read_write_data(function)
+                cache_bucket.grant_read_write(function)
+            if directory_name in ("ingest_documents", "trigger_bedrock_agent_creation", "lite_vector_store"):
+                documents_bucket.grant_read_write(function)
+            if directory_name == "ingest_documents" and document_source_buckets:
+                function.add_to_role_policy(iam.PolicyStatement(
+                    actions=["s3:GetObject"],
+                    resources=[f"arn:aws:s3:::{bucket}/*" for bucket in document_source_buckets]
+                ))
+            if function_id == "sync_knowledge_base":
+                # Finds the chatbot's knowledge base among the provisioning steps it completed
+                provisioning_ledger_table.grant_read_data(function)
+            if directory_name == "create_opensearch_collection":
+                collection_pool_table.grant_read_write_data(function)
+            if directory_name == "check_collection_status":
+                readiness_table.grant_read_write_data(function)
+                function.add_to_role_policy(iam.PolicyStatement(
+                    actions=["states:SendTaskSuccess", "states:SendTaskFailure"],
+                    resources=["*"]  # Task tokens are not scoped to a resource ARN
+                ))
             function.add_to_role_policy(iam.PolicyStatement(
                 actions=["states:StartExecution"],
                 resources=[state_machine_arn]
@@ -213,6 +324,30 @@ class LambdaStack(Stack):
             ))
 
             self.functions[function_id] = function
+            # Provisioned concurrency needs a published version; callers invoke it through the alias
+            if profile.provisioned_concurrency:
+                self.invocation_targets[function_id] = function.add_alias(
+                    "live", provisioned_concurrent_executions=profile.provisioned_concurrency
+                )
+            else:
+                self.invocation_targets[function_id] = function
+
+        # The agent calls the lite retrieval function through its lite-kb-<chatbotId> action group
+        self.functions["lite_retrieval"].add_permission(
+            "AllowBedrockAgentInvoke",
+            principal=iam.ServicePrincipal("bedrock.amazonaws.com"),
+            source_account=self.account
+        )
+        self.functions["create_action_group"].add_environment(
+            "LITE_RETRIEVAL_FUNCTION_ARN", self.functions["lite_retrieval"].function_arn)
+        # Document syncs rebuild lite knowledge bases asynchronously
+        self.functions["sync_knowledge_base"].add_environment(
+            "LITE_INDEX_BUILDER_FUNCTION_NAME", self.functions["build_lite_index"].function_name)
+        self.functions["build_lite_index"].grant_invoke(self.functions["sync_knowledge_base"])
+
+        print("Lambda function profiles:")
+        for line in describe_profiles(profiles):
+            print(f"  {line}")
 
         # Print the table names and role ARNs for verification
         print(f"Chatbot Table Name: {chatbot_table.table_name}")
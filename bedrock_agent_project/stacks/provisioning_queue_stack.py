@@ -0,0 +1,146 @@
+import aws_cdk as cdk
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as targets
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_lambda_event_sources as event_sources
+from aws_cdk import aws_s3 as s3
+from aws_cdk import aws_sqs as sqs
+from aws_cdk import aws_stepfunctions as sfn
+from aws_cdk import aws_stepfunctions_tasks as tasks
+from constructs import Construct
+from bedrock_agent_project.function_profiles import asset_code
+
+class ProvisioningQueueStack(cdk.Stack):
+    """SQS-buffered intake for ChatbotCreated events and a concurrency-capped bulk provisioning workflow.
+
+    Events queue up instead of each starting an execution. A batched trigger groups them into
+    one bulk execution, whose distributed Map runs the per-chatbot provisioning state machine
+    for each chatbot with at most ``provisioningConcurrency`` running at once.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, provisioning_state_machine: sfn.StateMachine,
+                 documents_bucket: s3.Bucket, shared_layer: lambda_.ILayerVersion, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        max_concurrency = int(self.node.try_get_context("provisioningConcurrency") or 10)
+        batch_size = int(self.node.try_get_context("provisioningBatchSize") or 25)
+
+        dead_letter_queue = sqs.Queue(
+            self, "ProvisioningDeadLetterQueue",
+            retention_period=cdk.Duration.days(14)
+        )
+
+        self.queue = sqs.Queue(
+            self, "ProvisioningQueue",
+            visibility_timeout=cdk.Duration.minutes(6),
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=5, queue=dead_letter_queue)
+        )
+
+        # ChatbotCreated events queue up instead of each starting an execution
+        rule = events.Rule(
+            self, "ChatbotCreatedRule",
+            event_pattern=events.EventPattern(
+                source=["com.myapp.chatbot"],
+                detail_type=["ChatbotCreated"],
+                detail={
+                    "type": ["BEDROCK_AGENT"]
+                }
+            )
+        )
+        rule.add_target(targets.SqsQueue(self.queue))
+
+        # Provision one chatbot per item; a failed chatbot is retried on its own and never fails the batch
+        provision_chatbot = tasks.StepFunctionsStartExecution(
+            self, "Provision Chatbot",
+            state_machine=provisioning_state_machine,
+            integration_pattern=sfn.IntegrationPattern.RUN_JOB,
+            # An object input (rather than "$") lets the child execution be linked to the bulk one
+            input=sfn.TaskInput.from_object({
+                name: sfn.JsonPath.string_at(f"$.{name}")
+                for name in ("chatbotId", "projectId", "name", "description", "language")
+            } | {
+                "documentsManifest": sfn.JsonPath.object_at("$.documentsManifest"),
+                "indexProfile": sfn.JsonPath.string_at("$.indexProfile"),
+                "knowledgeBaseBackend": sfn.JsonPath.string_at("$.knowledgeBaseBackend"),
+            }),
+            associate_with_parent=True
+        )
+        provision_chatbot.add_retry(
+            errors=["StepFunctions.ExecutionLimitExceededException", "States.TaskFailed"],
+            interval=cdk.Duration.seconds(30),
+            max_attempts=2,
+            backoff_rate=2,
+            jitter_strategy=sfn.JitterType.FULL
+        )
+
+        provision_chatbots = sfn.DistributedMap(
+            self, "Provision Chatbots",
+            items_path="$.chatbots",
+            max_concurrency=max_concurrency,
+            tolerated_failure_percentage=100
+        )
+        provision_chatbots.item_processor(provision_chatbot)
+
+        self.state_machine = sfn.StateMachine(
+            self, "BulkProvisioningStateMachine",
+            definition_body=sfn.DefinitionBody.from_chainable(provision_chatbots),
+            timeout=cdk.Duration.hours(12)
+        )
+
+        # Same code as the per-event trigger; SQS batches take the bulk path
+        self.batch_trigger = lambda_.Function(
+            self, "BatchTriggerLambda",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            architecture=lambda_.Architecture.ARM_64,
+            handler="index.handler",
+            code=asset_code("lambda/trigger_bedrock_agent_creation"),
+            layers=[shared_layer],
+            timeout=cdk.Duration.minutes(1),
+            environment={
+                'BULK_STATE_MACHINE_ARN': self.state_machine.state_machine_arn,
+                'DOCUMENTS_BUCKET': documents_bucket.bucket_name,
+                'KNOWLEDGE_BASE_BACKEND': self.node.try_get_context("knowledgeBaseBackend") or "auto",
+                'LITE_MAX_DOCUMENTS': str(self.node.try_get_context("liteMaxDocuments") or 25),
+                'LITE_MAX_BYTES': str(self.node.try_get_context("liteMaxBytes") or 5 * 1024 * 1024),
+            }
+        )
+        self.batch_trigger.add_event_source(event_sources.SqsEventSource(
+            self.queue,
+            batch_size=batch_size,
+            max_batching_window=cdk.Duration.seconds(30),
+            report_batch_item_failures=True
+        ))
+        # The trigger writes each chatbot's document manifest before starting the execution
+        documents_bucket.grant_put(self.batch_trigger)
+        self.batch_trigger.add_to_role_policy(iam.PolicyStatement(
+            actions=["states:StartExecution"],
+            resources=[self.state_machine.state_machine_arn]
+        ))
+
+        # Onboarding backlog: chatbots waiting to be provisioned and how long the oldest has waited
+        cloudwatch.Dashboard(
+            self, "ProvisioningDashboard",
+            widgets=[[
+                cloudwatch.GraphWidget(
+                    title="Provisioning queue depth",
+                    left=[
+                        self.queue.metric_approximate_number_of_messages_visible(period=cdk.Duration.minutes(1)),
+                        self.queue.metric_approximate_number_of_messages_not_visible(period=cdk.Duration.minutes(1)),
+                    ],
+                    right=[dead_letter_queue.metric_approximate_number_of_messages_visible(period=cdk.Duration.minutes(1))]
+                ),
+                cloudwatch.GraphWidget(
+                    title="Oldest queued chatbot (seconds)",
+                    left=[self.queue.metric_approximate_age_of_oldest_message(period=cdk.Duration.minutes(1))]
+                ),
+                cloudwatch.GraphWidget(
+                    title="Bulk provisioning executions",
+                    left=[
+                        self.state_machine.metric_started(period=cdk.Duration.minutes(5)),
+                        self.state_machine.metric_failed(period=cdk.Duration.minutes(5)),
+                    ]
+                ),
+            ]]
+        )
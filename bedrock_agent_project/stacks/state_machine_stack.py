@@ -1,12 +1,20 @@
 import aws_cdk as cdk
+from aws_cdk import aws_dynamodb as dynamodb
+from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import aws_stepfunctions_tasks as tasks
 from constructs import Construct
+from bedrock_agent_project.provisioning_graph import ProvisioningGraph
 
 class StateMachineStack(cdk.Stack):
-    def __init__(self, scope: Construct, construct_id: str, lambda_functions: dict, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, lambda_functions: dict, ledger_table: dynamodb.Table,
+                 documents_bucket: s3.Bucket, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Every provisioning step records its output in the ledger, keyed by chatbotId and step;
+        # a re-run of the workflow for the same chatbot restores completed steps instead of repeating them
+        self.ledger_table = ledger_table
+
         # Create OpenSearch Collection
         create_opensearch_collection_task = tasks.LambdaInvoke(
             self, "Create OpenSearch Collection",
@@ -14,10 +22,21 @@ class StateMachineStack(cdk.Stack):
             result_path="$.opensearchCollection"
         )
 
+        # Readiness is awaited on a task token resumed by the central readiness poller, or, with the
+        # collectionReadiness=poll context, polled per execution with jittered exponential backoff
+        readiness_mode = self.node.try_get_context("collectionReadiness") or "callback"
+
+        # First backoff before the collection is checked; check_collection_status computes the next ones
+        initial_backoff = sfn.Pass(
+            self, "Initial Collection Backoff",
+            result=sfn.Result.from_object({"Payload": {"attempt": 0, "nextWaitSeconds": 30}}),
+            result_path="$.collectionStatus"
+        )
+
         # Wait state for OpenSearch collection creation
         wait_for_collection = sfn.Wait(
             self, "Wait for Collection",
-            time=sfn.WaitTime.duration(cdk.Duration.seconds(60))
+            time=sfn.WaitTime.seconds_path("$.collectionStatus.Payload.nextWaitSeconds")
         )
 
         # Check Collection Status
@@ -27,9 +46,29 @@ class StateMachineStack(cdk.Stack):
             result_path="$.collectionStatus"
         )
 
+        # Park the execution until the readiness poller reports the collection ACTIVE
+        wait_for_collection_callback = self.wait_for_resource(
+            "Wait for Collection Callback", lambda_functions["check_collection_status"], "collection",
+            sfn.JsonPath.object_at("$.opensearchCollection.Payload"), "$.collectionStatus"
+        )
+
+        # Create the vector index once a newly created collection is ACTIVE
+        create_vector_index_task = tasks.LambdaInvoke(
+            self, "Create Vector Index",
+            lambda_function=lambda_functions["create_vector_index"],
+            result_path="$.opensearchCollection"
+        )
+
+        collection_failed = sfn.Fail(self, "Collection Failed", error="CollectionFailed", cause="OpenSearch collection creation failed")
+
+        # A collection claimed from the warm pool is already ACTIVE, so skip the wait loop
+        is_collection_ready = sfn.Choice(self, "Is Collection Ready?")
+        collection_ready = sfn.Condition.string_equals("$.opensearchCollection.Payload.status", "ACTIVE")
+
         # Choice state to check if collection is active
         is_collection_active = sfn.Choice(self, "Is Collection Active?")
-        collection_not_active = sfn.Condition.string_equals("$.collectionStatus.Payload.status", "CREATING")
+        collection_active = sfn.Condition.string_equals("$.collectionStatus.Payload.status", "ACTIVE")
+        collection_failed_status = sfn.Condition.string_equals("$.collectionStatus.Payload.status", "FAILED")
 
         # Create Bedrock Agent
         create_agent_task = tasks.LambdaInvoke(
@@ -80,28 +119,248 @@ class StateMachineStack(cdk.Stack):
             result_path="$.updateChatbot"
         )
 
-        # Define the workflow
-        definition = create_opensearch_collection_task.next(
-            wait_for_collection
-        ).next(
-            check_collection_status_task
-        ).next(
+        # Stage the chatbot's documents into S3 in batches, reading the document list from the
+        # manifest the trigger wrote; per-batch results go to S3 to stay clear of the payload limit.
+        # A batch with documents it could not stage fails once its retries are used up, and so does
+        # the Map unless documentStagingToleratedFailurePercentage allows some missing documents
+        stage_document_batch = tasks.LambdaInvoke(
+            self, "Stage Document Batch",
+            lambda_function=lambda_functions["stage_documents"],
+            payload_response_only=True
+        )
+        stage_document_batch.add_retry(
+            errors=["States.TaskFailed"],
+            interval=cdk.Duration.seconds(10),
+            max_attempts=3,
+            backoff_rate=2,
+            jitter_strategy=sfn.JitterType.FULL
+        )
+        stage_documents_task = sfn.DistributedMap(
+            self, "Stage Documents",
+            item_reader=sfn.S3JsonItemReader(
+                bucket=documents_bucket,
+                key=sfn.JsonPath.string_at("$.documentsManifest.key")
+            ),
+            item_batcher=sfn.ItemBatcher(
+                max_items_per_batch=int(self.node.try_get_context("documentStagingBatchSize") or 25),
+                batch_input={"chatbotId": sfn.JsonPath.string_at("$.chatbotId")}
+            ),
+            max_concurrency=int(self.node.try_get_context("documentStagingConcurrency") or 10),
+            tolerated_failure_percentage=int(self.node.try_get_context("documentStagingToleratedFailurePercentage") or 0),
+            result_writer=sfn.ResultWriter(bucket=documents_bucket, prefix="staging-results"),
+            result_path=sfn.JsonPath.DISCARD
+        )
+        stage_documents_task.item_processor(stage_document_batch)
+
+        # Register the staged documents as the knowledge base's S3 data source and start ingesting
+        ingest_documents_task = tasks.LambdaInvoke(
+            self, "Start Document Ingestion",
+            lambda_function=lambda_functions["ingest_documents"],
+            result_path="$.ingestionJob"
+        )
+
+        # Chatbots with a small document set get a lite knowledge base: their embeddings are
+        # memory-mapped by a retrieval Lambda the agent calls through an action group
+        build_lite_index_task = tasks.LambdaInvoke(
+            self, "Build Lite Knowledge Base",
+            lambda_function=lambda_functions["build_lite_index"],
+            result_path="$.liteIndex"
+        )
+
+        # Checkpoint every step that creates or changes a resource
+        create_opensearch_collection_step = self.checkpointed(create_opensearch_collection_task, "opensearchCollection")
+        create_vector_index_step = self.checkpointed(create_vector_index_task, "opensearchCollection", step="vectorIndex")
+        create_agent_task = self.checkpointed(create_agent_task, "createAgent")
+        create_knowledge_base_task = self.checkpointed(create_knowledge_base_task, "knowledgeBase")
+        associate_knowledge_base_task = self.checkpointed(associate_knowledge_base_task, "associateKnowledgeBase")
+        create_action_group_task = self.checkpointed(create_action_group_task, "actionGroup")
+        prepare_agent_task = self.checkpointed(prepare_agent_task, "prepareAgent")
+        create_agent_alias_task = self.checkpointed(create_agent_alias_task, "agentAlias")
+        update_chatbot_task = self.checkpointed(update_chatbot_task, "updateChatbot")
+        ingest_documents_task = self.checkpointed(ingest_documents_task, "ingestionJob")
+        build_lite_index_task = self.checkpointed(build_lite_index_task, "liteIndex")
+
+        # Collection readiness: a collection claimed from the warm pool is already ACTIVE and skips
+        # straight to the join; a new one is awaited and gets its vector index once ACTIVE
+        collection_ready_join = sfn.Pass(self, "Collection Ready")
+        is_collection_active = (
             is_collection_active
-                .when(collection_not_active, wait_for_collection)
-                .otherwise(
-                    create_agent_task.next(
-                        sfn.Parallel(self, "Create and Associate Knowledge Base and Create Action Group")
-                        .branch(create_knowledge_base_task.next(associate_knowledge_base_task))
-                        .branch(create_action_group_task)
-                    ).next(prepare_agent_task)
-                    .next(create_agent_alias_task)
-                    .next(update_chatbot_task)
-                )
+                .when(collection_active, create_vector_index_step.next(collection_ready_join))
+                .when(collection_failed_status, collection_failed)
+        )
+        if readiness_mode == "callback":
+            await_collection = wait_for_collection_callback.next(is_collection_active.otherwise(collection_failed))
+        else:
+            await_collection = initial_backoff.next(wait_for_collection).next(check_collection_status_task).next(
+                is_collection_active.otherwise(wait_for_collection)
+            )
+        await_collection_step = sfn.Chain.custom(
+            is_collection_ready.when(collection_ready, collection_ready_join).otherwise(await_collection),
+            [collection_ready_join],
+            collection_ready_join
         )
 
+        # Bedrock creates and prepares agents and knowledge bases asynchronously too; in poll mode
+        # the next step starts right away, so the waits are placeholders in the graph
+        wait_for_agent = wait_for_knowledge_base = wait_for_agent_prepared = wait_for_ingestion = None
+        if readiness_mode == "callback":
+            agent_body = sfn.JsonPath.string_at("$.createAgent.Payload.body")
+            wait_for_agent = self.wait_for_resource(
+                "Wait for Agent", lambda_functions["check_collection_status"], "agent",
+                agent_body, "$.agentStatus"
+            )
+            wait_for_knowledge_base = self.wait_for_resource(
+                "Wait for Knowledge Base", lambda_functions["check_collection_status"], "knowledge_base",
+                sfn.JsonPath.string_at("$.knowledgeBase.Payload.body"), "$.knowledgeBaseStatus"
+            )
+            wait_for_agent_prepared = self.wait_for_resource(
+                "Wait for Agent Prepared", lambda_functions["check_collection_status"], "agent",
+                agent_body, "$.agentPreparedStatus", ready_statuses=["PREPARED"]
+            )
+            # A chatbot without documents starts no ingestion job
+            wait_for_ingestion_job = self.wait_for_resource(
+                "Wait for Document Ingestion", lambda_functions["check_collection_status"], "ingestion_job",
+                sfn.JsonPath.object_at("$.ingestionJob.Payload"), "$.ingestionStatus",
+                timeout=cdk.Duration.minutes(90)
+            )
+            no_documents = sfn.Pass(self, "No Documents to Ingest")
+            wait_for_ingestion = sfn.Chain.custom(
+                sfn.Choice(self, "Ingestion Started?")
+                    .when(sfn.Condition.is_present("$.ingestionJob.Payload.ingestionJobId"), wait_for_ingestion_job)
+                    .otherwise(no_documents),
+                [wait_for_ingestion_job, no_documents],
+                no_documents
+            )
+
+        # OpenSearch-backed knowledge base steps are skipped for lite chatbots, and the other way round
+        create_opensearch_collection_step = self.for_backend("OpenSearch Collection", create_opensearch_collection_step, lite=False)
+        await_collection_step = self.for_backend("Collection Readiness", await_collection_step, lite=False)
+        create_knowledge_base_task = self.for_backend("Knowledge Base", create_knowledge_base_task, lite=False)
+        if wait_for_knowledge_base is not None:
+            wait_for_knowledge_base = self.for_backend("Knowledge Base Readiness", wait_for_knowledge_base, lite=False)
+        associate_knowledge_base_task = self.for_backend("Knowledge Base Association", associate_knowledge_base_task, lite=False)
+        ingest_documents_task = self.for_backend("Document Ingestion", ingest_documents_task, lite=False)
+        build_lite_index_task = self.for_backend("Lite Knowledge Base", build_lite_index_task, lite=True)
+
+        # Define the workflow as steps and the steps whose output they read; the builder runs
+        # every step as early as its dependencies allow, e.g. the agent alongside the collection
+        graph = ProvisioningGraph()
+        graph.add("collection", create_opensearch_collection_step, estimated_seconds=5)
+        graph.add("collectionReady", await_collection_step, ["collection"], estimated_seconds=300)
+        graph.add("createAgent", create_agent_task, estimated_seconds=5)
+        graph.add("agentReady", wait_for_agent, ["createAgent"], estimated_seconds=10)
+        graph.add("knowledgeBase", create_knowledge_base_task, ["collectionReady"], estimated_seconds=5)
+        graph.add("knowledgeBaseReady", wait_for_knowledge_base, ["knowledgeBase"], estimated_seconds=30)
+        graph.add("associateKnowledgeBase", associate_knowledge_base_task, ["knowledgeBaseReady", "agentReady"], estimated_seconds=3)
+        graph.add("liteIndex", build_lite_index_task, ["stageDocuments"], estimated_seconds=30)
+        graph.add("actionGroup", create_action_group_task, ["agentReady"], estimated_seconds=5)
+        graph.add("prepareAgent", prepare_agent_task, ["associateKnowledgeBase", "actionGroup"], estimated_seconds=5)
+        graph.add("agentPrepared", wait_for_agent_prepared, ["prepareAgent"], estimated_seconds=30)
+        graph.add("agentAlias", create_agent_alias_task, ["agentPrepared"], estimated_seconds=5)
+        graph.add("updateChatbot", update_chatbot_task, ["agentAlias"], estimated_seconds=1)
+        graph.add("stageDocuments", stage_documents_task, estimated_seconds=60)
+        graph.add("ingestion", ingest_documents_task, ["knowledgeBaseReady", "stageDocuments"], estimated_seconds=5)
+        graph.add("ingestionComplete", wait_for_ingestion, ["ingestion"], estimated_seconds=600)
+
+        plan = graph.plan()
+        critical_seconds, critical_steps = graph.critical_path()
+        print(f"Provisioning plan: {graph.describe(plan)}")
+        print(f"Provisioning critical path: ~{critical_seconds}s via {' -> '.join(critical_steps)}; "
+              f"compiled definition: ~{graph.plan_seconds(plan)}s")
+        definition = graph.compile(self, plan)
+
         # Create the state machine
         self.state_machine = sfn.StateMachine(
             self, "BedrockAgentStateMachine",
             definition_body=sfn.DefinitionBody.from_chainable(definition),
-            timeout=cdk.Duration.minutes(30)
-        )
\ No newline at end of file
+            # Ingesting thousands of documents takes longer than provisioning itself
+            timeout=cdk.Duration.hours(2)
+        )
+
+    def wait_for_resource(self, name, check_status_function, resource_type, source, result_path, ready_statuses=None,
+                          timeout=cdk.Duration.minutes(20)):
+        """Task that parks the execution on a task token until the readiness poller sees the resource ready."""
+        payload = {
+            "taskToken": sfn.JsonPath.task_token,
+            "resourceType": resource_type,
+            "source": source
+        }
+        if ready_statuses:
+            payload["readyStatuses"] = ready_statuses
+        return tasks.LambdaInvoke(
+            self, name,
+            lambda_function=check_status_function,
+            integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            payload=sfn.TaskInput.from_object(payload),
+            task_timeout=sfn.Timeout.duration(timeout),
+            result_path=result_path
+        )
+
+    def for_backend(self, label, chainable, lite):
+        """Runs a step only for chatbots with (``lite=True``) or without a lite knowledge base."""
+        is_lite = sfn.Condition.and_(
+            sfn.Condition.is_present("$.knowledgeBaseBackend"),
+            sfn.Condition.string_equals("$.knowledgeBaseBackend", "lite")
+        )
+        skip = sfn.Pass(self, f"Skip {label}")
+        choice = sfn.Choice(self, f"{label} Needed?")
+        if lite:
+            choice.when(is_lite, chainable).otherwise(skip)
+        else:
+            choice.when(is_lite, skip).otherwise(chainable)
+        return sfn.Chain.custom(choice, [*chainable.end_states, skip], skip)
+
+    def checkpointed(self, task, result_key, step=None):
+        """Wraps a step so it runs once per chatbot: a ledger hit restores its recorded output.
+
+        The task's result is recorded under ``step`` (default ``result_key``) only when it did not
+        report an error ``statusCode``; a step that did fails the execution instead of continuing.
+        """
+        step = step or result_key
+        ledger_path = f"$.ledger.{step}"
+        key = {
+            "chatbotId": tasks.DynamoAttributeValue.from_string(sfn.JsonPath.string_at("$.chatbotId")),
+            "step": tasks.DynamoAttributeValue.from_string(step)
+        }
+        state_name = task.node.id
+
+        lookup = tasks.DynamoGetItem(
+            self, f"{state_name} Checkpoint",
+            table=self.ledger_table,
+            key=key,
+            consistent_read=True,
+            result_path=ledger_path
+        )
+        restore = sfn.Pass(
+            self, f"Restore {state_name}",
+            parameters={"Payload.$": f"States.StringToJson({ledger_path}.Item.output.S)"},
+            result_path=f"$.{result_key}"
+        )
+        record = tasks.DynamoPutItem(
+            self, f"Record {state_name}",
+            table=self.ledger_table,
+            item={
+                **key,
+                "output": tasks.DynamoAttributeValue.from_string(
+                    sfn.JsonPath.json_to_string(sfn.JsonPath.object_at(f"$.{result_key}.Payload"))
+                ),
+                "executionId": tasks.DynamoAttributeValue.from_string(sfn.JsonPath.string_at("$$.Execution.Id")),
+                "completedAt": tasks.DynamoAttributeValue.from_string(sfn.JsonPath.string_at("$$.State.EnteredTime"))
+            },
+            result_path=sfn.JsonPath.DISCARD
+        )
+        status_code = f"$.{result_key}.Payload.statusCode"
+        step_failed = sfn.Condition.and_(
+            sfn.Condition.is_present(status_code),
+            sfn.Condition.not_(sfn.Condition.number_equals(status_code, 200))
+        )
+
+        done = sfn.Choice(self, f"{state_name} Done?")
+        lookup.next(done)
+        succeeded = sfn.Choice(self, f"{state_name} Succeeded?")
+        done.when(sfn.Condition.is_present(f"{ledger_path}.Item"), restore).otherwise(
+            task.next(succeeded
+                .when(step_failed, sfn.Fail(self, f"{state_name} Failed", error="StepFailed", cause=f"{state_name} reported an error"))
+                .otherwise(record))
+        )
+        return sfn.Chain.custom(lookup, [restore, record], done)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Offline recall/latency benchmark for the k-NN index profiles used by create_opensearch_collection.
+
+Builds exact ground truth for a corpus of embeddings with brute-force NumPy, then builds HNSW
+indexes for a grid of candidate parameters with a local ANN library (faiss if installed,
+otherwise hnswlib) as a stand-in for OpenSearch, and measures for each:
+
+    recall@k, query latency p50/p99 (single-threaded), build time and index memory
+
+It then picks the latency, recall and memory profiles for the OpenSearch engine the library
+stands in for (faiss for faiss, nmslib for hnswlib) and writes them to
+lambda/create_opensearch_collection/index_profiles.json, which the Lambda loads over its
+built-in defaults. Review the report before deploying the new file.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/index_profiles.py --embeddings corpus.npy --queries 1000
+    python benchmarks/index_profiles.py --synthetic 100000 --dimension 1536
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+OUTPUT_PATH = os.path.join(os.path.dirname(__file__), '..', 'lambda', 'create_opensearch_collection', 'index_profiles.json')
+
+# Candidate graph parameters; each built index is queried at every ef_search
+M_VALUES = (8, 16, 32)
+EF_CONSTRUCTION_VALUES = (128, 256, 512)
+EF_SEARCH_VALUES = (32, 64, 128, 256, 512)
+
+def load_corpus(args):
+    if args.embeddings:
+        vectors = np.load(args.embeddings, mmap_mode='r').astype(np.float32)
+    else:
+        # Clustered synthetic data is closer to real embeddings than uniform noise
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 1000), args.dimension)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), args.synthetic)]
+        vectors = vectors + rng.normal(scale=0.3, size=vectors.shape).astype(np.float32)
+    if args.normalize:
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Held-out queries, so no query finds itself at distance zero
+    return np.ascontiguousarray(vectors[:-args.queries]), np.ascontiguousarray(vectors[-args.queries:])
+
+def ground_truth(corpus, queries, k, batch_size=256):
+    """Exact k nearest neighbours by L2 distance, computed in query batches to bound memory."""
+    corpus_norms = np.einsum('ij,ij->i', corpus, corpus)
+    neighbours = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2; ||q||^2 does not change the ranking
+        distances = corpus_norms[None, :] - 2 * batch @ corpus.T
+        nearest = np.argpartition(distances, k, axis=1)[:, :k]
+        order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+        neighbours[start:start + batch_size] = np.take_along_axis(nearest, order, axis=1)
+    return neighbours
+
+class FaissBackend:
+    name = 'faiss'
+    engine = 'faiss'
+    supports_quantization = True
+
+    def __init__(self):
+        import faiss
+        self.faiss = faiss
+        faiss.omp_set_num_threads(1)
+
+    def build(self, corpus, m, ef_construction, quantized):
+        if quantized:
+            index = self.faiss.IndexHNSWSQ(corpus.shape[1], self.faiss.ScalarQuantizer.QT_fp16, m)
+            index.train(corpus)
+        else:
+            index = self.faiss.IndexHNSWFlat(corpus.shape[1], m)
+        index.hnsw.efConstruction = ef_construction
+        self.faiss.omp_set_num_threads(os.cpu_count() or 1)
+        index.add(corpus)
+        self.faiss.omp_set_num_threads(1)
+        return index
+
+    def memory_bytes(self, index):
+        return len(self.faiss.serialize_index(index))
+
+    def search(self, index, query, k, ef_search):
+        index.hnsw.efSearch = ef_search
+        return index.search(query[None, :], k)[1][0]
+
+class HnswlibBackend:
+    name = 'hnswlib'
+    # hnswlib is the HNSW implementation behind OpenSearch's nmslib engine
+    engine = 'nmslib'
+    supports_quantization = False
+
+    def __init__(self):
+        import hnswlib
+        self.hnswlib = hnswlib
+
+    def build(self, corpus, m, ef_construction, quantized):
+        index = self.hnswlib.Index(space='l2', dim=corpus.shape[1])
+        index.init_index(max_elements=len(corpus), M=m, ef_construction=ef_construction)
+        index.add_items(corpus, num_threads=-1)
+        index.set_num_threads(1)
+        return index
+
+    def memory_bytes(self, index):
+        with tempfile.NamedTemporaryFile() as f:
+            index.save_index(f.name)
+            return os.path.getsize(f.name)
+
+    def search(self, index, query, k, ef_search):
+        index.set_ef(max(ef_search, k))
+        return index.knn_query(query, k=k)[0][0]
+
+def backend(name):
+    for candidate in ((FaissBackend, HnswlibBackend) if name == 'auto' else
+                      {'faiss': (FaissBackend,), 'hnswlib': (HnswlibBackend,)}[name]):
+        try:
+            return candidate()
+        except ImportError:
+            continue
+    sys.exit("No ANN library available; pip install -r benchmarks/requirements.txt")
+
+def run(ann, corpus, queries, truth, k):
+    results = []
+    quantization = (False, True) if ann.supports_quantization else (False,)
+    for m, ef_construction, quantized in itertools.product(M_VALUES, EF_CONSTRUCTION_VALUES, quantization):
+        started = time.perf_counter()
+        index = ann.build(corpus, m, ef_construction, quantized)
+        build_seconds = time.perf_counter() - started
+        memory_bytes = ann.memory_bytes(index)
+
+        for ef_search in EF_SEARCH_VALUES:
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = ann.search(index, query, k, ef_search)
+                latencies.append(time.perf_counter() - started)
+                hits += len(np.intersect1d(found, expected, assume_unique=True))
+            latencies = np.array(latencies) * 1000
+            result = {
+                'engine': ann.engine,
+                'm': m,
+                'ef_construction': ef_construction,
+                'ef_search': ef_search,
+                'quantized': quantized,
+                'recall': hits / (len(queries) * k),
+                'p50Ms': float(np.percentile(latencies, 50)),
+                'p99Ms': float(np.percentile(latencies, 99)),
+                'buildSeconds': build_seconds,
+                'memoryBytes': memory_bytes,
+            }
+            print(f"{ann.engine} m={m:<3} ef_construction={ef_construction:<4} ef_search={ef_search:<4} sq={str(quantized):<5} "
+                  f"recall@{k}={result['recall']:.4f} p50={result['p50Ms']:.3f}ms p99={result['p99Ms']:.3f}ms "
+                  f"build={build_seconds:.1f}s memory={memory_bytes / 2**20:.1f}MiB")
+            results.append(result)
+    return results
+
+def choose_profiles(results, min_recall):
+    """Latency: lowest p99 at min_recall. Recall: highest recall, then lowest p99.
+    Memory: smallest index at min_recall, then lowest p99."""
+    good = [result for result in results if result['recall'] >= min_recall] or results
+    chosen = {
+        'latency': min(good, key=lambda r: (r['p99Ms'], -r['recall'])),
+        'recall': max(results, key=lambda r: (round(r['recall'], 3), -r['p99Ms'])),
+        'memory': min(good, key=lambda r: (r['memoryBytes'], r['p99Ms'])),
+    }
+    profiles = {}
+    for name, result in chosen.items():
+        profile = {
+            'engine': result['engine'],
+            'space_type': 'l2',
+            'm': result['m'],
+            'ef_construction': result['ef_construction'],
+            'ef_search': result['ef_search'],
+        }
+        if result['quantized']:
+            profile['encoder'] = {'name': 'sq', 'parameters': {'type': 'fp16'}}
+        profiles[name] = profile
+    return profiles, chosen
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--embeddings', help='.npy file of shape (n, dimension)')
+    source.add_argument('--synthetic', type=int, help='number of synthetic vectors to generate')
+    parser.add_argument('--dimension', type=int, default=1536, help='dimension of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=1000, help='vectors held out as queries')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--min-recall', type=float, default=0.95, help='recall floor for the latency and memory profiles')
+    parser.add_argument('--normalize', action='store_true', help='L2-normalize vectors first, as Titan v2 does')
+    parser.add_argument('--backend', choices=('auto', 'faiss', 'hnswlib'), default='auto')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    corpus, queries = load_corpus(args)
+    print(f"Corpus: {corpus.shape[0]} x {corpus.shape[1]}, {len(queries)} queries")
+
+    started = time.perf_counter()
+    truth = ground_truth(corpus, queries, args.k)
+    print(f"Ground truth: {time.perf_counter() - started:.1f}s")
+
+    ann = backend(args.backend)
+    results = run(ann, corpus, queries, truth, args.k)
+    profiles, chosen = choose_profiles(results, args.min_recall)
+    for name, result in chosen.items():
+        print(f"{name}: {json.dumps(profiles[name])} recall@{args.k}={result['recall']:.4f} "
+              f"p99={result['p99Ms']:.3f}ms memory={result['memoryBytes'] / 2**20:.1f}MiB")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'generatedAt': int(time.time()),
+            'backend': ann.name,
+            'corpus': {'vectors': int(corpus.shape[0]), 'dimension': int(corpus.shape[1]), 'queries': len(queries)},
+            'k': args.k,
+            'minRecall': args.min_recall,
+            'profiles': profiles,
+            'results': results,
+        }, f, indent=2)
+    print(f"Wrote {os.path.normpath(args.output)}")
+
+if __name__ == '__main__':
+    main()
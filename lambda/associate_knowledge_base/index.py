@@ -1,43 +1,16 @@
-import json
-import boto3
-from botocore.exceptions import ClientError
+from bedrock_agent_wrapper import BedrockAgentWrapper
+from event_helpers import provisioning_handler, response, step_body
 
-bedrock_agent = boto3.client('bedrock-agent')
+agents = BedrockAgentWrapper()
 
+@provisioning_handler("associating Knowledge Base")
 def handler(event, context):
-    print(f"Received event: {json.dumps(event)}")
+    agent_id = step_body(event, 'createAgent')['agentId']
+    knowledge_base_id = step_body(event, 'knowledgeBase')['knowledgeBase']['knowledgeBaseId']
 
-    try:
-        agent_id = json.loads(event['createAgent']['Payload']['body'])['agentId']
-        knowledge_base_id = event['knowledgeBase']['body']['knowledgeBase']['knowledgeBaseId']
-
-        response = associate_knowledge_base(agent_id, knowledge_base_id)
-        return {
-            'statusCode': 200,
-            'body': json.dumps(response)
-        }
-    except KeyError as e:
-        print(f"Error accessing key in event: {e}")
-        return {
-            'statusCode': 400,
-            'body': json.dumps(f"Missing key in event: {e}")
-        }
-    except Exception as e:
-        print(f"Error associating Knowledge Base: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Error associating Knowledge Base: {str(e)}")
-        }
-
-def associate_knowledge_base(agent_id, knowledge_base_id):
-    try:
-        response = bedrock_agent.associate_agent_knowledge_base(
-            agentId=agent_id,
-            knowledgeBaseId=knowledge_base_id,
-            description='Associated knowledge base for the agent'
-        )
-        print(f"Knowledge Base {knowledge_base_id} associated with Agent {agent_id}")
-        return response
-    except ClientError as e:
-        print(f"Error associating Knowledge Base: {e.response['Error']['Message']}")
-        raise
\ No newline at end of file
+    # Knowledge bases are associated with the working draft, which prepare_agent then builds
+    result = agents.associate_agent_knowledge_base(
+        agent_id, 'DRAFT', knowledge_base_id, 'Associated knowledge base for the agent'
+    )
+    print(f"Knowledge Base {knowledge_base_id} associated with Agent {agent_id}")
+    return response(200, result)
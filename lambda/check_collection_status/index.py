@@ -1,23 +1,41 @@
 import json
-import boto3
+import os
+import random
 from botocore.exceptions import ClientError
+from readiness import opensearch_serverless, register_waiter, resource_name
 
-opensearch_serverless = boto3.client('opensearchserverless')
+# Jittered exponential backoff between status checks, applied by the state machine's Wait state
+COLLECTION_POLL_BASE_SECONDS = int(os.environ.get('COLLECTION_POLL_BASE_SECONDS', '10'))
+COLLECTION_POLL_MAX_SECONDS = int(os.environ.get('COLLECTION_POLL_MAX_SECONDS', '60'))
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
 
+    if 'taskToken' in event:
+        # Callback mode: park the execution; the central readiness poller checks all waiters in batch
+        resource_type = event.get('resourceType', 'collection')
+        source = event['source']
+        register_waiter(
+            event['taskToken'], resource_type, resource_name(resource_type, source),
+            payload=source if resource_type == 'collection' else None,
+            ready_statuses=event.get('readyStatuses')
+        )
+        return {'status': 'WAITING'}
+
     try:
-        collection_name = event['opensearchCollection']['Payload']['collectionName']
-        collection_arn = event['opensearchCollection']['Payload']['collectionArn']
-        chatbot_id = event['opensearchCollection']['Payload']['chatbotId']
+        collection = event['opensearchCollection']['Payload']
+        collection_name = collection['collectionName']
+        collection_arn = collection['collectionArn']
+        chatbot_id = collection['chatbotId']
     except KeyError as e:
         print(f"Error accessing key in event: {e}")
         return {
             'error': f"Missing key in event: {e}",
-            'message': 'Error accessing input data'
+            'message': 'Error accessing input data',
+            'status': 'FAILED'
         }
 
+    attempt = int(event.get('collectionStatus', {}).get('Payload', {}).get('attempt', 0)) + 1
     try:
         response = opensearch_serverless.batch_get_collection(names=[collection_name])
         status = response['collectionDetails'][0]['status']
@@ -26,11 +44,23 @@ def handler(event, context):
             'collectionName': collection_name,
             'collectionArn': collection_arn,
             'status': status,
-            'chatbotId': chatbot_id
+            'chatbotId': chatbot_id,
+            'attempt': attempt,
+            'nextWaitSeconds': backoff_seconds(attempt)
         }
     except ClientError as e:
         print(f"Error checking collection status: {e.response['Error']['Message']}")
+        # Treated as not ready yet, so the state machine checks again after the next backoff
         return {
             'error': str(e),
-            'message': 'Error checking collection status'
-        }
\ No newline at end of file
+            'message': 'Error checking collection status',
+            'status': 'UNKNOWN',
+            'attempt': attempt,
+            'nextWaitSeconds': backoff_seconds(attempt)
+        }
+
+def backoff_seconds(attempt):
+    # "Equal jitter": half the exponential delay is fixed, the other half random, so
+    # executions started together spread out instead of polling in lockstep
+    delay = min(COLLECTION_POLL_MAX_SECONDS, COLLECTION_POLL_BASE_SECONDS * 2 ** (attempt - 1))
+    return max(1, int(delay / 2 + random.uniform(0, delay / 2)))
@@ -0,0 +1,26 @@
+import json
+import os
+import time
+from readiness import READY_STATUSES, poll_pending
+
+# One scheduled run keeps polling while executions are waiting, so they resume within
+# seconds of their resource becoming ready instead of at the next schedule tick
+POLLER_RUN_SECONDS = int(os.environ.get('POLLER_RUN_SECONDS', '50'))
+POLLER_INTERVAL_SECONDS = int(os.environ.get('POLLER_INTERVAL_SECONDS', '5'))
+
+def handler(event, context):
+    """Central readiness poller: one batched status check per resource type for every waiting execution."""
+    print(f"Received event: {json.dumps(event)}")
+    deadline = time.monotonic() + POLLER_RUN_SECONDS
+    resumed = 0
+    while True:
+        pending = 0
+        for resource_type in READY_STATUSES:
+            waiting, done = poll_pending(resource_type)
+            pending += waiting - done
+            resumed += done
+        if pending == 0 or time.monotonic() + POLLER_INTERVAL_SECONDS >= deadline:
+            break
+        time.sleep(POLLER_INTERVAL_SECONDS)
+    print(f"Readiness poller resumed {resumed} executions")
+    return {'resumed': resumed}
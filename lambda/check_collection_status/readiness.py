@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import random
+import time
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client, lazy_table
+
+opensearch_serverless = lazy_client('opensearchserverless')
+bedrock_agent = lazy_client('bedrock-agent')
+stepfunctions = lazy_client('stepfunctions')
+
+# Executions parked on a task token until the readiness poller sees their resource ready.
+# Waiters carry a pendingType attribute only while pending, so the pending index stays sparse.
+readiness_table = lazy_table('READINESS_TABLE_NAME') if os.environ.get('READINESS_TABLE_NAME') else None
+PENDING_INDEX_NAME = 'pending-index'
+# Outlives the longest waiter task timeout (document ingestion)
+READINESS_TTL_SECONDS = int(os.environ.get('READINESS_TTL_SECONDS', '10800'))
+
+# batch_get_collection accepts at most 100 names per call
+BATCH_GET_LIMIT = 100
+
+# Statuses that resume a waiter successfully, unless the step asks for others, and that fail it
+READY_STATUSES = {
+    'collection': ['ACTIVE'],
+    'agent': ['NOT_PREPARED', 'PREPARED'],
+    'knowledge_base': ['ACTIVE'],
+    'ingestion_job': ['COMPLETE'],
+}
+FAILED_STATUSES = {
+    'collection': ['FAILED'],
+    'agent': ['FAILED'],
+    'knowledge_base': ['FAILED', 'DELETE_UNSUCCESSFUL'],
+    'ingestion_job': ['FAILED', 'STOPPED'],
+}
+
+# Ingestion jobs can run for a long time and have no batch status call, so each one is
+# checked with jittered exponential backoff (base, max seconds) instead of on every pass
+CHECK_BACKOFF_SECONDS = {
+    'ingestion_job': (10, 120),
+}
+
+def resource_name(resource_type, source):
+    """Extracts the resource to wait for from the output of the step that created it."""
+    if isinstance(source, str):
+        source = json.loads(source)
+    if resource_type == 'collection':
+        return source['collectionName']
+    if resource_type == 'agent':
+        return source['agentId']
+    if resource_type == 'knowledge_base':
+        return source['knowledgeBase']['knowledgeBaseId']
+    if resource_type == 'ingestion_job':
+        return f"{source['knowledgeBaseId']}/{source['dataSourceId']}/{source['ingestionJobId']}"
+    raise ValueError(f"Unknown resource type: {resource_type}")
+
+def waiter_id(task_token):
+    return hashlib.sha256(task_token.encode('utf-8')).hexdigest()
+
+def register_waiter(task_token, resource_type, name, payload=None, ready_statuses=None):
+    """Parks the execution until the resource is ready; the readiness poller resumes it."""
+    ready_statuses = ready_statuses or READY_STATUSES[resource_type]
+    now = int(time.time())
+    readiness_table.put_item(Item={
+        'waiterId': waiter_id(task_token),
+        'taskToken': task_token,
+        'pendingType': resource_type,
+        'resourceName': name,
+        'readyStatuses': ready_statuses,
+        'payload': json.dumps(payload or {}),
+        'registeredAt': now,
+        'checks': 0,
+        'nextCheckAt': now,
+        'expiresAt': now + READINESS_TTL_SECONDS
+    })
+    print(f"Execution waiting for {resource_type} {name} to reach {ready_statuses}")
+
+def pending_waiters(resource_type):
+    query = {
+        'IndexName': PENDING_INDEX_NAME,
+        'KeyConditionExpression': Key('pendingType').eq(resource_type)
+    }
+    items = []
+    while True:
+        response = readiness_table.query(**query)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def fetch_statuses(resource_type, names):
+    """Returns the status of each named resource with as few control-plane calls as possible."""
+    statuses = {}
+    if resource_type == 'collection':
+        names = list(names)
+        for start in range(0, len(names), BATCH_GET_LIMIT):
+            response = opensearch_serverless.batch_get_collection(names=names[start:start + BATCH_GET_LIMIT])
+            statuses.update({detail['name']: detail['status'] for detail in response['collectionDetails']})
+        return statuses
+
+    if resource_type == 'ingestion_job':
+        for name in names:
+            knowledge_base_id, data_source_id, ingestion_job_id = name.split('/')
+            statuses[name] = bedrock_agent.get_ingestion_job(
+                knowledgeBaseId=knowledge_base_id,
+                dataSourceId=data_source_id,
+                ingestionJobId=ingestion_job_id
+            )['ingestionJob']['status']
+        return statuses
+
+    # Bedrock has no batch get for agents or knowledge bases, but one listing page covers up to 1000
+    if resource_type == 'agent':
+        list_call, summaries_key, id_key, status_key = bedrock_agent.list_agents, 'agentSummaries', 'agentId', 'agentStatus'
+    else:
+        list_call, summaries_key, id_key, status_key = bedrock_agent.list_knowledge_bases, 'knowledgeBaseSummaries', 'knowledgeBaseId', 'status'
+    request = {'maxResults': 1000}
+    while True:
+        response = list_call(**request)
+        for summary in response[summaries_key]:
+            if summary[id_key] in names:
+                statuses[summary[id_key]] = summary[status_key]
+        if not response.get('nextToken') or len(statuses) == len(names):
+            return statuses
+        request['nextToken'] = response['nextToken']
+
+def poll_pending(resource_type):
+    """Checks every pending waiter of one resource type in batch and resumes those that are done."""
+    waiters = pending_waiters(resource_type)
+    now = int(time.time())
+    due = [waiter for waiter in waiters if int(waiter.get('nextCheckAt', 0)) <= now]
+    if not due:
+        return len(waiters), 0
+
+    try:
+        statuses = fetch_statuses(resource_type, {waiter['resourceName'] for waiter in due})
+    except ClientError as e:
+        print(f"Error checking {resource_type} status: {e.response['Error']['Message']}")
+        return len(waiters), 0
+
+    resumed = 0
+    for waiter in due:
+        status = statuses.get(waiter['resourceName'])
+        if status in waiter['readyStatuses'] or status in FAILED_STATUSES[resource_type]:
+            resume_waiter(waiter['taskToken'], resource_type, waiter['resourceName'], status,
+                          json.loads(waiter['payload']), ready=status in waiter['readyStatuses'])
+            resolve_waiter(waiter['waiterId'], status)
+            resumed += 1
+        elif resource_type in CHECK_BACKOFF_SECONDS:
+            defer_waiter(waiter, resource_type, now)
+    return len(waiters), resumed
+
+def defer_waiter(waiter, resource_type, now):
+    base, maximum = CHECK_BACKOFF_SECONDS[resource_type]
+    checks = int(waiter.get('checks', 0)) + 1
+    # "Equal jitter", as for the per-execution collection polling
+    delay = min(maximum, base * 2 ** (checks - 1))
+    readiness_table.update_item(
+        Key={'waiterId': waiter['waiterId']},
+        UpdateExpression='set checks = :checks, nextCheckAt = :next',
+        ExpressionAttributeValues={':checks': checks, ':next': now + int(delay / 2 + random.uniform(0, delay / 2))}
+    )
+
+def resolve_waiter(waiter_key, status):
+    # Dropping pendingType removes the waiter from the pending index; TTL deletes it later
+    readiness_table.update_item(
+        Key={'waiterId': waiter_key},
+        UpdateExpression='remove pendingType set resolvedStatus = :s, resolvedAt = :now',
+        ExpressionAttributeValues={':s': status, ':now': int(time.time())}
+    )
+
+def resume_waiter(task_token, resource_type, name, status, payload=None, ready=True):
+    try:
+        if ready:
+            # Same shape as a LambdaInvoke result, so the state machine reads .Payload.status either way
+            stepfunctions.send_task_success(
+                taskToken=task_token,
+                output=json.dumps({'Payload': {**(payload or {}), 'resourceType': resource_type,
+                                               'resourceName': name, 'status': status}})
+            )
+        else:
+            stepfunctions.send_task_failure(
+                taskToken=task_token,
+                error='ResourceNotReady',
+                cause=f"{resource_type} {name} is {status}"
+            )
+    except ClientError as e:
+        # The execution timed out or was stopped while waiting
+        if e.response['Error']['Code'] not in ('TaskTimedOut', 'TaskDoesNotExist', 'InvalidToken'):
+            raise
+        print(f"Dropping waiter for {resource_type} {name}: {e.response['Error']['Code']}")
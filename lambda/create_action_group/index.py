@@ -1,36 +1,22 @@
 import json
 import os
-import boto3
 from botocore.exceptions import ClientError
+from aws_clients import lazy_client
+from event_helpers import provisioning_handler, response, step_body
 
-bedrock_agent = boto3.client('bedrock-agent')
-lambda_client = boto3.client('lambda')
+bedrock_agent = lazy_client('bedrock-agent')
+lambda_client = lazy_client('lambda')
 
+@provisioning_handler("creating Action Groups")
 def handler(event, context):
-    print(f"Received event: {json.dumps(event)}")
+    agent_id = step_body(event, 'createAgent')['agentId']
+    agent_version = get_agent_version(agent_id)
+    chatbot_id = event['chatbotId']
 
-    try:
-        agent_id = json.loads(event['createAgent']['Payload']['body'])['agentId']
-        agent_version = get_agent_version(agent_id)
-        chatbot_id = event['chatbotId']
-
-        action_groups = create_action_groups(agent_id, agent_version, chatbot_id)
-        return {
-            'statusCode': 200,
-            'body': json.dumps(action_groups)
-        }
-    except KeyError as e:
-        print(f"Error accessing key in event: {e}")
-        return {
-            'statusCode': 400,
-            'body': json.dumps(f"Missing key in event: {e}")
-        }
-    except Exception as e:
-        print(f"Error creating Action Groups: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Error creating Action Groups: {str(e)}")
-        }
+    action_groups = create_action_groups(agent_id, agent_version, chatbot_id)
+    if event.get('knowledgeBaseBackend') == 'lite':
+        action_groups.append(create_lite_knowledge_base_action_group(agent_id, agent_version, chatbot_id))
+    return response(200, action_groups)
 
 def get_agent_version(agent_id):
     try:
@@ -46,6 +32,61 @@ def get_agent_version(agent_id):
         print(f"Error fetching agent version: {e.response['Error']['Message']}")
         raise
 
+def create_lite_knowledge_base_action_group(agent_id, agent_version, chatbot_id):
+    """Gives the agent its document search when the chatbot has a lite knowledge base.
+
+    The retrieval Lambda reads the chatbot ID back from the action group name.
+    """
+    action_group_name = f"lite-kb-{chatbot_id}"
+    try:
+        response = bedrock_agent.create_agent_action_group(
+            agentId=agent_id,
+            agentVersion=agent_version,
+            actionGroupName=action_group_name,
+            description="Searches the chatbot's documents",
+            actionGroupExecutor={
+                'lambda': os.environ['LITE_RETRIEVAL_FUNCTION_ARN']
+            },
+            functionSchema={
+                'functions': [{
+                    'name': 'search_documents',
+                    'description': "Finds the passages in the chatbot's documents most relevant to a query. "
+                                   "Use it to answer questions about the documents.",
+                    'parameters': {
+                        'query': {
+                            'type': 'string',
+                            'description': 'What to look for, phrased as a question or keywords',
+                            'required': True
+                        }
+                    }
+                }]
+            }
+        )
+        action_group = response['agentActionGroup']
+        print(f"Lite knowledge base action group created: {json.dumps(action_group, default=str)}")
+        return action_group
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConflictException':
+            # Created by an earlier run for the same chatbot
+            return find_action_group(agent_id, agent_version, action_group_name)
+        print(f"Error creating lite knowledge base action group: {e.response['Error']['Message']}")
+        raise
+
+def find_action_group(agent_id, agent_version, action_group_name):
+    request = {'agentId': agent_id, 'agentVersion': agent_version, 'maxResults': 100}
+    while True:
+        response = bedrock_agent.list_agent_action_groups(**request)
+        for summary in response['actionGroupSummaries']:
+            if summary['actionGroupName'] == action_group_name:
+                action_group = bedrock_agent.get_agent_action_group(
+                    agentId=agent_id, agentVersion=agent_version, actionGroupId=summary['actionGroupId']
+                )['agentActionGroup']
+                print(f"Action Group already exists: {json.dumps(action_group, default=str)}")
+                return action_group
+        if not response.get('nextToken'):
+            raise ValueError(f"Action Group {action_group_name} conflicts but was not found")
+        request['nextToken'] = response['nextToken']
+
 def get_lambda_arn():
     try:
         # List Lambda functions and get the first one's ARN
@@ -115,9 +156,13 @@ def create_action_groups(agent_id, agent_version, chatbot_id):
                     }
                 )
                 created_action_group = response['agentActionGroup']
-                print(f"Action Group created: {json.dumps(created_action_group)}")
+                print(f"Action Group created: {json.dumps(created_action_group, default=str)}")
                 created_action_groups.append(created_action_group)
             except ClientError as e:
+                if e.response['Error']['Code'] == 'ConflictException':
+                    # Created by an earlier run for the same chatbot
+                    created_action_groups.append(find_action_group(agent_id, agent_version, action_group['name']))
+                    continue
                 print(f"Error creating Action Group: {e.response['Error']['Message']}")
                 print(f"Full error response: {json.dumps(e.response)}")
                 raise Exception(f"Failed to create Action Group: {e.response['Error']['Message']}")
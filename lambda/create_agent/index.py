@@ -1,13 +1,13 @@
+import hashlib
 import json
 import os
-import boto3
 import re
-import uuid
 from botocore.exceptions import ClientError
+from aws_clients import lazy_client, lazy_table
+from chatbot_settings import CHATBOT_TUNING_ATTRIBUTES
 
-bedrock_agent = boto3.client('bedrock-agent')
-dynamodb = boto3.resource('dynamodb')
-chatbot_table = dynamodb.Table('InfrastructureStack-ChatbotTable881A2A75-13FEN4HTYJS09')
+bedrock_agent = lazy_client('bedrock-agent')
+chatbot_table = lazy_table('CHATBOT_TABLE_NAME')
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
@@ -65,9 +65,10 @@ def sanitize_agent_name(name):
     return sanitized
 
 def create_bedrock_agent(chatbot):
-    # Sanitize the agent name and append a unique identifier
+    # Sanitize the agent name and append an identifier derived from the chatbot, so a re-run
+    # for the same chatbot finds the agent it created before instead of creating another
     base_name = chatbot.get('name', 'Agent')
-    unique_suffix = uuid.uuid4().hex[:8]  # Generate a short unique identifier
+    unique_suffix = hashlib.sha256(chatbot['id'].encode()).hexdigest()[:8]
     agent_name = sanitize_agent_name(f"Agent-{base_name}-{unique_suffix}")
 
     # Ensure the instruction is at least 40 characters long
@@ -97,21 +98,40 @@ def create_bedrock_agent(chatbot):
         if encryption_key_arn:
             create_agent_params['customerEncryptionKeyArn'] = encryption_key_arn
 
-        response = bedrock_agent.create_agent(**create_agent_params)
-
-        agent = response['agent']
-        print(f"Bedrock Agent created: {agent}")
+        try:
+            agent = bedrock_agent.create_agent(**create_agent_params)['agent']
+            print(f"Bedrock Agent created: {agent}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConflictException':
+                raise
+            # Created by an earlier run for the same chatbot
+            agent = find_agent_by_name(agent_name)
+            print(f"Bedrock Agent already exists: {agent}")
         return {
             'agentId': agent['agentId'],
             'agentArn': agent['agentArn'],
             'agentName': agent['agentName'],
+            'foundationModel': foundation_model,
             'chatbotId': chatbot['id'],
-            'projectId': chatbot['projectId']
+            'projectId': chatbot['projectId'],
+            # DynamoDB numbers are Decimals, which the step's JSON body cannot carry
+            **{name: float(chatbot[name]) for name in CHATBOT_TUNING_ATTRIBUTES if name in chatbot}
         }
     except ClientError as e:
         print(f"Error creating Bedrock Agent: {e.response['Error']['Message']}")
         raise
 
+def find_agent_by_name(agent_name):
+    request = {'maxResults': 100}
+    while True:
+        response = bedrock_agent.list_agents(**request)
+        for summary in response['agentSummaries']:
+            if summary['agentName'] == agent_name:
+                return bedrock_agent.get_agent(agentId=summary['agentId'])['agent']
+        if not response.get('nextToken'):
+            raise ValueError(f"Agent {agent_name} conflicts but was not found")
+        request['nextToken'] = response['nextToken']
+
 def check_chatbot_exists(chatbot_id, project_id):
     print(f"Checking existence of chatbot with id: {chatbot_id} and projectId: {project_id}")
     try:
@@ -1,42 +1,24 @@
 import json
-import boto3
 from botocore.exceptions import ClientError
+from bedrock_agent_wrapper import BedrockAgentWrapper
+from event_helpers import provisioning_handler, response, step_body
 
-bedrock_agent = boto3.client('bedrock-agent')
+agents = BedrockAgentWrapper()
 
+@provisioning_handler("creating Agent Alias")
 def handler(event, context):
-    print(f"Received event: {json.dumps(event)}")
-
-    agent_id = event['agentId']
-    chatbot = event['chatbot']
-
-    try:
-        # Create an agent alias
-        agent_alias = create_agent_alias(agent_id, chatbot)
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps(agent_alias)
-        }
-    except Exception as e:
-        print(f"Error creating Agent Alias: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Error creating Agent Alias: {str(e)}")
-        }
-
-def create_agent_alias(agent_id, chatbot):
-    alias_name = f"Alias-{chatbot['name']}"
+    agent_id = step_body(event, 'createAgent')['agentId']
+    alias_name = f"Alias-{event['name']}"
 
+    # Create an agent alias, or find the one an earlier run created before it was recorded
     try:
-        response = bedrock_agent.create_agent_alias(
-            agentId=agent_id,
-            agentAliasName=alias_name
-        )
-
-        agent_alias = response['agentAlias']
-        print(f"Agent Alias created: {json.dumps(agent_alias)}")
-        return agent_alias
+        agent_alias = agents.create_agent_alias(alias_name, agent_id)
+        print(f"Agent Alias created: {json.dumps(agent_alias, default=str)}")
     except ClientError as e:
-        print(f"Error creating Agent Alias: {e.response['Error']['Message']}")
-        raise
\ No newline at end of file
+        if e.response['Error']['Code'] != 'ConflictException':
+            raise
+        agent_alias = agents.find_agent_alias(alias_name, agent_id)
+        if agent_alias is None:
+            raise
+        print(f"Agent Alias already exists: {json.dumps(agent_alias, default=str)}")
+    return response(200, agent_alias)
@@ -1,10 +1,10 @@
 import json
 import os
-import boto3
 from botocore.exceptions import ClientError
+from aws_clients import lazy_client
 
-bedrock_agent = boto3.client('bedrock-agent')
-opensearch_serverless = boto3.client('opensearchserverless')
+bedrock_agent = lazy_client('bedrock-agent')
+opensearch_serverless = lazy_client('opensearchserverless')
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
@@ -12,6 +12,8 @@ def handler(event, context):
     try:
         chatbot_id = event['chatbotId']
         collection_arn = event['opensearchCollection']['Payload']['collectionArn']
+        # Chatbots in a shared collection each have their own index
+        vector_index_name = event['opensearchCollection']['Payload'].get('vectorIndexName', 'bedrock-kb-index')
 
         # Verify the OpenSearch collection
         verify_opensearch_collection(collection_arn)
@@ -21,21 +23,26 @@ def handler(event, context):
         role_arn = os.environ['KNOWLEDGE_BASE_ROLE_ARN']
         embedding_model_arn = os.environ['EMBEDDING_MODEL_ARN']
 
-        response = bedrock_agent.create_knowledge_base(
+        vector_configuration = {'embeddingModelArn': embedding_model_arn}
+        if os.environ.get('EMBEDDING_DIMENSION'):
+            # Must match the dimension the vector index was created with
+            vector_configuration['embeddingModelConfiguration'] = {
+                'bedrockEmbeddingModelConfiguration': {'dimensions': int(os.environ['EMBEDDING_DIMENSION'])}
+            }
+
+        create_knowledge_base_params = dict(
             name=knowledge_base_name,
             description=description,
             roleArn=role_arn,
             knowledgeBaseConfiguration={
                 'type': 'VECTOR',
-                'vectorKnowledgeBaseConfiguration': {
-                    'embeddingModelArn': embedding_model_arn
-                }
+                'vectorKnowledgeBaseConfiguration': vector_configuration
             },
             storageConfiguration={
                 'type': 'OPENSEARCH_SERVERLESS',
                 'opensearchServerlessConfiguration': {
                     'collectionArn': collection_arn,
-                    'vectorIndexName': 'bedrock-kb-index',
+                    'vectorIndexName': vector_index_name,
                     'fieldMapping': {
                         'vectorField': 'bedrock_embedding',
                         'textField': 'bedrock_text',
@@ -45,14 +52,21 @@ def handler(event, context):
             }
         )
 
-        knowledge_base = response['knowledgeBase']
-        print(f"Knowledge Base created: {json.dumps(knowledge_base)}")
+        try:
+            knowledge_base = bedrock_agent.create_knowledge_base(**create_knowledge_base_params)['knowledgeBase']
+            print(f"Knowledge Base created: {json.dumps(knowledge_base, default=str)}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConflictException':
+                raise
+            # Created by an earlier run for the same chatbot
+            knowledge_base = find_knowledge_base_by_name(knowledge_base_name)
+            print(f"Knowledge Base already exists: {json.dumps(knowledge_base, default=str)}")
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'knowledgeBase': knowledge_base,
                 'chatbotId': chatbot_id
-            })
+            }, default=str)
         }
     except KeyError as e:
         print(f"Error accessing key in event: {e}")
@@ -75,6 +89,17 @@ def handler(event, context):
             'body': json.dumps(f"Unexpected error: {str(e)}")
         }
 
+def find_knowledge_base_by_name(knowledge_base_name):
+    request = {'maxResults': 100}
+    while True:
+        response = bedrock_agent.list_knowledge_bases(**request)
+        for summary in response['knowledgeBaseSummaries']:
+            if summary['name'] == knowledge_base_name:
+                return bedrock_agent.get_knowledge_base(knowledgeBaseId=summary['knowledgeBaseId'])['knowledgeBase']
+        if not response.get('nextToken'):
+            raise ValueError(f"Knowledge Base {knowledge_base_name} conflicts but was not found")
+        request['nextToken'] = response['nextToken']
+
 def verify_opensearch_collection(collection_arn):
     try:
         collection_name = collection_arn.split('/')[-1]
@@ -1,20 +1,107 @@
 import json
 import os
-import boto3
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 import hashlib
-import uuid
 import time
+import urllib.error
+import urllib.request
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+import aws_clients
+from aws_clients import lazy_client, lazy_table
+from index_profiles import DEFAULT_INDEX_PROFILE, embedding_dimension, index_body, resolve_profile
+from placement import PlacementAllocator, vector_index_name
 
-opensearch_serverless = boto3.client('opensearchserverless')
-ec2 = boto3.client('ec2')
+opensearch_serverless = lazy_client('opensearchserverless')
+ec2 = lazy_client('ec2')
+
+# Index creation is a data-plane call to the collection endpoint, signed for the aoss service
+INDEX_REQUEST_TIMEOUT_SECONDS = int(os.environ.get('INDEX_REQUEST_TIMEOUT_SECONDS', '30'))
+
+# Warm pool of pre-provisioned collections kept by pool.py; entries move
+# CREATING -> AVAILABLE once the collection is ACTIVE and indexed, then ASSIGNED when claimed
+pool_table = lazy_table('COLLECTION_POOL_TABLE_NAME') if os.environ.get('COLLECTION_POOL_TABLE_NAME') else None
+CREATING = 'CREATING'
+AVAILABLE = 'AVAILABLE'
+ASSIGNED = 'ASSIGNED'
+STATUS_INDEX_NAME = 'status-index'
+
+# 'dedicated' creates or claims one collection per chatbot; 'shared' packs chatbots into shared
+# collections, each chatbot getting its own vector index
+COLLECTION_TENANCY_MODE = os.environ.get('COLLECTION_TENANCY_MODE', 'dedicated')
+DEFAULT_VECTOR_INDEX_NAME = 'bedrock-kb-index'
+
+# Collections are tagged with the chatbot (or pool entry) they were created for, so a name
+# conflict can tell a re-run's own collection from another owner's
+COLLECTION_OWNER_TAG = 'chatbotId'
+COLLECTION_NAME_CANDIDATES = 3
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
     chatbot_id = event['chatbotId']
-    collection_name = create_unique_name(chatbot_id)
+    # Chatbots may pick an index profile; the vector index is created with it
+    profile_name = resolve_profile(event.get('indexProfile'))
+
+    if COLLECTION_TENANCY_MODE == 'shared' and pool_table is not None:
+        # Sizes the trigger summed from the documents' declared sizes, for the collection's byte limit
+        declared_bytes = int((event.get('documentsManifest') or {}).get('declaredBytes', 0))
+        return place_in_shared_collection(chatbot_id, profile_name, declared_bytes)
+
+    # A warm collection is already ACTIVE and indexed with the default profile; only create
+    # one when the pool is empty or the chatbot wants another profile
+    pooled = claim_collection(chatbot_id) if profile_name == DEFAULT_INDEX_PROFILE else None
+    if pooled is not None:
+        return {
+            'collectionName': pooled['collectionName'],
+            'collectionArn': pooled['collectionArn'],
+            'status': 'ACTIVE',
+            'chatbotId': chatbot_id,
+            'vpcEndpointId': pooled.get('vpcEndpointId'),
+            'vectorIndexName': DEFAULT_VECTOR_INDEX_NAME,
+            'indexProfile': profile_name,
+            'pooled': True
+        }
 
     try:
+        collection_name, collection_arn, vpc_endpoint_id = start_collection(chatbot_id)
+
+        # The state machine polls for ACTIVE with backoff, then creates the index through create_index_handler
+        return {
+            'collectionName': collection_name,
+            'collectionArn': collection_arn,
+            'status': 'CREATING',
+            'chatbotId': chatbot_id,
+            'vpcEndpointId': vpc_endpoint_id,
+            'vectorIndexName': DEFAULT_VECTOR_INDEX_NAME,
+            'indexProfile': profile_name,
+            'pooled': False
+        }
+    except Exception as e:
+        print(f"Error creating OpenSearch Serverless collection: {str(e)}")
+        raise
+
+def create_index_handler(event, context):
+    """Creates the chatbot's vector index once the state machine has seen its collection ACTIVE."""
+    print(f"Received event: {json.dumps(event)}")
+    collection = event['opensearchCollection']['Payload']
+    create_index(
+        collection['collectionName'],
+        collection.get('vectorIndexName', DEFAULT_VECTOR_INDEX_NAME),
+        collection.get('indexProfile')
+    )
+    return {**collection, 'status': 'ACTIVE'}
+
+def start_collection(owner):
+    """Creates the policies and collection for ``owner``, or finds the ones an earlier run created.
+
+    Returns ``(collection_name, collection_arn, vpc_endpoint_id)``. Names are derived from the
+    owner; in the unlikely case one is held by another owner's collection, the next candidate
+    name is tried.
+    """
+    for attempt in range(COLLECTION_NAME_CANDIDATES):
+        collection_name = create_unique_name(owner, attempt)
+
         # Create security policy
         create_security_policy(collection_name)
 
@@ -25,29 +112,94 @@ def handler(event, context):
         create_data_access_policy(collection_name)
 
         # Create collection
-        collection_arn = create_collection(collection_name)
+        collection_arn = create_collection(collection_name, owner)
+        if collection_arn is not None:
+            return collection_name, collection_arn, vpc_endpoint_id
+    raise Exception(f"No free collection name for {owner} after {COLLECTION_NAME_CANDIDATES} candidates")
 
-        # Wait for collection to be active
-        wait_for_collection_active(collection_name)
+def place_in_shared_collection(chatbot_id, profile_name=DEFAULT_INDEX_PROFILE, size_bytes=0):
+    """Gives the chatbot its own vector index in a shared collection, opening one when all are full."""
+    allocator = PlacementAllocator(pool_table, STATUS_INDEX_NAME)
+    placement = allocator.allocate(chatbot_id, size_bytes)
 
-        # Create index
-        create_index(collection_name)
+    if placement is None:
+        # Every shared collection is full; promote a warm one, or create one as a last resort
+        for item in query_status(AVAILABLE, limit=5):
+            placement = allocator.adopt(item['collectionName'], chatbot_id, from_status=AVAILABLE, size_bytes=size_bytes)
+            if placement is not None:
+                break
+    if placement is None:
+        collection_name, collection_arn, vpc_endpoint_id = start_collection(chatbot_id)
+        placement = allocator.open_collection(collection_name, collection_arn, vpc_endpoint_id, chatbot_id, size_bytes)
+    print(f"Placed chatbot {chatbot_id} in shared collection {placement['collectionName']} "
+          f"holding {placement['indexCount']} indexes and {placement.get('sizeBytes', 0)} declared bytes")
 
-        return {
-            'collectionName': collection_name,
-            'collectionArn': collection_arn,
-            'status': 'ACTIVE',
-            'chatbotId': chatbot_id,
-            'vpcEndpointId': vpc_endpoint_id
-        }
-    except Exception as e:
-        print(f"Error creating OpenSearch Serverless collection: {str(e)}")
-        raise
+    # Provisioning a chatbot in an ACTIVE shared collection is only its index; a collection
+    # that is still being created gets it from create_index_handler once it is ACTIVE
+    index_name = vector_index_name(chatbot_id)
+    status = get_collection_status(placement['collectionName'])
+    if status == 'ACTIVE':
+        create_index(placement['collectionName'], index_name, profile_name)
+    return {
+        'collectionName': placement['collectionName'],
+        'collectionArn': placement['collectionArn'],
+        'status': status,
+        'chatbotId': chatbot_id,
+        'vpcEndpointId': placement.get('vpcEndpointId'),
+        'vectorIndexName': index_name,
+        'indexProfile': profile_name,
+        'tenancy': 'shared'
+    }
+
+def claim_collection(chatbot_id, candidates=5):
+    """Atomically assigns an AVAILABLE pooled collection to a chatbot; returns the item or None."""
+    if pool_table is None:
+        return None
+    for item in query_status(AVAILABLE, limit=candidates):
+        try:
+            response = pool_table.update_item(
+                Key={'collectionName': item['collectionName']},
+                UpdateExpression='set #status = :assigned, chatbotId = :c, assignedAt = :now',
+                ConditionExpression='#status = :available',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':assigned': ASSIGNED,
+                    ':available': AVAILABLE,
+                    ':c': chatbot_id,
+                    ':now': int(time.time())
+                },
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error claiming pooled collection: {e.response['Error']['Message']}")
+                return None
+            # Another provisioning run claimed it first; try the next one
+            continue
+        print(f"Claimed pooled collection {item['collectionName']} for chatbot {chatbot_id}")
+        return response['Attributes']
+    return None
+
+def query_status(status, limit=None):
+    query = {
+        'IndexName': STATUS_INDEX_NAME,
+        'KeyConditionExpression': Key('status').eq(status)
+    }
+    if limit:
+        query['Limit'] = limit
+    items = []
+    while True:
+        response = pool_table.query(**query)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response or (limit and len(items) >= limit):
+            return items
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
-def create_unique_name(chatbot_id):
-    short_hash = hashlib.md5(chatbot_id.encode()).hexdigest()[:4]
-    unique_id = str(uuid.uuid4())[:4]
-    return f"kb-{short_hash}-{unique_id}"
+def create_unique_name(owner, attempt=0):
+    # Deterministic, so a re-run for the same chatbot finds the collection it created before;
+    # 13 characters is the most that keeps "<name>-data-access-policy" within the 32-character limit
+    seed = owner if attempt == 0 else f"{owner}#{attempt}"
+    return f"kb-{hashlib.sha256(seed.encode()).hexdigest()[:10]}"
 
 def create_security_policy(collection_name):
     policy_name = f"{collection_name}-security-policy"
@@ -62,6 +214,9 @@ def create_security_policy(collection_name):
         )
         print(f"Security policy created: {policy_name}")
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConflictException':
+            print(f"Security policy already exists: {policy_name}")
+            return
         print(f"Error creating security policy: {e.response['Error']['Message']}")
         raise
 
@@ -133,73 +288,74 @@ def create_data_access_policy(collection_name):
         )
         print(f"Data access policy created: {policy_name}")
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConflictException':
+            print(f"Data access policy already exists: {policy_name}")
+            return
         print(f"Error creating data access policy: {e.response['Error']['Message']}")
         raise
 
 
-def create_collection(collection_name):
+def create_collection(collection_name, owner):
+    """Creates the collection tagged with its owner; returns None if another owner holds the name."""
     try:
         response = opensearch_serverless.create_collection(
             name=collection_name,
             type='VECTORSEARCH',
-            description='OpenSearch collection for Bedrock knowledge base'
+            description='OpenSearch collection for Bedrock knowledge base',
+            tags=[{'key': COLLECTION_OWNER_TAG, 'value': owner}]
         )
         collection_arn = response['createCollectionDetail']['arn']
         print(f"OpenSearch Serverless collection created: {collection_arn}")
         return collection_arn
     except ClientError as e:
+        if e.response['Error']['Code'] == 'ConflictException':
+            # Created by an earlier run for the same owner, unless its tag says otherwise
+            collection_arn = opensearch_serverless.batch_get_collection(names=[collection_name])['collectionDetails'][0]['arn']
+            tags = opensearch_serverless.list_tags_for_resource(resourceArn=collection_arn)['tags']
+            holder = next((tag['value'] for tag in tags if tag['key'] == COLLECTION_OWNER_TAG), None)
+            if holder != owner:
+                print(f"OpenSearch Serverless collection {collection_name} belongs to {holder}, not {owner}")
+                return None
+            print(f"OpenSearch Serverless collection already exists: {collection_arn}")
+            return collection_arn
         print(f"Error creating collection: {e.response['Error']['Message']}")
         raise
 
-def wait_for_collection_active(collection_name):
-    max_attempts = 60
-    for attempt in range(max_attempts):
-        try:
-            response = opensearch_serverless.batch_get_collection(names=[collection_name])
-            if response['collectionDetails'][0]['status'] == 'ACTIVE':
-                print(f"Collection {collection_name} is now active")
-                return
-        except ClientError as e:
-            print(f"Error checking collection status: {e.response['Error']['Message']}")
-        time.sleep(10)
-    raise Exception(f"Collection {collection_name} did not become active within the expected time")
+def get_collection_status(collection_name):
+    response = opensearch_serverless.batch_get_collection(names=[collection_name])
+    return response['collectionDetails'][0]['status']
+
+def create_index(collection_name, index_name=DEFAULT_VECTOR_INDEX_NAME, profile_name=None):
+    """Creates the k-NN index with a SigV4-signed request to the collection endpoint.
 
-def create_index(collection_name):
+    Succeeds if the index already exists, so a retried step does not fail.
+    """
+    profile_name = resolve_profile(profile_name)
+    body = json.dumps(index_body(profile_name, embedding_dimension())).encode('utf-8')
+    endpoint = get_collection_endpoint(collection_name)
+    if not endpoint.startswith('https://'):
+        endpoint = f"https://{endpoint}"
+    url = f"{endpoint}/{index_name}"
+
+    # aoss rejects signed requests with a body unless they carry the payload hash
+    request = AWSRequest(method='PUT', url=url, data=body, headers={
+        'Content-Type': 'application/json',
+        'X-Amz-Content-SHA256': hashlib.sha256(body).hexdigest()
+    })
+    session = aws_clients.session()
+    SigV4Auth(session.get_credentials(), 'aoss', session.region_name).add_auth(request)
     try:
-        endpoint = get_collection_endpoint(collection_name)
-        # Here you would typically use the requests library to send a PUT request to create an index
-        # For this example, we'll just print the instructions
-        print(f"To create an index, send a PUT request to: https://{endpoint}/{collection_name}")
-        print("With the following body:")
-        print(json.dumps({
-            "settings": {
-                "index": {
-                    "knn": True,
-                    "knn.algo_param.ef_search": 512
-                }
-            },
-            "mappings": {
-                "properties": {
-                    "bedrock_embedding": {
-                        "type": "knn_vector",
-                        "dimension": 1536,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "l2",
-                            "engine": "nmslib",
-                            "parameters": {
-                                "ef_construction": 512,
-                                "m": 16
-                            }
-                        }
-                    },
-                    "bedrock_text": {"type": "text"},
-                    "bedrock_metadata": {"type": "object"}
-                }
-            }
-        }, indent=2))
-    except Exception as e:
-        print(f"Error creating index: {str(e)}")
+        with urllib.request.urlopen(
+            urllib.request.Request(url, data=body, headers=dict(request.headers), method='PUT'),
+            timeout=INDEX_REQUEST_TIMEOUT_SECONDS
+        ) as response:
+            print(f"Created index {index_name} in {collection_name} with profile {profile_name}: {response.read().decode('utf-8')}")
+    except urllib.error.HTTPError as e:
+        error = e.read().decode('utf-8')
+        if e.code == 400 and 'resource_already_exists_exception' in error:
+            print(f"Index {index_name} already exists in {collection_name}")
+            return
+        print(f"Error creating index: {e.code} {error}")
         raise
 
 def get_collection_endpoint(collection_name):
@@ -0,0 +1,103 @@
+import json
+import os
+
+# Named k-NN index profiles trading query latency, recall and memory against each other.
+# ef_search is the candidate list size at query time, ef_construction at build time, and m the
+# number of graph links per vector; memory grows with m, and the fp16 scalar quantizer halves it.
+INDEX_PROFILES = {
+    'latency': {
+        'engine': 'faiss',
+        'space_type': 'l2',
+        'm': 16,
+        'ef_construction': 128,
+        'ef_search': 64,
+    },
+    'recall': {
+        'engine': 'faiss',
+        'space_type': 'l2',
+        'm': 32,
+        'ef_construction': 512,
+        'ef_search': 512,
+    },
+    'memory': {
+        'engine': 'faiss',
+        'space_type': 'l2',
+        'm': 8,
+        'ef_construction': 256,
+        'ef_search': 128,
+        'encoder': {'name': 'sq', 'parameters': {'type': 'fp16'}},
+    },
+}
+
+# Profiles measured by benchmarks/index_profiles.py on a representative corpus replace the defaults
+BENCHMARKED_PROFILES_PATH = os.path.join(os.path.dirname(__file__), 'index_profiles.json')
+if os.path.exists(BENCHMARKED_PROFILES_PATH):
+    with open(BENCHMARKED_PROFILES_PATH) as f:
+        INDEX_PROFILES.update(json.load(f)['profiles'])
+DEFAULT_INDEX_PROFILE = os.environ.get('DEFAULT_INDEX_PROFILE', 'recall')
+
+# Output dimension of each embedding model; the index must match it exactly
+EMBEDDING_DIMENSIONS = {
+    'amazon.titan-embed-text-v1': 1536,
+    'amazon.titan-embed-text-v2:0': 1024,
+    'amazon.titan-embed-image-v1': 1024,
+    'cohere.embed-english-v3': 1024,
+    'cohere.embed-multilingual-v3': 1024,
+}
+
+def embedding_dimension(model_arn=None):
+    """Vector dimension of the configured embedding model; EMBEDDING_DIMENSION overrides it,
+    e.g. for Titan Text v2 configured with 256 or 512 dimensions."""
+    if os.environ.get('EMBEDDING_DIMENSION'):
+        return int(os.environ['EMBEDDING_DIMENSION'])
+    model_arn = model_arn or os.environ['EMBEDDING_MODEL_ARN']
+    model_id = model_arn.split('/')[-1]
+    if model_id not in EMBEDDING_DIMENSIONS:
+        raise ValueError(f"Unknown embedding model {model_id}; set EMBEDDING_DIMENSION")
+    return EMBEDDING_DIMENSIONS[model_id]
+
+def resolve_profile(name=None):
+    """Returns the profile name to use, falling back to the default for unknown names."""
+    if name and name in INDEX_PROFILES:
+        return name
+    if name:
+        print(f"Unknown index profile {name}; using {DEFAULT_INDEX_PROFILE}")
+    return DEFAULT_INDEX_PROFILE
+
+def index_body(profile_name, dimension):
+    """Index settings and Bedrock knowledge base field mappings for a profile."""
+    profile = INDEX_PROFILES[profile_name]
+    parameters = {
+        'm': profile['m'],
+        'ef_construction': profile['ef_construction'],
+    }
+    settings = {'knn': True}
+    if profile['engine'] == 'nmslib':
+        # nmslib takes ef_search as an index setting rather than a method parameter
+        settings['knn.algo_param.ef_search'] = profile['ef_search']
+    else:
+        parameters['ef_search'] = profile['ef_search']
+    if 'encoder' in profile:
+        parameters['encoder'] = profile['encoder']
+    return {
+        'settings': {
+            'index': settings
+        },
+        'mappings': {
+            '_meta': {'indexProfile': profile_name},
+            'properties': {
+                'bedrock_embedding': {
+                    'type': 'knn_vector',
+                    'dimension': dimension,
+                    'method': {
+                        'name': 'hnsw',
+                        'space_type': profile['space_type'],
+                        'engine': profile['engine'],
+                        'parameters': parameters
+                    }
+                },
+                'bedrock_text': {'type': 'text'},
+                'bedrock_metadata': {'type': 'text', 'index': False}
+            }
+        }
+    }
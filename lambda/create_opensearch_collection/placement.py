@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import time
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+SHARED = 'SHARED'
+
+# A shared collection stops taking new chatbots once either threshold would be exceeded
+SHARED_COLLECTION_MAX_INDEXES = int(os.environ.get('SHARED_COLLECTION_MAX_INDEXES', '20'))
+SHARED_COLLECTION_MAX_BYTES = int(os.environ.get('SHARED_COLLECTION_MAX_BYTES', str(50 * 1024 ** 3)))
+
+def vector_index_name(chatbot_id):
+    # OpenSearch index names are lowercase; the hash keeps truncated or sanitized IDs unique
+    short_hash = hashlib.md5(chatbot_id.encode()).hexdigest()[:8]
+    sanitized = re.sub(r'[^a-z0-9-]', '', chatbot_id.lower())[:40]
+    return f"kb-{short_hash}-{sanitized}".rstrip('-')
+
+class PlacementAllocator:
+    """Packs chatbots into shared collections, one vector index per chatbot.
+
+    Shared collections are items of the collection pool table with status ``SHARED``, an
+    ``indexCount``, the ``chatbots`` placed in them and ``sizeBytes``, the sum of the document
+    sizes their chatbots declared. Placing a chatbot is a conditional ``ADD`` on the fullest
+    collection that still has room for it, so concurrent placements can never overfill a
+    collection.
+    """
+
+    def __init__(self, table, status_index_name, max_indexes=SHARED_COLLECTION_MAX_INDEXES,
+                 max_bytes=SHARED_COLLECTION_MAX_BYTES):
+        """
+        :param table: The collection pool DynamoDB Table resource keyed by ``collectionName``.
+        :param status_index_name: GSI of the table keyed by ``status``.
+        :param max_indexes: Chatbot indexes per shared collection.
+        :param max_bytes: Declared document bytes per shared collection.
+        """
+        self.table = table
+        self.status_index_name = status_index_name
+        self.max_indexes = max_indexes
+        self.max_bytes = max_bytes
+
+    def shared_collections(self):
+        query = {
+            'IndexName': self.status_index_name,
+            'KeyConditionExpression': Key('status').eq(SHARED)
+        }
+        items = []
+        while True:
+            response = self.table.query(**query)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def allocate(self, chatbot_id, size_bytes=0):
+        """Places the chatbot in an existing shared collection; returns its item, or None when all are full.
+
+        ``size_bytes`` is the size of the chatbot's documents as declared in its event; documents
+        without a declared size count for nothing, and the index limit bounds them.
+        """
+        collections = self.shared_collections()
+        # A re-run finds the collection the chatbot was placed in before, even one that is full now
+        for item in collections:
+            if chatbot_id in item.get('chatbots', set()):
+                return item
+
+        # Collections recorded before sizes were tracked have no sizeBytes and count as empty
+        room = self.max_bytes - size_bytes
+        candidates = [
+            item for item in collections
+            if int(item.get('indexCount', 0)) < self.max_indexes and int(item.get('sizeBytes', 0)) <= room
+        ]
+        # Fill the fullest collections first so new ones are only opened when needed
+        candidates.sort(key=lambda item: int(item.get('indexCount', 0)), reverse=True)
+
+        for item in candidates:
+            try:
+                response = self.table.update_item(
+                    Key={'collectionName': item['collectionName']},
+                    UpdateExpression='add indexCount :one, sizeBytes :size, chatbots :c',
+                    ConditionExpression=(
+                        '#status = :shared AND indexCount < :max_indexes AND '
+                        '(attribute_not_exists(sizeBytes) OR sizeBytes <= :room)'
+                    ),
+                    ExpressionAttributeNames={'#status': 'status'},
+                    ExpressionAttributeValues={
+                        ':one': 1,
+                        ':size': size_bytes,
+                        ':c': {chatbot_id},
+                        ':shared': SHARED,
+                        ':max_indexes': self.max_indexes,
+                        ':room': room
+                    },
+                    ReturnValues='ALL_NEW'
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Filled up by a concurrent placement; try the next one
+                continue
+            return response['Attributes']
+        return None
+
+    def adopt(self, collection_name, chatbot_id, from_status, size_bytes=0):
+        """Turns a warm pooled collection into a new shared collection holding this chatbot."""
+        try:
+            response = self.table.update_item(
+                Key={'collectionName': collection_name},
+                UpdateExpression=(
+                    'set #status = :shared, indexCount = :one, sizeBytes = :size, chatbots = :c, sharedAt = :now'
+                ),
+                ConditionExpression='#status = :from',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':shared': SHARED,
+                    ':from': from_status,
+                    ':one': 1,
+                    ':size': size_bytes,
+                    ':c': {chatbot_id},
+                    ':now': int(time.time())
+                },
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            raise
+        return response['Attributes']
+
+    def open_collection(self, collection_name, collection_arn, vpc_endpoint_id, chatbot_id, size_bytes=0):
+        """Records a newly created collection as shared, holding this chatbot."""
+        item = {
+            'collectionName': collection_name,
+            'collectionArn': collection_arn,
+            'vpcEndpointId': vpc_endpoint_id,
+            'status': SHARED,
+            'indexCount': 1,
+            'sizeBytes': size_bytes,
+            'chatbots': {chatbot_id},
+            'createdAt': int(time.time())
+        }
+        self.table.put_item(Item=item)
+        return item
@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from botocore.exceptions import ClientError
+from index import (
+    AVAILABLE,
+    CREATING,
+    create_index,
+    opensearch_serverless,
+    pool_table,
+    query_status,
+    start_collection,
+)
+
+# Number of collections kept warm, ACTIVE or on their way, and never assigned
+COLLECTION_POOL_TARGET_SIZE = int(os.environ.get('COLLECTION_POOL_TARGET_SIZE', '2'))
+
+# batch_get_collection accepts at most 100 names per call
+BATCH_GET_LIMIT = 100
+
+def handler(event, context):
+    """Scheduled pool manager: promotes collections that became ACTIVE and tops the pool up."""
+    print(f"Received event: {json.dumps(event)}")
+
+    promoted, failed = promote_ready_collections()
+    available = len(query_status(AVAILABLE))
+    creating = len(query_status(CREATING))
+
+    created = []
+    for _ in range(max(0, COLLECTION_POOL_TARGET_SIZE - available - creating)):
+        created.append(create_pooled_collection())
+
+    summary = {
+        'available': available,
+        'creating': creating + len(created),
+        'promoted': promoted,
+        'failed': failed,
+        'created': created
+    }
+    print(f"Collection pool: {json.dumps(summary)}")
+    return summary
+
+def create_pooled_collection():
+    # Same resources as on-demand creation, but nobody waits for the collection to become ACTIVE
+    collection_name, collection_arn, vpc_endpoint_id = start_collection(f"pool-{time.time()}")
+    pool_table.put_item(Item={
+        'collectionName': collection_name,
+        'collectionArn': collection_arn,
+        'vpcEndpointId': vpc_endpoint_id,
+        'status': CREATING,
+        'createdAt': int(time.time())
+    })
+    return collection_name
+
+def promote_ready_collections():
+    creating = query_status(CREATING)
+    promoted, failed = [], []
+    for start in range(0, len(creating), BATCH_GET_LIMIT):
+        names = [item['collectionName'] for item in creating[start:start + BATCH_GET_LIMIT]]
+        try:
+            response = opensearch_serverless.batch_get_collection(names=names)
+        except ClientError as e:
+            print(f"Error checking pooled collections: {e.response['Error']['Message']}")
+            continue
+
+        for detail in response['collectionDetails']:
+            if detail['status'] == 'ACTIVE':
+                try:
+                    create_index(detail['name'])
+                except Exception as e:
+                    # Stays CREATING, so the next run retries it; the other collections go on
+                    print(f"Error creating index in pooled collection {detail['name']}: {str(e)}")
+                    continue
+                mark_available(detail['name'])
+                promoted.append(detail['name'])
+            elif detail['status'] == 'FAILED':
+                pool_table.delete_item(Key={'collectionName': detail['name']})
+                failed.append(detail['name'])
+    return promoted, failed
+
+def mark_available(collection_name):
+    # Conditional, so an overlapping run can never hand out a collection twice
+    try:
+        pool_table.update_item(
+            Key={'collectionName': collection_name},
+            UpdateExpression='set #status = :available, availableAt = :now',
+            ConditionExpression='#status = :creating',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':available': AVAILABLE, ':creating': CREATING, ':now': int(time.time())}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
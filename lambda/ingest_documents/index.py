@@ -0,0 +1,136 @@
+import os
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client
+from event_helpers import provisioning_handler, step_body
+
+bedrock_agent = lazy_client('bedrock-agent')
+
+# Chunking applied when the knowledge base ingests documents; a chatbot can override it
+CHUNKING_STRATEGY = os.environ.get('CHUNKING_STRATEGY', 'FIXED_SIZE')
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', '300'))
+CHUNK_OVERLAP_PERCENTAGE = int(os.environ.get('CHUNK_OVERLAP_PERCENTAGE', '20'))
+
+RUNNING_INGESTION_STATUSES = ('STARTING', 'IN_PROGRESS')
+
+@provisioning_handler("starting ingestion", catch=(ClientError,))
+def handler(event, context):
+    """Registers the chatbot's staged documents as an S3 data source and starts ingesting them."""
+    chatbot_id = event['chatbotId']
+    knowledge_base_id = step_body(event, 'knowledgeBase')['knowledgeBase']['knowledgeBaseId']
+    document_count = event['documentsManifest']['count']
+
+    data_source_id = ensure_data_source(knowledge_base_id, chatbot_id, event.get('chunking'))
+    result = {
+        'statusCode': 200,
+        'chatbotId': chatbot_id,
+        'knowledgeBaseId': knowledge_base_id,
+        'dataSourceId': data_source_id
+    }
+    if document_count == 0:
+        print(f"Chatbot {chatbot_id} has no documents to ingest")
+        return {**result, 'status': 'SKIPPED'}
+
+    job = start_ingestion(knowledge_base_id, data_source_id)
+    return {**result, 'ingestionJobId': job['ingestionJobId'], 'status': job['status']}
+
+def chunking_configuration(overrides=None):
+    overrides = overrides or {}
+    strategy = overrides.get('strategy', CHUNKING_STRATEGY)
+    if strategy == 'NONE':
+        return {'chunkingStrategy': 'NONE'}
+    if strategy == 'FIXED_SIZE':
+        return {
+            'chunkingStrategy': 'FIXED_SIZE',
+            'fixedSizeChunkingConfiguration': {
+                'maxTokens': int(overrides.get('maxTokens', CHUNK_MAX_TOKENS)),
+                'overlapPercentage': int(overrides.get('overlapPercentage', CHUNK_OVERLAP_PERCENTAGE))
+            }
+        }
+    if strategy == 'SEMANTIC':
+        return {
+            'chunkingStrategy': 'SEMANTIC',
+            'semanticChunkingConfiguration': {
+                'maxTokens': int(overrides.get('maxTokens', CHUNK_MAX_TOKENS)),
+                'bufferSize': int(overrides.get('bufferSize', 0)),
+                'breakpointPercentileThreshold': int(overrides.get('breakpointPercentileThreshold', 95))
+            }
+        }
+    if strategy == 'HIERARCHICAL':
+        max_tokens = int(overrides.get('maxTokens', CHUNK_MAX_TOKENS))
+        return {
+            'chunkingStrategy': 'HIERARCHICAL',
+            'hierarchicalChunkingConfiguration': {
+                'levelConfigurations': [{'maxTokens': max_tokens * 5}, {'maxTokens': max_tokens}],
+                'overlapTokens': int(overrides.get('overlapTokens', max_tokens * CHUNK_OVERLAP_PERCENTAGE // 100))
+            }
+        }
+    raise ValueError(f"Unknown chunking strategy: {strategy}")
+
+def data_source_name(chatbot_id):
+    return f"documents-{chatbot_id}"[:100]
+
+def ensure_data_source(knowledge_base_id, chatbot_id, chunking=None):
+    """Creates the S3 data source over the chatbot's staged documents, or returns the existing one."""
+    name = data_source_name(chatbot_id)
+    try:
+        response = bedrock_agent.create_data_source(
+            knowledgeBaseId=knowledge_base_id,
+            name=name,
+            dataSourceConfiguration={
+                'type': 'S3',
+                's3Configuration': {
+                    'bucketArn': f"arn:aws:s3:::{os.environ['DOCUMENTS_BUCKET']}",
+                    'inclusionPrefixes': [f"documents/{chatbot_id}/"]
+                }
+            },
+            vectorIngestionConfiguration={'chunkingConfiguration': chunking_configuration(chunking)}
+        )
+        data_source_id = response['dataSource']['dataSourceId']
+        print(f"Data source created: {data_source_id}")
+        return data_source_id
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConflictException':
+            raise
+        data_source_id = find_data_source(knowledge_base_id, name)
+        print(f"Data source already exists: {data_source_id}")
+        return data_source_id
+
+def find_data_source(knowledge_base_id, name):
+    request = {'knowledgeBaseId': knowledge_base_id, 'maxResults': 100}
+    while True:
+        response = bedrock_agent.list_data_sources(**request)
+        for summary in response['dataSourceSummaries']:
+            if summary['name'] == name:
+                return summary['dataSourceId']
+        if not response.get('nextToken'):
+            raise Exception(f"Data source {name} not found in knowledge base {knowledge_base_id}")
+        request['nextToken'] = response['nextToken']
+
+def start_ingestion(knowledge_base_id, data_source_id, reuse_running=True):
+    """Starts an ingestion job.
+
+    A data source runs one job at a time. With ``reuse_running`` a job that is already running
+    is returned instead; otherwise its ConflictException is raised.
+    """
+    try:
+        job = bedrock_agent.start_ingestion_job(
+            knowledgeBaseId=knowledge_base_id,
+            dataSourceId=data_source_id
+        )['ingestionJob']
+        print(f"Ingestion job started: {job['ingestionJobId']}")
+        return job
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConflictException' or not reuse_running:
+            raise
+        for status in RUNNING_INGESTION_STATUSES:
+            response = bedrock_agent.list_ingestion_jobs(
+                knowledgeBaseId=knowledge_base_id,
+                dataSourceId=data_source_id,
+                filters=[{'attribute': 'STATUS', 'operator': 'EQ', 'values': [status]}],
+                maxResults=1
+            )
+            if response['ingestionJobSummaries']:
+                job = response['ingestionJobSummaries'][0]
+                print(f"Ingestion job already running: {job['ingestionJobId']}")
+                return job
+        raise
@@ -0,0 +1,179 @@
+import hashlib
+import http.client
+import ipaddress
+import json
+import os
+import posixpath
+import re
+import socket
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client
+
+s3 = lazy_client('s3')
+
+# Documents staged concurrently per batch; each upload or copy is itself multipart and parallel
+STAGING_CONCURRENCY = int(os.environ.get('STAGING_CONCURRENCY', '8'))
+DOWNLOAD_TIMEOUT_SECONDS = int(os.environ.get('DOWNLOAD_TIMEOUT_SECONDS', '60'))
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True
+)
+
+# Documents are fetched on behalf of whoever configured the chatbot, so sources are limited to
+# these schemes and S3 buckets, and HTTP(S) hosts must resolve to public addresses only
+DOCUMENT_SOURCE_SCHEMES = frozenset(filter(None, os.environ.get('DOCUMENT_SOURCE_SCHEMES', 'https,s3').split(',')))
+DOCUMENT_SOURCE_BUCKETS = frozenset(filter(None, os.environ.get('DOCUMENT_SOURCE_BUCKETS', '').split(',')))
+
+class DocumentStagingError(Exception):
+    """Raised when documents of a batch could not be staged; the Map retries the batch, then fails."""
+
+def handler(event, context):
+    """Stages one batch of a chatbot's documents from the distributed Map into the documents bucket.
+
+    HTTP(S) documents are streamed straight into a multipart upload and S3 documents are copied
+    server side, so nothing is held in memory or /tmp. Keys are derived from the source, so a
+    retried batch overwrites its own objects instead of duplicating them. Content hashes of the
+    staged documents seed the hash manifest, so the first incremental sync uploads only changes.
+    """
+    batch = event['BatchInput']
+    chatbot_id = batch['chatbotId']
+    bucket = os.environ['DOCUMENTS_BUCKET']
+    documents = event['Items']
+    print(f"Staging {len(documents)} documents for chatbot {chatbot_id}")
+
+    with ThreadPoolExecutor(max_workers=STAGING_CONCURRENCY) as executor:
+        results = list(executor.map(lambda document: stage_document(bucket, chatbot_id, document), documents))
+
+    failed = [result for result in results if 'error' in result]
+    print(f"Staged {len(results) - len(failed)} documents, {len(failed)} failed")
+    write_seed_manifest(bucket, chatbot_id, [result for result in results if 'error' not in result])
+    if failed:
+        # A chatbot must not go live silently missing documents
+        raise DocumentStagingError(
+            f"{len(failed)} of {len(documents)} documents failed to stage: "
+            + json.dumps([{'document': result['document'], 'error': result['error']} for result in failed[:10]])
+        )
+    # Only counts leave the Lambda; the Map writes them to S3, not into the execution state
+    return {'chatbotId': chatbot_id, 'staged': len(results)}
+
+def document_source(document):
+    """Source URI of a document given as a URL string or an object with a url or s3Uri."""
+    if isinstance(document, str):
+        return document
+    for field in ('s3Uri', 'url', 'uri'):
+        if document.get(field):
+            return document[field]
+    raise ValueError(f"Document has no source: {json.dumps(document)}")
+
+def check_source(source):
+    """Parsed source URI; raises ValueError unless its scheme, and for S3 its bucket, is allowed."""
+    parsed = urllib.parse.urlparse(source)
+    if parsed.scheme not in DOCUMENT_SOURCE_SCHEMES or parsed.scheme not in ('s3', 'http', 'https'):
+        raise ValueError(f"Unsupported document source: {source}")
+    if parsed.scheme == 's3' and parsed.netloc not in DOCUMENT_SOURCE_BUCKETS:
+        raise ValueError(f"Bucket {parsed.netloc} is not an allowed document source")
+    if parsed.scheme != 's3' and not parsed.hostname:
+        raise ValueError(f"Document source has no host: {source}")
+    return parsed
+
+def public_address(host, port):
+    """Resolves ``host``, refusing private, loopback, link-local and other non-public addresses."""
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"Document host {host} resolves to non-public address {address}")
+    return addresses[0]
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    # Connects to the address that was checked, so a second DNS answer cannot point elsewhere
+    def connect(self):
+        self.sock = socket.create_connection((public_address(self.host, self.port), self.port), self.timeout)
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        sock = socket.create_connection((public_address(self.host, self.port), self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req)
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_source(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+# No proxies: every connection goes through the address checks above
+_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), PublicHTTPHandler, PublicHTTPSHandler, CheckedRedirectHandler
+)
+
+def open_source(source):
+    """Opens an HTTP(S) document for streaming."""
+    return _opener.open(source, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+
+def staged_key(chatbot_id, source, name=None):
+    # The source hash keeps documents with the same file name apart
+    name = name or posixpath.basename(urllib.parse.urlparse(source).path) or 'document'
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', name)[-200:]
+    return f"documents/{chatbot_id}/{hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]}-{name}"
+
+class HashingReader:
+    """File-like wrapper that hashes a stream as the multipart upload reads it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+def stage_document(bucket, chatbot_id, document):
+    """Stages one document; returns its hash manifest entry, or the document and an error."""
+    try:
+        source = document_source(document)
+        key = staged_key(chatbot_id, source, document.get('name') if isinstance(document, dict) else None)
+        parsed = check_source(source)
+        if parsed.scheme == 's3':
+            # Hashed the way sync.py compares S3 documents: by the source object's ETag
+            copy_source = {'Bucket': parsed.netloc, 'Key': parsed.path.lstrip('/')}
+            content_hash = s3.head_object(**copy_source)['ETag'].strip('"')
+            s3.copy(copy_source, bucket, key, Config=TRANSFER_CONFIG)
+        else:
+            with open_source(source) as response:
+                reader = HashingReader(response)
+                s3.upload_fileobj(reader, bucket, key, Config=TRANSFER_CONFIG)
+                content_hash = reader.digest.hexdigest()
+        return {'source': source, 'key': key, 'contentHash': content_hash, 'syncedAt': int(time.time())}
+    except (ClientError, ValueError, OSError) as e:
+        print(f"Error staging document {json.dumps(document)}: {str(e)}")
+        return {'document': document, 'error': str(e)}
+
+def seed_manifest_prefix(chatbot_id):
+    return f"manifests/{chatbot_id}/seed/"
+
+def write_seed_manifest(bucket, chatbot_id, entries):
+    """Writes this batch's part of the seed hash manifest, named after its sources so a retry replaces it."""
+    if not entries:
+        return
+    entries = sorted(entries, key=lambda entry: entry['source'])
+    batch_id = hashlib.sha256('\n'.join(entry['source'] for entry in entries).encode('utf-8')).hexdigest()[:16]
+    body = ''.join(json.dumps(entry, sort_keys=True) + '\n' for entry in entries)
+    s3.put_object(Bucket=bucket, Key=f"{seed_manifest_prefix(chatbot_id)}{batch_id}.jsonl", Body=body.encode('utf-8'),
+                  ContentType='application/x-ndjson')
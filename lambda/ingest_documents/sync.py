@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client, lazy_table
+from index import ensure_data_source, start_ingestion
+from retry_policies import RetryPolicy
+from staging import (
+    STAGING_CONCURRENCY,
+    TRANSFER_CONFIG,
+    check_source,
+    document_source,
+    open_source,
+    s3,
+    seed_manifest_prefix,
+    staged_key,
+)
+
+lambda_client = lazy_client('lambda')
+ledger_table = lazy_table('PROVISIONING_LEDGER_TABLE_NAME') if os.environ.get('PROVISIONING_LEDGER_TABLE_NAME') else None
+
+# Downloads are hashed in memory up to this size and spill to /tmp beyond it
+SPOOL_MAX_BYTES = int(os.environ.get('SYNC_SPOOL_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# A data source runs one ingestion job at a time. A job that is already running may have listed
+# the staged prefix before this sync's uploads, so the sync waits for it to finish and starts its own
+INGESTION_SLOT = RetryPolicy(
+    {'ConflictException'},
+    max_attempts=int(os.environ.get('SYNC_INGESTION_MAX_ATTEMPTS', '8')),
+    base_delay=5.0,
+    max_delay=60.0
+)
+
+def handler(event, context):
+    """Incrementally re-syncs a provisioned chatbot's knowledge base with its current document set.
+
+    Each document's content hash is compared with the chatbot's hash manifest from the last sync:
+    only added and changed documents are uploaded, deleted ones are removed from the staged
+    prefix, and one ingestion job picks up the difference. Accepts a ChatbotDocumentsUpdated
+    event, or the same detail invoked directly, with either documents or a documentsManifest.
+    The first sync after provisioning compares against the hashes seeded by staging.
+    """
+    print(f"Received event: {json.dumps(event)}")
+    detail = event.get('detail', event)
+    chatbot_id = detail['chatbotId']
+    bucket = os.environ['DOCUMENTS_BUCKET']
+    documents = detail['documents'] if 'documents' in detail else read_json(bucket, detail['documentsManifest']['key'])
+
+    previous = read_hash_manifest(bucket, chatbot_id)
+    with ThreadPoolExecutor(max_workers=STAGING_CONCURRENCY) as executor:
+        entries = list(executor.map(lambda document: sync_document(bucket, chatbot_id, document, previous), documents))
+
+    current = {entry['source']: entry for entry in entries if 'error' not in entry}
+    failed = [entry for entry in entries if 'error' in entry]
+    # A document that failed to sync keeps its previous version and manifest entry
+    for entry in failed:
+        if entry['source'] in previous:
+            current[entry['source']] = previous[entry['source']]
+    deleted = [entry for source, entry in previous.items() if source not in current]
+    delete_staged(bucket, [entry['key'] for entry in deleted])
+
+    changes = [entry.get('change') for entry in entries if 'error' not in entry]
+    added, changed = changes.count('added'), changes.count('changed')
+    summary = {'chatbotId': chatbot_id, 'added': added, 'changed': changed, 'deleted': len(deleted),
+               'unchanged': changes.count(None), 'failed': failed}
+    print(f"Document sync: {json.dumps({**summary, 'failed': len(failed)})}")
+
+    if (added or changed or deleted) and has_lite_knowledge_base(chatbot_id):
+        # A lite knowledge base is rebuilt from the staged documents in seconds
+        lambda_client.invoke(
+            FunctionName=os.environ['LITE_INDEX_BUILDER_FUNCTION_NAME'],
+            InvocationType='Event',
+            Payload=json.dumps({'chatbotId': chatbot_id}).encode('utf-8')
+        )
+        summary['liteIndexRebuild'] = True
+    elif added or changed or deleted:
+        knowledge_base_id = provisioned_knowledge_base_id(chatbot_id)
+        data_source_id = ensure_data_source(knowledge_base_id, chatbot_id, detail.get('chunking'))
+        # The manifest is only written once a job started after the uploads; if the running job
+        # outlasts the retries this raises, and the retried invocation computes the same difference
+        job = INGESTION_SLOT.call(start_ingestion, knowledge_base_id, data_source_id, reuse_running=False)
+        summary.update({'knowledgeBaseId': knowledge_base_id, 'dataSourceId': data_source_id,
+                        'ingestionJobId': job['ingestionJobId']})
+
+    write_hash_manifest(bucket, chatbot_id, current.values())
+    return summary
+
+def hash_manifest_key(chatbot_id):
+    return f"manifests/{chatbot_id}/hashes.jsonl"
+
+def read_json(bucket, key):
+    return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+def read_hash_manifest(bucket, chatbot_id):
+    """Source -> entry from the last sync, read line by line from the JSON lines manifest.
+
+    Before the first sync the entries come from the parts staging wrote, one per batch.
+    """
+    try:
+        return read_manifest_entries(bucket, hash_manifest_key(chatbot_id))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchKey':
+            raise
+    entries = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=seed_manifest_prefix(chatbot_id)):
+        for item in page.get('Contents', []):
+            entries.update(read_manifest_entries(bucket, item['Key']))
+    return entries
+
+def read_manifest_entries(bucket, key):
+    entries = {}
+    for line in s3.get_object(Bucket=bucket, Key=key)['Body'].iter_lines():
+        if line:
+            entry = json.loads(line)
+            entries[entry['source']] = entry
+    return entries
+
+def write_hash_manifest(bucket, chatbot_id, entries):
+    entries = sorted(({k: v for k, v in entry.items() if k != 'change'} for entry in entries), key=lambda e: e['source'])
+    body = ''.join(json.dumps(entry, sort_keys=True) + '\n' for entry in entries)
+    s3.put_object(Bucket=bucket, Key=hash_manifest_key(chatbot_id), Body=body.encode('utf-8'),
+                  ContentType='application/x-ndjson')
+
+def sync_document(bucket, chatbot_id, document, previous):
+    """Uploads one document if its content differs from the last sync; returns its manifest entry."""
+    try:
+        source = document_source(document)
+    except ValueError as e:
+        return {'source': json.dumps(document), 'error': str(e)}
+    try:
+        key = staged_key(chatbot_id, source, document.get('name') if isinstance(document, dict) else None)
+        known = previous.get(source)
+        parsed = check_source(source)
+
+        if parsed.scheme == 's3':
+            # An S3 ETag changes with the content, so unchanged objects are never read
+            copy_source = {'Bucket': parsed.netloc, 'Key': parsed.path.lstrip('/')}
+            content_hash = s3.head_object(**copy_source)['ETag'].strip('"')
+            if known and known['contentHash'] == content_hash and known['key'] == key:
+                return {**known, 'change': None}
+            s3.copy(copy_source, bucket, key, Config=TRANSFER_CONFIG)
+        else:
+            with open_source(source) as response, \
+                    tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: response.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    spool.write(chunk)
+                content_hash = digest.hexdigest()
+                if known and known['contentHash'] == content_hash and known['key'] == key:
+                    return {**known, 'change': None}
+                spool.seek(0)
+                s3.upload_fileobj(spool, bucket, key, Config=TRANSFER_CONFIG)
+
+        return {'source': source, 'key': key, 'contentHash': content_hash, 'syncedAt': int(time.time()),
+                'change': 'changed' if known else 'added'}
+    except (ClientError, ValueError, OSError) as e:
+        print(f"Error syncing document {source}: {str(e)}")
+        return {'source': source, 'error': str(e)}
+
+def delete_staged(bucket, keys):
+    # delete_objects takes at most 1000 keys per call
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True})
+
+def has_lite_knowledge_base(chatbot_id):
+    item = ledger_table.get_item(Key={'chatbotId': chatbot_id, 'step': 'liteIndex'}, ConsistentRead=True).get('Item')
+    return item is not None
+
+def provisioned_knowledge_base_id(chatbot_id):
+    """Knowledge base created for the chatbot, from the provisioning ledger's knowledgeBase step."""
+    item = ledger_table.get_item(Key={'chatbotId': chatbot_id, 'step': 'knowledgeBase'}, ConsistentRead=True).get('Item')
+    if item is None:
+        raise Exception(f"Chatbot {chatbot_id} has no provisioned knowledge base")
+    output = json.loads(item['output'])
+    return json.loads(output['body'])['knowledgeBase']['knowledgeBaseId']
@@ -0,0 +1,126 @@
+import os
+import time
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from cache import TTLCache
+
+# Defaults when the chatbot's agent record does not set its own limits (tokens per second, bucket size)
+ADMISSION_CHATBOT_RATE = float(os.environ.get('ADMISSION_CHATBOT_RATE', '2'))
+ADMISSION_CHATBOT_BURST = float(os.environ.get('ADMISSION_CHATBOT_BURST', '10'))
+ADMISSION_PROJECT_RATE = float(os.environ.get('ADMISSION_PROJECT_RATE', '10'))
+ADMISSION_PROJECT_BURST = float(os.environ.get('ADMISSION_PROJECT_BURST', '50'))
+
+# Conditional write attempts before admitting under contention
+MAX_ATTEMPTS = 3
+
+def to_decimal(value):
+    return Decimal(str(round(value, 6)))
+
+class TokenBucketLimiter:
+    """Distributed token buckets per chatbot and per project, ahead of invoke_agent.
+
+    Bucket state lives in the agent table under ``bucket#<scope>#<id>`` keys and is updated
+    with conditional writes on the previous ``updatedAt``, so concurrent instances never both
+    spend the same token. The last state each instance saw is kept locally: it is used as the
+    expected value for the next write, saving a read, and since other instances can only
+    lower the balance, a local estimate below one token rejects without calling DynamoDB.
+    An invocation rejected by the project bucket gets its chatbot token back. The limiter
+    fails open when DynamoDB is unavailable.
+    """
+
+    def __init__(self, table, local_ttl_seconds=5, clock=time.time):
+        self.table = table
+        self.local = TTLCache(max_entries=4096, ttl_seconds=local_ttl_seconds)
+        self.clock = clock
+
+    @staticmethod
+    def limits_for(chatbot_id, agent_details):
+        return [
+            ('chatbot', chatbot_id,
+             float(agent_details.get('admissionRate', ADMISSION_CHATBOT_RATE)),
+             float(agent_details.get('admissionBurst', ADMISSION_CHATBOT_BURST))),
+            ('project', agent_details.get('projectId'),
+             float(agent_details.get('projectAdmissionRate', ADMISSION_PROJECT_RATE)),
+             float(agent_details.get('projectAdmissionBurst', ADMISSION_PROJECT_BURST))),
+        ]
+
+    def admit(self, chatbot_id, agent_details):
+        """Takes a token from every bucket; returns ``(retry_after_seconds, scope)`` or ``(0, None)``."""
+        taken = []
+        for scope, scope_id, rate, burst in self.limits_for(chatbot_id, agent_details):
+            if not scope_id or rate <= 0:
+                continue
+            bucket_key = f"bucket#{scope}#{scope_id}"
+            retry_after = self.take(bucket_key, rate, burst)
+            if retry_after > 0:
+                # The invocation does not run, so the buckets that admitted it get their tokens back
+                for taken_key, taken_rate, taken_burst in taken:
+                    self.refund(taken_key, taken_rate, taken_burst)
+                return retry_after, scope
+            taken.append((bucket_key, rate, burst))
+        return 0, None
+
+    def refund(self, bucket_key, rate, burst):
+        """Returns one token to the bucket, up to its burst."""
+        self.take(bucket_key, rate, burst, count=-1)
+
+    def take(self, bucket_key, rate, burst, count=1):
+        """Takes ``count`` tokens; returns 0, or the seconds until they are available."""
+        state = self.local.get(bucket_key)
+        for attempt in range(MAX_ATTEMPTS):
+            if state is None:
+                state = self.read(bucket_key)
+            now = self.clock()
+            if state is None:
+                tokens = burst
+            else:
+                tokens = min(burst, float(state[0]) + (now - float(state[1])) * rate)
+
+            if tokens < count:
+                self.local.put(bucket_key, state)
+                return (count - tokens) / rate
+
+            new_state = (to_decimal(min(burst, tokens - count)), to_decimal(now))
+            try:
+                self.write(bucket_key, new_state, state)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    print(f"Error updating token bucket {bucket_key}: {e.response['Error']['Message']}")
+                    return 0
+                # Another instance spent tokens since we last looked; re-read and retry
+                state = None
+                continue
+            self.local.put(bucket_key, new_state)
+            return 0
+
+        print(f"Token bucket {bucket_key} is contended, leaving it unchanged")
+        return 0
+
+    def read(self, bucket_key):
+        try:
+            response = self.table.get_item(
+                Key={'chatbotId': bucket_key},
+                ProjectionExpression='tokens, updatedAt',
+                ConsistentRead=True
+            )
+        except ClientError as e:
+            print(f"Error reading token bucket {bucket_key}: {e.response['Error']['Message']}")
+            return None
+        item = response.get('Item')
+        if item is None:
+            return None
+        return item['tokens'], item['updatedAt']
+
+    def write(self, bucket_key, new_state, previous_state):
+        if previous_state is None:
+            condition = 'attribute_not_exists(chatbotId)'
+            values = {':t': new_state[0], ':u': new_state[1]}
+        else:
+            condition = 'updatedAt = :prev'
+            values = {':t': new_state[0], ':u': new_state[1], ':prev': previous_state[1]}
+        self.table.update_item(
+            Key={'chatbotId': bucket_key},
+            UpdateExpression='set tokens = :t, updatedAt = :u',
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
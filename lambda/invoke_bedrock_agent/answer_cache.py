@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from botocore.exceptions import ClientError
+from cache import MISSING, TTLCache
+
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '86400'))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MEMORY_ENTRIES', '512'))
+RESPONSE_CACHE_MEMORY_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_MEMORY_TTL_SECONDS', '300'))
+
+# Stay well below DynamoDB's 400 KB item limit
+MAX_CACHED_ANSWER_BYTES = 350 * 1024
+
+# API Gateway WebSocket connections live at most two hours
+CONNECTION_TTL_SECONDS = 7200
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+def normalize_prompt(input_text):
+    """Folds case, Unicode forms, whitespace and trailing punctuation so trivial variants match."""
+    text = unicodedata.normalize('NFKC', input_text).casefold()
+    text = _WHITESPACE.sub(' ', text).strip()
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+class ResponseCache:
+    """Exact-match answer cache with an in-memory front tier over a DynamoDB table.
+
+    Entries are keyed by chatbot, agent alias and routing version, and the normalized prompt,
+    so a redeployed agent never serves answers produced by its predecessor.
+    """
+
+    def __init__(self, table, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, memory_entries=RESPONSE_CACHE_MEMORY_ENTRIES,
+                 memory_ttl_seconds=RESPONSE_CACHE_MEMORY_TTL_SECONDS):
+        """
+        :param table: DynamoDB Table resource with a ``cacheKey`` partition key and ``expiresAt`` TTL.
+        :param ttl_seconds: How long answers are kept in DynamoDB.
+        :param memory_entries: Size of the in-process front tier.
+        :param memory_ttl_seconds: How long answers are kept in the front tier.
+        """
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries=memory_entries, ttl_seconds=memory_ttl_seconds)
+        self.followup_connections = TTLCache(max_entries=4096, ttl_seconds=CONNECTION_TTL_SECONDS)
+
+    @staticmethod
+    def key(chatbot_id, agent_details, input_text):
+        prompt_hash = hashlib.sha256(normalize_prompt(input_text).encode('utf-8')).hexdigest()
+        return f"{chatbot_id}#{agent_details['agentAliasId']}#{agent_details.get('version', 0)}#{prompt_hash}"
+
+    def claim_first_turn(self, connection_id):
+        """Returns True exactly once per connection, across all Lambda instances.
+
+        The agent session is keyed by the connection, so only its first turn is stateless and
+        safe to answer from, or store into, the cache. Later turns are recognized in memory or
+        by reading the turn marker, so only a connection's first turn pays for the conditional
+        write that makes the claim exclusive.
+        """
+        if self.followup_connections.get(connection_id, False):
+            return False
+        self.followup_connections.put(connection_id, True)
+        turn_key = {'cacheKey': f"turn#{connection_id}"}
+        try:
+            if 'Item' in self.table.get_item(Key=turn_key, ProjectionExpression='cacheKey', ConsistentRead=True):
+                return False
+            self.table.put_item(
+                Item={**turn_key, 'expiresAt': int(time.time()) + CONNECTION_TTL_SECONDS},
+                ConditionExpression='attribute_not_exists(cacheKey)'
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error recording conversation turn: {e.response['Error']['Message']}")
+            return False
+
+    def get(self, cache_key):
+        """Returns ``(answer, tier)`` or ``(None, None)`` on a miss."""
+        answer = self.memory.get(cache_key, MISSING)
+        if answer is not MISSING:
+            return answer, 'Memory'
+
+        try:
+            response = self.table.get_item(
+                Key={'cacheKey': cache_key},
+                ProjectionExpression='answer, expiresAt'
+            )
+        except ClientError as e:
+            print(f"Error reading response cache: {e.response['Error']['Message']}")
+            return None, None
+
+        item = response.get('Item')
+        # DynamoDB TTL deletes lazily, so expired items can still be returned
+        if item is None or int(item['expiresAt']) <= time.time():
+            return None, None
+        self.memory.put(cache_key, item['answer'])
+        return item['answer'], 'DynamoDB'
+
+    def put(self, cache_key, chatbot_id, answer):
+        if not answer or len(answer.encode('utf-8')) > MAX_CACHED_ANSWER_BYTES:
+            return
+        self.memory.put(cache_key, answer)
+        try:
+            self.table.put_item(Item={
+                'cacheKey': cache_key,
+                'chatbotId': chatbot_id,
+                'answer': answer,
+                'expiresAt': int(time.time()) + self.ttl_seconds
+            })
+        except ClientError as e:
+            print(f"Error writing response cache: {e.response['Error']['Message']}")
@@ -1,36 +1,198 @@
+import time
+INIT_STARTED = time.perf_counter()
+
 import json
 import os
-import boto3
-import asyncio
+import aws_clients
+from aws_clients import lazy_client, lazy_table
+from retry_policies import CHAT_RETRIES
 from botocore.exceptions import ClientError
+from admission import TokenBucketLimiter
+from answer_cache import ResponseCache
+from cache import MISSING, TTLCache
+from metrics import InvocationMetrics, emit_metric
+from sessions import FAILED, STREAMING, SessionRegistry
+from semantic_cache import BedrockEmbedder, HashingEmbedder, SemanticCache, load_numpy
+from single_flight import FOLLOWER, LEADER, SingleFlight
+from streaming import IDLE, STREAM_FLUSH_BYTES, ConnectionGone, FanOut, encode_frame, FrameCoalescer, SendPipeline, read_in_background
+
+# Created on first use: $connect and $disconnect return without touching any of them.
+# The chat path fails fast; a throttled invocation is answered with a retry-after instead
+bedrock_agent_runtime = lazy_client('bedrock-agent-runtime', retries=CHAT_RETRIES)
+# Agents are invoked through bedrock-agent-runtime; bedrock-runtime only embeds prompts for the semantic cache
+bedrock_runtime = lazy_client('bedrock-runtime', retries=CHAT_RETRIES)
+agent_table = lazy_table('AGENT_TABLE_NAME')
+api_gateway_management = lazy_client('apigatewaymanagementapi', endpoint_url_env='WEBSOCKET_API_ENDPOINT', retries=CHAT_RETRIES)
+
+# Chatbot -> agent routing rarely changes, so keep it across warm invocations
+AGENT_CACHE_NEGATIVE_TTL_SECONDS = int(os.environ.get('AGENT_CACHE_NEGATIVE_TTL_SECONDS', '30'))
+agent_cache = TTLCache(
+    max_entries=int(os.environ.get('AGENT_CACHE_MAX_ENTRIES', '1024')),
+    ttl_seconds=int(os.environ.get('AGENT_CACHE_TTL_SECONDS', '300'))
+)
+
+# Connections known to be closed, so sends short-circuit instead of calling the management API.
+# API Gateway WebSocket connections live at most two hours.
+dead_connections = TTLCache(max_entries=4096, ttl_seconds=7200)
+
+# How often a streaming invocation looks for connections to attach: single-flight
+# subscribers and clients resuming a session. The interval doubles up to the maximum
+# while nobody new attaches, so a long answer does not poll at the base rate throughout.
+ATTACH_REFRESH_SECONDS = int(os.environ.get('ATTACH_REFRESH_MS', '250')) / 1000.0
+ATTACH_REFRESH_MAX_SECONDS = int(os.environ.get('ATTACH_REFRESH_MAX_MS', '2000')) / 1000.0
+
+# How often a streaming invocation renews its session and single-flight leases
+HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '10'))
+
+# Per-chatbot and per-project token buckets ahead of invoke_agent; bucket state lives in the agent table
+admission_control = None
+if os.environ.get('ADMISSION_CONTROL_ENABLED', 'true') == 'true':
+    admission_control = TokenBucketLimiter(agent_table)
+
+# Seconds a client is asked to wait when Bedrock itself throttles the invocation
+THROTTLED_RETRY_AFTER_SECONDS = float(os.environ.get('THROTTLED_RETRY_AFTER_SECONDS', '2'))
+
+# Resumable sessions keyed by a client-supplied sessionToken
+session_registry = None
+if os.environ.get('STREAM_SESSION_TABLE_NAME'):
+    session_registry = SessionRegistry(lazy_table('STREAM_SESSION_TABLE_NAME'))
 
-bedrock_runtime = boto3.client('bedrock-runtime')
-dynamodb = boto3.resource('dynamodb')
-agent_table = dynamodb.Table(os.environ['AGENT_TABLE_NAME'])
-api_gateway_management = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['WEBSOCKET_API_ENDPOINT'])
+# Optional exact-match answer cache for stateless first turns
+response_cache = None
+if os.environ.get('RESPONSE_CACHE_TABLE_NAME') and os.environ.get('RESPONSE_CACHE_ENABLED', 'true') == 'true':
+    response_cache = ResponseCache(lazy_table('RESPONSE_CACHE_TABLE_NAME'))
 
-async def handler(event, context):
+# Concurrent identical first-turn prompts share one agent invocation; leases live in the cache table
+single_flight = None
+if response_cache and os.environ.get('SINGLE_FLIGHT_ENABLED', 'true') == 'true':
+    single_flight = SingleFlight(response_cache.table)
+
+# Optional semantic tier for paraphrased repeats; shares the first-turn gate of the answer cache
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+semantic_cache = None
+if response_cache and os.environ.get('SEMANTIC_CACHE_ENABLED', 'false') == 'true' and load_numpy():
+    if os.environ.get('SEMANTIC_CACHE_EMBEDDER') == 'local':
+        embedder = HashingEmbedder()
+    else:
+        embedder = BedrockEmbedder(bedrock_runtime, os.environ['EMBEDDING_MODEL_ARN'])
+    semantic_cache = SemanticCache(
+        embedder,
+        s3_client=lazy_client('s3') if os.environ.get('SEMANTIC_CACHE_BUCKET') else None,
+        bucket=os.environ.get('SEMANTIC_CACHE_BUCKET')
+    )
+
+# Provisioned instances initialize before any request arrives, so the chat path's clients are
+# created up front there; on-demand instances create them on the first message instead
+if os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+    aws_clients.warm(bedrock_agent_runtime, agent_table, api_gateway_management)
+
+# Reported once per instance, with the route that paid for the cold start
+INIT_MS = (time.perf_counter() - INIT_STARTED) * 1000.0
+cold_start = True
+
+def handler(event, context):
+    global cold_start
     print(f"Received event: {json.dumps(event)}")
 
     connection_id = event['requestContext']['connectionId']
+    route_key = event['requestContext'].get('routeKey')
+    if cold_start:
+        cold_start = False
+        emit_metric('InitDurationMs', round(INIT_MS, 2), unit='Milliseconds', dimensions={'Route': route_key or 'unknown'})
+    if route_key == '$connect':
+        return {'statusCode': 200}
+    if route_key == '$disconnect':
+        mark_connection_dead(connection_id)
+        return {'statusCode': 200}
+
     body = json.loads(event['body'])
+    if body.get('action') == 'resume':
+        return resume_stream(connection_id, body)
+
     chatbot_id = body['chatbotId']
     input_text = body['inputText']
 
+    timings = InvocationMetrics()
+    model = 'unknown'
+    flight_key = None
+    session = None
     try:
-        # Get agent details
-        agent_details = get_agent_details(chatbot_id)
+        # Get agent details, refreshing the cached routing if the client has seen a newer version
+        with timings.phase('AgentLookupMs'):
+            agent_details = get_agent_details(chatbot_id, min_version=body.get('routingVersion'))
+        model = agent_details.get('foundationModel', model)
+
+        # A stable session token keeps the Bedrock session, and the answer, across reconnects
+        session_id = connection_id  # Using WebSocket connection ID as session ID
+        if session_registry and body.get('sessionToken'):
+            session = session_registry.begin_turn(body['sessionToken'], connection_id)
+            session_id = session['bedrockSessionId']
+
+        # Serve repeated first-turn questions from the answer caches
+        store_answer = None
+        if is_cacheable(body, connection_id, session):
+            cache_key = ResponseCache.key(chatbot_id, agent_details, input_text)
+            with timings.phase('CacheLookupMs'):
+                answer, store_answer = find_cached_answer(chatbot_id, agent_details, input_text, cache_key)
+
+            if answer is None and single_flight is not None:
+                # Join an identical in-flight invocation instead of starting another one
+                role = single_flight.join(cache_key, connection_id, session)
+                # An attached follower's session turn is buffered and closed by the leader
+                if role == FOLLOWER and single_flight.wait_for_leader(cache_key, connection_id):
+                    emit_metric('SingleFlightCoalesced', 1, dimensions={'ChatbotId': chatbot_id})
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps('Subscribed to an in-flight agent answer')
+                    }
+                if role == LEADER:
+                    flight_key = cache_key
+                else:
+                    # A leader may have just finished and cached its answer, or never attached us
+                    answer, _ = response_cache.get(cache_key)
+
+            if answer is not None:
+                frames = replay_answer(answer, connection_id, timings)
+                if session:
+                    # Close the turn like a live answer would, so a resume replays what was sent
+                    for resumed_connection, resume_from in finish_session_turns([session], frames):
+                        if resumed_connection != connection_id:
+                            replay_frames(resumed_connection, frames[resume_from:])
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps('Agent answer served from cache')
+                }
+
+        # Only invocations that reach Bedrock spend tokens; cache hits and followers are free
+        if admission_control is not None:
+            with timings.phase('AdmissionMs'):
+                retry_after, scope = admission_control.admit(chatbot_id, agent_details)
+            if retry_after > 0:
+                return reject_invocation(connection_id, chatbot_id, retry_after, scope, flight_key, session)
 
         # Invoke Bedrock Agent
-        response = bedrock_runtime.invoke_agent(
-            agentId=agent_details['agentId'],
-            agentAliasId=agent_details['agentAliasId'],
-            sessionId=connection_id,  # Using WebSocket connection ID as session ID
-            inputText=input_text
-        )
+        timings.start_stream()
+        with timings.phase('InvokeSetupMs'):
+            try:
+                response = invoke_agent(agent_details, session_id, input_text)
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ThrottlingException':
+                    # The account-level quota is exhausted despite admission control
+                    return reject_invocation(connection_id, chatbot_id, THROTTLED_RETRY_AFTER_SECONDS, 'account', flight_key, session)
+                if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    raise
+                # The cached agent or alias was replaced; reload the routing and retry once
+                invalidate_agent_details(chatbot_id)
+                agent_details = get_agent_details(chatbot_id)
+                response = invoke_agent(agent_details, session_id, input_text)
 
         # Process streaming response
-        await process_streaming_response(response, connection_id)
+        stats, answer = process_streaming_response(
+            response, connection_id, chatbot_id, timings,
+            capture=store_answer is not None, flight_key=flight_key, session=session
+        )
+        if store_answer and answer is not None:
+            store_answer(answer)
 
         return {
             'statusCode': 200,
@@ -38,46 +200,369 @@ async def handler(event, context):
         }
     except Exception as e:
         print(f"Error invoking Bedrock Agent: {str(e)}")
-        await send_error_to_client(connection_id, str(e))
+        send_error_to_client(connection_id, str(e))
+        if flight_key:
+            abandon_flight(flight_key, str(e))
+        if session:
+            session_registry.finish_turn(session['sessionToken'], session['turn'], status=FAILED)
         return {
             'statusCode': 500,
             'body': json.dumps(f"Error invoking Bedrock Agent: {str(e)}")
         }
+    finally:
+        timings.emit(chatbot_id, model)
+
+def reject_invocation(connection_id, chatbot_id, retry_after, scope, flight_key=None, session=None):
+    print(f"Rejected invocation for chatbot {chatbot_id}: {scope} rate limit, retry after {retry_after:.2f}s")
+    emit_metric('AdmissionRejected', 1, dimensions={'ChatbotId': chatbot_id, 'Scope': scope})
+    send_retry_after(connection_id, retry_after, scope)
+    if flight_key:
+        for subscriber, subscriber_session in single_flight.release(flight_key).items():
+            send_retry_after(subscriber, retry_after, scope)
+            if subscriber_session:
+                session_registry.finish_turn(subscriber_session['sessionToken'], subscriber_session['turn'], status=FAILED)
+    if session:
+        session_registry.finish_turn(session['sessionToken'], session['turn'], status=FAILED)
+    return {
+        'statusCode': 429,
+        'body': json.dumps(f"Rate limited, retry after {retry_after:.2f} seconds")
+    }
+
+def is_cacheable(body, connection_id, session=None):
+    if response_cache is None or body.get('cache') is False:
+        return False
+    if session is not None:
+        return int(session['turn']) == 1
+    return response_cache.claim_first_turn(connection_id)
+
+def find_cached_answer(chatbot_id, agent_details, input_text, cache_key):
+    """Looks the prompt up in the exact-match cache, then the semantic cache.
+
+    Returns ``(answer, store_answer)``; on a miss ``answer`` is None and ``store_answer`` saves
+    the live answer into both tiers once it has streamed.
+    """
+    answer, tier = response_cache.get(cache_key)
+    if answer is not None:
+        emit_metric('ResponseCacheHit', 1, dimensions={'ChatbotId': chatbot_id, 'Tier': tier})
+        return answer, None
+    emit_metric('ResponseCacheMiss', 1, dimensions={'ChatbotId': chatbot_id})
+
+    index_key = embedding = None
+    if semantic_cache is not None:
+        index_key = SemanticCache.index_key(chatbot_id, agent_details)
+        threshold = float(agent_details.get('semanticCacheThreshold', SEMANTIC_CACHE_THRESHOLD))
+        try:
+            answer, similarity, embedding = semantic_cache.lookup(index_key, input_text, threshold)
+        except Exception as e:
+            # The semantic tier is an optimization; never fail the message because of it
+            print(f"Error looking up semantic cache: {str(e)}")
+        else:
+            if answer is not None:
+                print(f"Semantic cache hit for chatbot {chatbot_id} with similarity {similarity:.3f}")
+                emit_metric('SemanticCacheHit', 1, dimensions={'ChatbotId': chatbot_id})
+                response_cache.put(cache_key, chatbot_id, answer)
+                return answer, None
+            emit_metric('SemanticCacheMiss', 1, dimensions={'ChatbotId': chatbot_id})
+
+    def store_answer(answer):
+        response_cache.put(cache_key, chatbot_id, answer)
+        if embedding is not None:
+            semantic_cache.store(index_key, embedding, answer)
+
+    return None, store_answer
+
+def invoke_agent(agent_details, session_id, input_text):
+    return bedrock_agent_runtime.invoke_agent(
+        agentId=agent_details['agentId'],
+        agentAliasId=agent_details['agentAliasId'],
+        sessionId=session_id,
+        inputText=input_text
+    )
+
+def get_agent_details(chatbot_id, min_version=None):
+    cached = agent_cache.get(chatbot_id, MISSING)
+    if cached is not MISSING and not is_stale(cached, min_version):
+        if cached is None:
+            raise ValueError(f"No agent found for chatbot {chatbot_id}")
+        return cached
 
-def get_agent_details(chatbot_id):
     try:
-        response = agent_table.get_item(Key={'chatbotId': chatbot_id})
-        return response['Item']
+        response = agent_table.get_item(
+            Key={'chatbotId': chatbot_id},
+            ProjectionExpression=(
+                'agentId, agentAliasId, projectId, foundationModel, semanticCacheThreshold, #v, '
+                'admissionRate, admissionBurst, projectAdmissionRate, projectAdmissionBurst'
+            ),
+            ExpressionAttributeNames={'#v': 'version'}
+        )
     except ClientError as e:
         print(f"Error fetching agent details: {e.response['Error']['Message']}")
         raise
 
-async def process_streaming_response(response, connection_id):
-    for event in response['completion']:
-        chunk = event['chunk']
-        chunk_data = json.loads(chunk['bytes'].decode())
+    item = response.get('Item')
+    if item is None:
+        agent_cache.put(chatbot_id, None, ttl_seconds=AGENT_CACHE_NEGATIVE_TTL_SECONDS)
+        raise ValueError(f"No agent found for chatbot {chatbot_id}")
+    agent_cache.put(chatbot_id, item)
+    return item
+
+def is_stale(cached, min_version):
+    if min_version is None:
+        return False
+    if cached is None:
+        return True
+    return int(cached.get('version', 0)) < int(min_version)
 
-        if 'delta' in chunk_data:
-            # Send the text chunk to the WebSocket client
-            await send_to_connection(connection_id, chunk_data['delta']['text'])
-        elif 'error' in chunk_data:
-            # Send error message to the WebSocket client
-            await send_error_to_client(connection_id, chunk_data['error']['message'])
+def invalidate_agent_details(chatbot_id):
+    """Drops the cached routing for a chatbot, e.g. after update_chatbot bumps its version."""
+    if agent_cache.invalidate(chatbot_id):
+        print(f"Invalidated cached agent details for chatbot {chatbot_id}")
+
+def process_streaming_response(response, connection_id, chatbot_id, timings, capture=False, flight_key=None, session=None):
+    # Bedrock is read on a background thread while a sender pool posts sequenced frames, so
+    # read latency and WebSocket write latency overlap instead of adding up. Text deltas are
+    # coalesced so a long answer is not one management API call per token.
+    # With capture=True the complete answer is also returned, unless the stream failed.
+    # With a flight_key this invocation leads a single flight and fans out to its subscribers.
+    # With a session the answer outlives the connection: it is streamed to whichever connection
+    # resumes the session and its frames are buffered for later resumes. Followers with a
+    # session of their own are handled the same way.
+    fan_out = FanOut(lambda target: SendPipeline(
+        lambda payload: send_to_connection(target, payload), on_sent=timings.record_send
+    ))
+    fan_out.add_connection(connection_id)
+    coalescer = FrameCoalescer(fan_out.submit)
+    completion = response['completion']
+    events = read_in_background(completion, idle_timeout=coalescer.flush_interval / 2)
+    captured = [] if capture else None
+    cancelled = False
+    errored = False
+    sessions = [session] if session else []
+    refresh_interval = ATTACH_REFRESH_SECONDS
+    last_refresh = last_heartbeat = time.monotonic()
 
-async def send_to_connection(connection_id, data):
     try:
-        await api_gateway_management.post_to_connection(
+        for event in events:
+            now = time.monotonic()
+            if (flight_key or sessions) and now - last_refresh >= refresh_interval:
+                last_refresh = now
+                if attach_connections(fan_out, flight_key, sessions):
+                    refresh_interval = ATTACH_REFRESH_SECONDS
+                else:
+                    refresh_interval = min(refresh_interval * 2, ATTACH_REFRESH_MAX_SECONDS)
+            if now - last_heartbeat >= HEARTBEAT_SECONDS:
+                # Keep our leases alive so resumes and followers don't give up on us while we stream
+                last_heartbeat = now
+                if flight_key:
+                    single_flight.heartbeat(flight_key)
+                for streamed in sessions:
+                    session_registry.heartbeat(streamed['sessionToken'], streamed['turn'])
+
+            if fan_out.all_gone() and not sessions:
+                # Nobody is listening any more; stop paying for tokens and Lambda time
+                cancelled = True
+                break
+
+            if event is IDLE:
+                # Nothing new from Bedrock; don't hold buffered text past the flush interval
+                if coalescer.due():
+                    coalescer.flush()
+                continue
+
+            chunk = event['chunk']
+            timings.record_chunk(len(chunk['bytes']))
+            chunk_data = json.loads(chunk['bytes'].decode())
+
+            if 'delta' in chunk_data:
+                # Buffer the text chunk for the WebSocket client
+                coalescer.add(chunk_data['delta']['text'])
+                if captured is not None:
+                    captured.append(chunk_data['delta']['text'])
+            elif 'error' in chunk_data:
+                # Send buffered text, then the error message to the WebSocket client
+                errored = True
+                coalescer.flush()
+                fan_out.submit(chunk_data['error']['message'], frame_type='error')
+
+        if not cancelled:
+            coalescer.flush()
+            if flight_key:
+                # Closing the lease returns everyone who subscribed, including since the last refresh
+                for subscriber, subscriber_session in single_flight.release(flight_key).items():
+                    fan_out.add_connection(subscriber)
+                    if subscriber_session and subscriber_session not in sessions:
+                        sessions.append(subscriber_session)
+            # Tell the client how many frames to expect so it can reorder by seq
+            fan_out.submit(None, frame_type='end')
+            for resumed_connection, resume_from in finish_session_turns(sessions, fan_out.frames):
+                fan_out.add_connection(resumed_connection, after_seq=resume_from)
+    finally:
+        events.close()
+        # Logs rather than raises frames that failed to post, so an exception in flight is kept
+        send_errors = fan_out.close()
+
+    if cancelled:
+        close_event_stream(completion)
+        print(f"Client {connection_id} disconnected, cancelled Bedrock stream for chatbot {chatbot_id}")
+        emit_metric('StreamCancelled', 1, dimensions={'ChatbotId': chatbot_id})
+        if flight_key:
+            abandon_flight(flight_key, 'The answer was cancelled, please ask again')
+
+    stats = coalescer.stats()
+    stats['sendSeconds'] = round(fan_out.send_seconds, 3)
+    stats['cancelled'] = cancelled
+    stats['connections'] = len(fan_out.pipelines)
+    stats['sendErrors'] = len(send_errors)
+    print(f"Streaming frame stats for {connection_id}: {json.dumps(stats)}")
+    if send_errors:
+        emit_metric('FrameSendErrors', len(send_errors), dimensions={'ChatbotId': chatbot_id})
+
+    answer = None
+    if captured is not None and not cancelled and not errored:
+        answer = ''.join(captured)
+    return stats, answer
+
+def attach_connections(fan_out, flight_key, sessions):
+    """Adds new subscribers and resumed connections to the stream; returns whether there were any.
+
+    Attached followers' session turns are added to ``sessions``.
+    """
+    attached = False
+    if flight_key:
+        for subscriber, subscriber_session in single_flight.subscribers(flight_key).items():
+            # A follower that gave up waiting has withdrawn and answers itself
+            if subscriber not in fan_out.pipelines and single_flight.attach(flight_key, subscriber):
+                fan_out.add_connection(subscriber)
+                if subscriber_session:
+                    sessions.append(subscriber_session)
+                attached = True
+    for streamed in sessions:
+        resumed_connection, resume_from = session_registry.attached_connection(streamed['sessionToken'])
+        if resumed_connection and resumed_connection not in fan_out.pipelines:
+            fan_out.add_connection(resumed_connection, after_seq=resume_from)
+            attached = True
+    return attached
+
+def finish_session_turns(sessions, frames):
+    """Buffers a turn's frames and closes it in each session.
+
+    Frames are recorded before the turn is closed, so a resume that sees it closed can replay
+    them. Returns ``(connection_id, resume_from)`` of the connection attached to each session.
+    """
+    resumed = []
+    for streamed in sessions:
+        token, turn = streamed['sessionToken'], streamed['turn']
+        session_registry.record_frames(token, turn, frames, encode_frame)
+        resumed_connection, resume_from = session_registry.finish_turn(token, turn)
+        if resumed_connection:
+            resumed.append((resumed_connection, resume_from))
+    return resumed
+
+def abandon_flight(flight_key, error_message):
+    # Release the lease so followers are not left waiting on an answer that will never come
+    for subscriber, subscriber_session in single_flight.release(flight_key).items():
+        send_error_to_client(subscriber, error_message)
+        if subscriber_session:
+            session_registry.finish_turn(subscriber_session['sessionToken'], subscriber_session['turn'], status=FAILED)
+
+def resume_stream(connection_id, body):
+    if session_registry is None:
+        send_error_to_client(connection_id, 'Resuming sessions is not enabled')
+        return {'statusCode': 400, 'body': json.dumps('Resuming sessions is not enabled')}
+
+    session_token = body['sessionToken']
+    resume_from = int(body.get('resumeFrom', 0))
+    session = session_registry.resume(session_token, connection_id, resume_from)
+    if session is None:
+        send_error_to_client(connection_id, f"Unknown session {session_token}")
+        return {'statusCode': 404, 'body': json.dumps(f"Unknown session {session_token}")}
+    emit_metric('StreamResumed', 1)
+
+    if session['status'] == STREAMING:
+        # The invocation producing this turn attaches the connection and replays what it missed;
+        # if it dies first, its lease lapses and a later resume gets the turn as FAILED
+        return {'statusCode': 200, 'body': json.dumps('Resuming in-flight agent answer')}
+
+    try:
+        for payload in session_registry.frames_after(session_token, session['turn'], resume_from):
+            send_to_connection(connection_id, payload)
+    except ConnectionGone:
+        return {'statusCode': 410, 'body': json.dumps('Client disconnected while resuming')}
+    if session['status'] == FAILED:
+        send_error_to_client(connection_id, 'The agent answer failed, please ask again')
+    return {'statusCode': 200, 'body': json.dumps('Agent answer resumed')}
+
+def replay_answer(answer, connection_id, timings):
+    """Sends a cached answer and returns its frames as ``(seq, type, content)``."""
+    # Cached answers use the same sequenced framing as a live stream
+    frames = [(seq, 'response', chunk) for seq, chunk in enumerate(split_text(answer, STREAM_FLUSH_BYTES), 1)]
+    frames.append((len(frames) + 1, 'end', None))
+    pipeline = SendPipeline(lambda payload: send_to_connection(connection_id, payload), on_sent=timings.record_send)
+    try:
+        for seq, frame_type, content in frames:
+            pipeline.submit(content, frame_type=frame_type, seq=seq)
+    finally:
+        pipeline.close()
+    return frames
+
+def replay_frames(connection_id, frames):
+    # A connection that resumed while a cached answer was replayed to its predecessor
+    try:
+        for seq, frame_type, content in frames:
+            send_to_connection(connection_id, encode_frame(content, frame_type, seq))
+    except ConnectionGone:
+        print(f"Connection {connection_id} closed before the cached answer was replayed")
+
+def split_text(text, max_chars):
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+def close_event_stream(completion):
+    try:
+        completion.close()
+    except Exception as e:
+        print(f"Error closing Bedrock event stream: {str(e)}")
+
+def mark_connection_dead(connection_id):
+    dead_connections.put(connection_id, True)
+
+def is_connection_dead(connection_id):
+    return dead_connections.get(connection_id, False)
+
+def send_to_connection(connection_id, payload):
+    if is_connection_dead(connection_id):
+        raise ConnectionGone(connection_id)
+    try:
+        api_gateway_management.post_to_connection(
             ConnectionId=connection_id,
-            Data=json.dumps({'type': 'response', 'content': data})
+            Data=payload
         )
     except ClientError as e:
+        if e.response['Error']['Code'] == 'GoneException':
+            mark_connection_dead(connection_id)
+            raise ConnectionGone(connection_id)
         print(f"Error sending message to WebSocket: {e.response['Error']['Message']}")
 
-async def send_error_to_client(connection_id, error_message):
+def send_retry_after(connection_id, retry_after, scope):
+    if is_connection_dead(connection_id):
+        return
+    try:
+        api_gateway_management.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps({
+                'type': 'retry-after',
+                'content': {'retryAfterMs': int(retry_after * 1000) + 1, 'scope': scope}
+            })
+        )
+    except ClientError as e:
+        print(f"Error sending retry-after message to WebSocket: {e.response['Error']['Message']}")
+
+def send_error_to_client(connection_id, error_message):
+    if is_connection_dead(connection_id):
+        return
     try:
-        await api_gateway_management.post_to_connection(
+        api_gateway_management.post_to_connection(
             ConnectionId=connection_id,
             Data=json.dumps({'type': 'error', 'content': error_message})
         )
     except ClientError as e:
-        print(f"Error sending error message to WebSocket: {e.response['Error']['Message']}")
\ No newline at end of file
+        print(f"Error sending error message to WebSocket: {e.response['Error']['Message']}")
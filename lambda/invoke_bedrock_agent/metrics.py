@@ -0,0 +1,116 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'BedrockAgentChat')
+
+# Fraction of invocations whose latency breakdown is emitted; counters are always emitted
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+
+def emit_metrics(values, dimensions=None, dimension_sets=None):
+    """Writes one CloudWatch Embedded Metric Format record to the log.
+
+    :param values: Mapping of metric name to ``(value, unit)``.
+    :param dimensions: Mapping of dimension name to value, added to the record.
+    :param dimension_sets: Lists of dimension names to aggregate by; defaults to all dimensions.
+    """
+    dimensions = dimensions or {}
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': dimension_sets or [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (value, unit) in values.items()]
+            }]
+        },
+        **dimensions
+    }
+    for name, (value, unit) in values.items():
+        record[name] = value
+    print(json.dumps(record))
+
+def emit_metric(name, value, unit='Count', dimensions=None):
+    """Writes a single metric as a CloudWatch Embedded Metric Format record to the log."""
+    emit_metrics({name: (value, unit)}, dimensions)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+def to_ms(seconds):
+    return round(seconds * 1000.0, 2)
+
+class InvocationMetrics:
+    """Latency breakdown of one agent invocation, emitted as a single EMF record.
+
+    Phases are timed with ``phase()``; stream chunks and WebSocket sends are recorded as they
+    happen, giving time to first chunk, inter-chunk gap percentiles, bytes streamed and send
+    latency percentiles. Only a ``sample_rate`` fraction of invocations is emitted.
+    """
+
+    def __init__(self, sample_rate=METRICS_SAMPLE_RATE, clock=time.monotonic):
+        self.sampled = random.random() < sample_rate
+        self.clock = clock
+        self.started = clock()
+        self.phases = {}
+        self.stream_started = None
+        self.chunk_times = []
+        self.bytes_streamed = 0
+        self.send_latencies = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self.clock() - started
+
+    def start_stream(self):
+        self.stream_started = self.clock()
+
+    def record_chunk(self, size):
+        self.chunk_times.append(self.clock())
+        self.bytes_streamed += size
+
+    def record_send(self, seconds):
+        with self._lock:
+            self.send_latencies.append(seconds)
+
+    def values(self):
+        values = {name: (to_ms(seconds), 'Milliseconds') for name, seconds in self.phases.items()}
+        values['TotalMs'] = (to_ms(self.clock() - self.started), 'Milliseconds')
+
+        if self.stream_started is not None and self.chunk_times:
+            values['TimeToFirstChunkMs'] = (to_ms(self.chunk_times[0] - self.stream_started), 'Milliseconds')
+            gaps = [later - earlier for earlier, later in zip(self.chunk_times, self.chunk_times[1:])]
+            for pct in (50, 90, 99):
+                if gaps:
+                    values[f"InterChunkGapP{pct}Ms"] = (to_ms(percentile(gaps, pct)), 'Milliseconds')
+        values['BytesStreamed'] = (self.bytes_streamed, 'Bytes')
+
+        with self._lock:
+            send_latencies = list(self.send_latencies)
+        for pct in (50, 99):
+            if send_latencies:
+                values[f"SendLatencyP{pct}Ms"] = (to_ms(percentile(send_latencies, pct)), 'Milliseconds')
+        return values
+
+    def emit(self, chatbot_id, model):
+        if not self.sampled:
+            return
+        emit_metrics(
+            self.values(),
+            dimensions={'ChatbotId': chatbot_id, 'Model': model},
+            dimension_sets=[['ChatbotId', 'Model'], ['Model']]
+        )
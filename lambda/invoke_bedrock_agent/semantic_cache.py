@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from botocore.exceptions import ClientError
+from cache import MISSING, TTLCache
+
+# Imported by load_numpy only when the semantic tier is enabled, so the chat path's cold
+# start does not pay for NumPy otherwise
+np = None
+
+SEMANTIC_CACHE_CAPACITY = int(os.environ.get('SEMANTIC_CACHE_CAPACITY', '2048'))
+SEMANTIC_CACHE_MAX_CHATBOTS = int(os.environ.get('SEMANTIC_CACHE_MAX_CHATBOTS', '64'))
+SEMANTIC_CACHE_SNAPSHOT_EVERY = int(os.environ.get('SEMANTIC_CACHE_SNAPSHOT_EVERY', '16'))
+SNAPSHOT_DIR = '/tmp/semantic-cache'
+
+def load_numpy():
+    """Imports NumPy for the semantic tier; returns False when it is not packaged with the function."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+class BedrockEmbedder:
+    """Embeds prompts with a Bedrock text embedding model."""
+
+    def __init__(self, bedrock_runtime, model_id):
+        self.bedrock_runtime = bedrock_runtime
+        self.model_id = model_id
+
+    def __call__(self, text):
+        response = self.bedrock_runtime.invoke_model(
+            modelId=self.model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps({'inputText': text})
+        )
+        return json.loads(response['body'].read())['embedding']
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedding for running the cache offline, without Bedrock."""
+
+    def __init__(self, dimension=256):
+        self.dimension = dimension
+
+    def __call__(self, text):
+        vector = [0.0] * self.dimension
+        for token in re.findall(r'\w+', text.casefold()):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dimension] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+class SemanticIndex:
+    """Nearest-neighbour index over the cached prompt embeddings of one chatbot.
+
+    Embeddings are L2-normalized rows of a preallocated float32 matrix, so cosine similarity
+    for a batch of queries is a single matrix product. When the matrix is full the oldest
+    entries are overwritten.
+    """
+
+    def __init__(self, dimension, capacity=SEMANTIC_CACHE_CAPACITY):
+        self.dimension = dimension
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.answers = [None] * capacity
+        self.count = 0
+        self.next_slot = 0
+        self.added_since_snapshot = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, vectors, answers, next_slot, capacity=SEMANTIC_CACHE_CAPACITY):
+        """Builds an index from loaded arrays; ``vectors`` may be a read-only memory map."""
+        index = cls.__new__(cls)
+        index.dimension = vectors.shape[1]
+        index.capacity = max(capacity, len(answers))
+        index.vectors = vectors
+        index.answers = list(answers) + [None] * (index.capacity - len(answers))
+        index.count = len(answers)
+        # A full ring resumes overwriting where it stopped; otherwise the free rows come next
+        index.next_slot = next_slot % index.capacity if index.count == index.capacity else index.count
+        index.added_since_snapshot = 0
+        index.lock = threading.Lock()
+        return index
+
+    @staticmethod
+    def normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def search_batch(self, queries):
+        """Returns ``(best_rows, best_similarities)`` for a batch of query embeddings."""
+        queries = self.normalize(np.atleast_2d(queries))
+        if self.count == 0:
+            empty = np.full(len(queries), -1.0, dtype=np.float32)
+            return np.full(len(queries), -1), empty
+        similarities = self.vectors[:self.count] @ queries.T
+        best_rows = np.argmax(similarities, axis=0)
+        return best_rows, similarities[best_rows, np.arange(len(queries))]
+
+    def search(self, query, threshold):
+        rows, similarities = self.search_batch(query)
+        if similarities[0] < threshold:
+            return None, float(similarities[0])
+        return self.answers[rows[0]], float(similarities[0])
+
+    def add(self, embedding, answer):
+        with self.lock:
+            if self.vectors.shape[0] < self.capacity or not self.vectors.flags.writeable:
+                # Loaded from a snapshot memory map; copy into a writable preallocated matrix
+                vectors = np.zeros((self.capacity, self.dimension), dtype=np.float32)
+                vectors[:self.count] = self.vectors[:self.count]
+                self.vectors = vectors
+            self.vectors[self.next_slot] = self.normalize(embedding)
+            self.answers[self.next_slot] = answer
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.added_since_snapshot += 1
+
+class SemanticCache:
+    """Serves stored answers for prompts whose embedding is close to a previously answered one.
+
+    Indexes are kept per chatbot, alias and routing version, and snapshot to S3 so a cold
+    instance can memory-map the latest index instead of starting empty. A snapshot is a
+    single ``.npz`` object holding the vectors, the answers and the ring position, so a
+    reader never pairs vectors with the answers of another snapshot.
+    """
+
+    def __init__(self, embed, s3_client=None, bucket=None, max_chatbots=SEMANTIC_CACHE_MAX_CHATBOTS,
+                 capacity=SEMANTIC_CACHE_CAPACITY):
+        """
+        :param embed: Callable returning the embedding of a prompt, e.g. BedrockEmbedder or HashingEmbedder.
+        :param s3_client: Boto3 S3 client used for snapshots; snapshots are disabled without one.
+        :param bucket: Bucket holding the snapshots.
+        :param max_chatbots: Number of per-chatbot indexes kept in memory.
+        :param capacity: Number of entries kept per index before the oldest are overwritten.
+        """
+        if not load_numpy():
+            raise ImportError('The semantic cache needs NumPy')
+        self.embed = embed
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.capacity = capacity
+        self.indexes = TTLCache(max_entries=max_chatbots, ttl_seconds=24 * 3600)
+
+    @staticmethod
+    def index_key(chatbot_id, agent_details):
+        return f"{chatbot_id}/{agent_details['agentAliasId']}/{agent_details.get('version', 0)}"
+
+    def lookup(self, index_key, input_text, threshold):
+        """Returns ``(answer, similarity, embedding)``; ``answer`` is None on a miss."""
+        embedding = self.embed(input_text)
+        index = self.get_index(index_key)
+        if index is None:
+            return None, None, embedding
+        answer, similarity = index.search(embedding, threshold)
+        return answer, similarity, embedding
+
+    def store(self, index_key, embedding, answer):
+        index = self.get_index(index_key)
+        if index is None:
+            index = SemanticIndex(dimension=len(embedding), capacity=self.capacity)
+            self.indexes.put(index_key, index)
+        index.add(embedding, answer)
+        if index.added_since_snapshot >= SEMANTIC_CACHE_SNAPSHOT_EVERY:
+            self.snapshot(index_key, index)
+
+    def get_index(self, index_key):
+        index = self.indexes.get(index_key, MISSING)
+        if index is MISSING:
+            index = self.load_snapshot(index_key)
+            self.indexes.put(index_key, index)
+        return index
+
+    @staticmethod
+    def snapshot_key(index_key):
+        return f"semantic-cache/{index_key}/snapshot.npz"
+
+    def snapshot(self, index_key, index):
+        if self.s3_client is None:
+            return
+        local_dir = os.path.join(SNAPSHOT_DIR, index_key)
+        os.makedirs(local_dir, exist_ok=True)
+        with index.lock:
+            count = index.count
+            # Answers travel as UTF-8 JSON bytes, so loading never has to unpickle
+            with tempfile.NamedTemporaryFile(dir=local_dir, suffix='.npz', delete=False) as f:
+                np.savez(
+                    f,
+                    vectors=index.vectors[:count],
+                    answers=np.frombuffer(json.dumps(index.answers[:count]).encode('utf-8'), dtype=np.uint8),
+                    next_slot=np.int64(index.next_slot)
+                )
+            index.added_since_snapshot = 0
+        try:
+            self.s3_client.upload_file(f.name, self.bucket, self.snapshot_key(index_key))
+            print(f"Semantic cache snapshot written for {index_key} with {count} entries")
+        except ClientError as e:
+            print(f"Error writing semantic cache snapshot: {e.response['Error']['Message']}")
+        finally:
+            os.remove(f.name)
+
+    def load_snapshot(self, index_key):
+        if self.s3_client is None:
+            return None
+        local_dir = os.path.join(SNAPSHOT_DIR, index_key)
+        os.makedirs(local_dir, exist_ok=True)
+        snapshot_path = os.path.join(local_dir, 'snapshot.npz')
+        vectors_path = os.path.join(local_dir, 'vectors.npy')
+        try:
+            self.s3_client.download_file(self.bucket, self.snapshot_key(index_key), snapshot_path)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                print(f"Error loading semantic cache snapshot: {e.response['Error']['Message']}")
+            return None
+        with np.load(snapshot_path) as snapshot:
+            answers = json.loads(snapshot['answers'].tobytes())
+            next_slot = int(snapshot['next_slot'])
+        # Unpack the vectors to their own .npy so they can be memory-mapped, and only the pages
+        # touched by searches are loaded. An earlier load may still map vectors.npy, so write a
+        # new file and swap it in to keep the mapped pages intact.
+        with zipfile.ZipFile(snapshot_path) as archive, archive.open('vectors.npy') as source:
+            with tempfile.NamedTemporaryFile(dir=local_dir, suffix='.npy', delete=False) as f:
+                shutil.copyfileobj(source, f)
+        os.replace(f.name, vectors_path)
+        os.remove(snapshot_path)
+        vectors = np.load(vectors_path, mmap_mode='r')
+        print(f"Semantic cache snapshot loaded for {index_key} with {len(answers)} entries")
+        return SemanticIndex.from_arrays(vectors, answers, next_slot, capacity=self.capacity)
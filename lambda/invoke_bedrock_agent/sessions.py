@@ -0,0 +1,191 @@
+import os
+import time
+import uuid
+from botocore.exceptions import ClientError
+
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '3600'))
+# A streaming turn whose producer stopped renewing its lease this long ago is treated as failed
+STREAM_LEASE_SECONDS = int(os.environ.get('STREAM_LEASE_SECONDS', '30'))
+
+STREAMING = 'STREAMING'
+COMPLETE = 'COMPLETE'
+FAILED = 'FAILED'
+
+SESSION_SK = 'session'
+
+def frame_sk(turn, seq):
+    return f"frame#{int(turn):06d}#{int(seq):08d}"
+
+class SessionRegistry:
+    """Maps client-supplied session tokens to Bedrock sessions and buffers their frames.
+
+    One ``session`` item per token holds the Bedrock session ID, the current turn and the
+    connection currently attached to it. The frames of each turn are stored next to it,
+    keyed by ``seq``, so a client that reconnects can send ``resumeFrom=<seq>`` and receive
+    the rest of the answer without a new agent invocation. Everything expires through TTL.
+
+    The invocation streaming a turn renews the turn's ``leaseUntil`` while it runs, so a turn
+    whose producer crashed or timed out is failed on the next resume instead of staying
+    STREAMING until the session expires.
+    """
+
+    def __init__(self, table, ttl_seconds=SESSION_TTL_SECONDS, lease_seconds=STREAM_LEASE_SECONDS, clock=time.time):
+        """
+        :param table: DynamoDB Table resource keyed by ``sessionToken`` and ``sk`` with an ``expiresAt`` TTL.
+        :param ttl_seconds: How long sessions and their frames are kept after the last turn.
+        :param lease_seconds: How long a streaming turn survives without a heartbeat from its producer.
+        """
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+
+    def begin_turn(self, session_token, connection_id):
+        """Attaches the connection and starts a new turn; returns the updated session item."""
+        response = self.table.update_item(
+            Key={'sessionToken': session_token, 'sk': SESSION_SK},
+            UpdateExpression=(
+                'set connectionId = :c, #status = :s, resumeFrom = :zero, expiresAt = :e, leaseUntil = :l, '
+                'bedrockSessionId = if_not_exists(bedrockSessionId, :b) add turn :one'
+            ),
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':c': connection_id,
+                ':s': STREAMING,
+                ':zero': 0,
+                ':e': int(self.clock()) + self.ttl_seconds,
+                ':l': int(self.clock()) + self.lease_seconds,
+                ':b': uuid.uuid4().hex,
+                ':one': 1
+            },
+            ReturnValues='ALL_NEW'
+        )
+        return response['Attributes']
+
+    def attached_connection(self, session_token):
+        """Returns ``(connection_id, resume_from)`` of the connection currently attached."""
+        try:
+            response = self.table.get_item(
+                Key={'sessionToken': session_token, 'sk': SESSION_SK},
+                ProjectionExpression='connectionId, resumeFrom',
+                ConsistentRead=True
+            )
+        except ClientError as e:
+            print(f"Error reading session: {e.response['Error']['Message']}")
+            return None, 0
+        item = response.get('Item', {})
+        return item.get('connectionId'), int(item.get('resumeFrom', 0))
+
+    def heartbeat(self, session_token, turn):
+        """Extends the lease of a turn this invocation is still streaming."""
+        try:
+            self.table.update_item(
+                Key={'sessionToken': session_token, 'sk': SESSION_SK},
+                UpdateExpression='set leaseUntil = :l',
+                ConditionExpression='turn = :t AND #status = :s',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':l': int(self.clock()) + self.lease_seconds, ':t': turn, ':s': STREAMING}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error renewing session lease: {e.response['Error']['Message']}")
+
+    def record_frames(self, session_token, turn, frames, encode):
+        expires_at = int(self.clock()) + self.ttl_seconds
+        with self.table.batch_writer() as batch:
+            for seq, frame_type, content in frames:
+                batch.put_item(Item={
+                    'sessionToken': session_token,
+                    'sk': frame_sk(turn, seq),
+                    'payload': encode(content, frame_type, seq),
+                    'expiresAt': expires_at
+                })
+
+    def finish_turn(self, session_token, turn, status=COMPLETE):
+        """Closes the turn and returns ``(connection_id, resume_from)`` attached at that moment."""
+        try:
+            response = self.table.update_item(
+                Key={'sessionToken': session_token, 'sk': SESSION_SK},
+                UpdateExpression='set #status = :s',
+                ConditionExpression='turn = :t',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':s': status, ':t': turn},
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error finishing session turn: {e.response['Error']['Message']}")
+            return None, 0
+        attributes = response['Attributes']
+        return attributes.get('connectionId'), int(attributes.get('resumeFrom', 0))
+
+    def resume(self, session_token, connection_id, resume_from):
+        """Attaches a reconnecting client; returns the session item, or None if unknown.
+
+        While the turn is still streaming, the invocation producing it picks up the new
+        connection and replays the missed frames itself; otherwise the caller replays them
+        from ``frames_after``. A streaming turn whose lease has lapsed is failed here, since
+        no invocation is left to finish it.
+        """
+        try:
+            response = self.table.update_item(
+                Key={'sessionToken': session_token, 'sk': SESSION_SK},
+                UpdateExpression='set connectionId = :c, resumeFrom = :r',
+                ConditionExpression='attribute_exists(sessionToken)',
+                ExpressionAttributeValues={':c': connection_id, ':r': resume_from},
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            raise
+        session = response['Attributes']
+        # Sessions written before leases existed have none and are left to their producer
+        if session.get('status') == STREAMING and int(session.get('leaseUntil', self.clock() + 1)) < self.clock():
+            return self.expire_turn(session)
+        return session
+
+    def expire_turn(self, session):
+        """Fails a streaming turn whose lease lapsed; returns the session item as it now stands."""
+        try:
+            response = self.table.update_item(
+                Key={'sessionToken': session['sessionToken'], 'sk': SESSION_SK},
+                UpdateExpression='set #status = :failed',
+                ConditionExpression='turn = :t AND #status = :s AND leaseUntil < :now',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':failed': FAILED,
+                    ':t': session['turn'],
+                    ':s': STREAMING,
+                    ':now': int(self.clock())
+                },
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # The producer renewed its lease or finished the turn in the meantime
+            return self.table.get_item(
+                Key={'sessionToken': session['sessionToken'], 'sk': SESSION_SK},
+                ConsistentRead=True
+            ).get('Item', session)
+        print(f"Failed turn {session['turn']} of session {session['sessionToken']}: its producer stopped renewing the lease")
+        return response['Attributes']
+
+    def frames_after(self, session_token, turn, seq):
+        """Returns the encoded frames of a turn with a sequence number above ``seq``."""
+        # Only resumes query frames; importing boto3 here keeps it out of the chat path's cold start
+        from boto3.dynamodb.conditions import Key
+        payloads = []
+        query = {
+            'KeyConditionExpression': Key('sessionToken').eq(session_token) & Key('sk').between(
+                frame_sk(turn, int(seq) + 1), frame_sk(turn, 99999999)
+            ),
+            'ProjectionExpression': 'payload'
+        }
+        while True:
+            response = self.table.query(**query)
+            payloads.extend(item['payload'] for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return payloads
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
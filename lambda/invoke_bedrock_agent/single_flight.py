@@ -0,0 +1,197 @@
+import os
+import time
+from botocore.exceptions import ClientError
+
+# The leader renews its lease while it streams, so a crashed leader is replaced within one lease
+SINGLE_FLIGHT_LEASE_SECONDS = int(os.environ.get('SINGLE_FLIGHT_LEASE_SECONDS', '30'))
+# How long a follower waits for the leader to attach it before answering the prompt itself
+SINGLE_FLIGHT_FOLLOWER_WAIT_SECONDS = float(os.environ.get('SINGLE_FLIGHT_FOLLOWER_WAIT_SECONDS', '10'))
+
+LEADER = 'leader'
+FOLLOWER = 'follower'
+
+class SingleFlight:
+    """Coalesces concurrent identical prompts across Lambda instances through a DynamoDB lease.
+
+    The first request to take the lease for a cache key becomes the leader and invokes the
+    agent; concurrent requests add their connection ID to the lease's ``subscribers`` set and
+    wait until the leader moves them to ``attached`` and fans its stream out to them.
+
+    The leader renews the lease while it streams. A follower that is not attached before the
+    lease lapses or its wait runs out withdraws and answers the prompt itself, so a crashed
+    leader only costs coalescing, never the prompt. Attaching and withdrawing are conditional
+    on each other, so a connection is never answered twice.
+
+    A follower that belongs to a resumable session leaves its session turn in the lease's
+    ``sessions`` map, so the leader buffers the frames and closes the turn for it.
+    """
+
+    def __init__(self, table, lease_seconds=SINGLE_FLIGHT_LEASE_SECONDS,
+                 follower_wait_seconds=SINGLE_FLIGHT_FOLLOWER_WAIT_SECONDS, clock=time.time, sleep=time.sleep):
+        """
+        :param table: DynamoDB Table resource with a ``cacheKey`` partition key and ``expiresAt`` TTL.
+        :param lease_seconds: How long a lease survives without a heartbeat from its leader.
+        :param follower_wait_seconds: How long a follower waits to be attached.
+        """
+        self.table = table
+        self.lease_seconds = lease_seconds
+        self.follower_wait_seconds = follower_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+    @staticmethod
+    def lease_key(cache_key):
+        return f"lease#{cache_key}"
+
+    @staticmethod
+    def session_ref(session):
+        return {'sessionToken': session['sessionToken'], 'turn': session['turn']}
+
+    def join(self, cache_key, connection_id, session=None):
+        """Returns LEADER or FOLLOWER, or None when the lease could not be coordinated."""
+        now = int(self.clock())
+        try:
+            self.table.put_item(
+                Item={
+                    'cacheKey': self.lease_key(cache_key),
+                    'leaderConnectionId': connection_id,
+                    'leaseUntil': now + self.lease_seconds,
+                    'expiresAt': now + self.lease_seconds,
+                    'sessions': {}
+                },
+                ConditionExpression='attribute_not_exists(cacheKey) OR leaseUntil < :now',
+                ExpressionAttributeValues={':now': now}
+            )
+            return LEADER
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error acquiring single-flight lease: {e.response['Error']['Message']}")
+                return None
+
+        subscribe = {
+            'UpdateExpression': 'add subscribers :c',
+            'ExpressionAttributeValues': {':c': {connection_id}, ':now': now}
+        }
+        if session is not None:
+            subscribe['UpdateExpression'] += ' set sessions.#cid = :s'
+            subscribe['ExpressionAttributeNames'] = {'#cid': connection_id}
+            subscribe['ExpressionAttributeValues'][':s'] = self.session_ref(session)
+        try:
+            self.table.update_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                ConditionExpression='attribute_exists(cacheKey) AND leaseUntil >= :now AND attribute_not_exists(done)',
+                **subscribe
+            )
+            return FOLLOWER
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error subscribing to single-flight lease: {e.response['Error']['Message']}")
+            # The leader finished or its lease lapsed between our two calls
+            return None
+
+    def heartbeat(self, cache_key):
+        """Extends the lease while the leader is still streaming."""
+        lease_until = int(self.clock()) + self.lease_seconds
+        try:
+            self.table.update_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                UpdateExpression='set leaseUntil = :l, expiresAt = :l',
+                ConditionExpression='attribute_exists(cacheKey) AND attribute_not_exists(done)',
+                ExpressionAttributeValues={':l': lease_until}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error renewing single-flight lease: {e.response['Error']['Message']}")
+
+    def attach(self, cache_key, connection_id):
+        """Marks a subscriber as served by the leader; False if it withdrew in the meantime."""
+        try:
+            self.table.update_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                UpdateExpression='add attached :c',
+                ConditionExpression='contains(subscribers, :cid)',
+                ExpressionAttributeValues={':c': {connection_id}, ':cid': connection_id}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error attaching single-flight subscriber: {e.response['Error']['Message']}")
+            return False
+
+    def wait_for_leader(self, cache_key, connection_id):
+        """Waits until the leader attaches the connection; False if the follower must answer itself."""
+        deadline = self.clock() + self.follower_wait_seconds
+        delay = 0.05
+        while True:
+            try:
+                item = self.table.get_item(
+                    Key={'cacheKey': self.lease_key(cache_key)},
+                    ProjectionExpression='subscribers, attached, done, leaseUntil',
+                    ConsistentRead=True
+                ).get('Item')
+            except ClientError as e:
+                print(f"Error reading single-flight lease: {e.response['Error']['Message']}")
+                break
+            if item is None:
+                # The lease expired through TTL; nobody is left to answer
+                return False
+            if connection_id in item.get('attached', set()):
+                return True
+            if item.get('done'):
+                # The leader closed the lease and adds everyone still subscribed
+                return connection_id in item.get('subscribers', set())
+            if int(item['leaseUntil']) < self.clock() or self.clock() + delay > deadline:
+                break
+            self.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        return not self.withdraw(cache_key, connection_id)
+
+    def withdraw(self, cache_key, connection_id):
+        """Removes a subscriber the leader has not attached yet; False if it already has."""
+        try:
+            self.table.update_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                UpdateExpression='delete subscribers :c remove sessions.#cid',
+                ConditionExpression='NOT contains(attached, :cid) AND attribute_not_exists(done)',
+                ExpressionAttributeNames={'#cid': connection_id},
+                ExpressionAttributeValues={':c': {connection_id}, ':cid': connection_id}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            print(f"Error withdrawing from single-flight lease: {e.response['Error']['Message']}")
+            return True
+
+    @staticmethod
+    def subscriber_sessions(item):
+        """Maps each subscribed connection to its session turn, or None for a stateless one."""
+        sessions = item.get('sessions', {})
+        return {connection_id: sessions.get(connection_id) for connection_id in item.get('subscribers', set())}
+
+    def subscribers(self, cache_key):
+        """Returns the current subscribers as ``{connection_id: session_ref or None}``."""
+        try:
+            response = self.table.get_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                ProjectionExpression='subscribers, sessions',
+                ConsistentRead=True
+            )
+        except ClientError as e:
+            print(f"Error reading single-flight subscribers: {e.response['Error']['Message']}")
+            return {}
+        return self.subscriber_sessions(response.get('Item', {}))
+
+    def release(self, cache_key):
+        """Closes the lease to new subscribers and returns the final subscribers, like ``subscribers``."""
+        try:
+            response = self.table.update_item(
+                Key={'cacheKey': self.lease_key(cache_key)},
+                UpdateExpression='set done = :t, leaseUntil = :zero',
+                ExpressionAttributeValues={':t': True, ':zero': 0},
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            print(f"Error releasing single-flight lease: {e.response['Error']['Message']}")
+            return {}
+        return self.subscriber_sessions(response['Attributes'])
@@ -0,0 +1,280 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Flush once this many bytes of text are buffered, or once this long has passed since the last frame
+STREAM_FLUSH_BYTES = int(os.environ.get('STREAM_FLUSH_BYTES', '1024'))
+STREAM_FLUSH_INTERVAL_MS = int(os.environ.get('STREAM_FLUSH_INTERVAL_MS', '200'))
+
+# Sender threads posting frames, and how many frames may be queued or in flight at once
+SENDER_POOL_SIZE = int(os.environ.get('SENDER_POOL_SIZE', '4'))
+SENDER_MAX_IN_FLIGHT = int(os.environ.get('SENDER_MAX_IN_FLIGHT', '16'))
+
+# Stream events buffered between the reader thread and the consumer
+READ_AHEAD_EVENTS = int(os.environ.get('STREAM_READ_AHEAD_EVENTS', '256'))
+
+# Yielded by read_in_background when no event arrived within the idle timeout
+IDLE = object()
+_END = object()
+
+# Shared across warm invocations so threads are not recreated per message
+_sender_pool = None
+_sender_pool_lock = threading.Lock()
+
+class ConnectionGone(Exception):
+    """Raised by a frame sender when the WebSocket client has disconnected."""
+
+def encode_frame(content, frame_type='response', seq=None):
+    frame = {'type': frame_type, 'content': content}
+    if seq is not None:
+        frame['seq'] = seq
+    return json.dumps(frame)
+
+def get_sender_pool():
+    global _sender_pool
+    with _sender_pool_lock:
+        if _sender_pool is None:
+            _sender_pool = ThreadPoolExecutor(max_workers=SENDER_POOL_SIZE, thread_name_prefix='ws-sender')
+        return _sender_pool
+
+def read_in_background(iterable, idle_timeout, read_ahead=READ_AHEAD_EVENTS):
+    """Drains ``iterable`` on a reader thread and yields its items as they arrive.
+
+    Yields ``IDLE`` whenever nothing arrived within ``idle_timeout`` seconds, so the consumer
+    can flush buffered output while the producer is blocked on the network. Exceptions raised
+    while reading are re-raised in the consumer. Closing the generator early stops the reader
+    after its current item, so an abandoned stream does not keep a thread alive.
+    """
+    events = queue.Queue(maxsize=read_ahead)
+    stopped = threading.Event()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                events.put(entry, timeout=idle_timeout)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((_END, e))
+            return
+        put((_END, None))
+
+    reader = threading.Thread(target=drain, name='stream-reader', daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            try:
+                item, error = events.get(timeout=idle_timeout)
+            except queue.Empty:
+                yield IDLE
+                continue
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+class SendPipeline:
+    """Posts sequenced frames for one connection through the shared sender pool.
+
+    Frames are numbered in submission order; because the pool may deliver them out of
+    order, clients reassemble the answer by ``seq``. At most ``max_in_flight`` frames are
+    outstanding, which applies back-pressure to the reader when the socket is slower.
+
+    Once ``post`` raises ``ConnectionGone`` the pipeline is marked gone and further frames are
+    dropped without being posted. Any other error is kept in ``errors`` rather than raised, so
+    closing the pipeline never masks an exception the stream is already propagating.
+    """
+
+    def __init__(self, post, max_in_flight=SENDER_MAX_IN_FLIGHT, pool=None, on_sent=None):
+        """
+        :param post: Callable receiving one encoded frame payload; runs on a sender thread and
+                     raises ConnectionGone when the client has disconnected.
+        :param max_in_flight: Maximum number of frames queued or being posted.
+        :param pool: Executor to send on, defaults to the shared sender pool.
+        :param on_sent: Optional callable receiving the duration of each post in seconds.
+        """
+        self.post = post
+        self.pool = pool or get_sender_pool()
+        self.on_sent = on_sent
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self.next_seq = 1
+        self.send_seconds = 0.0
+        self.gone = threading.Event()
+        self.frames_dropped = 0
+        self.errors = []
+
+    def submit(self, content, frame_type='response', seq=None):
+        if self.gone.is_set():
+            self.frames_dropped += 1
+            return None
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = seq + 1
+        payload = encode_frame(content, frame_type, seq)
+
+        self._slots.acquire()
+        future = self.pool.submit(self._send, payload)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._release)
+        return seq
+
+    def _send(self, payload):
+        started = time.monotonic()
+        try:
+            if self.gone.is_set():
+                return
+            self.post(payload)
+        except ConnectionGone:
+            self.gone.set()
+        except Exception as e:
+            with self._pending_lock:
+                self.errors.append(e)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._pending_lock:
+                self.send_seconds += elapsed
+            if self.on_sent is not None:
+                self.on_sent(elapsed)
+
+    def _release(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def close(self):
+        """Waits for every submitted frame to be posted; returns the errors of frames that were not."""
+        with self._pending_lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.result()
+        if self.errors:
+            print(f"{len(self.errors)} frames failed to send, first error: {self.errors[0]!r}")
+        return list(self.errors)
+
+class FanOut:
+    """Sends every frame to several connections, each through its own SendPipeline.
+
+    Frames are numbered once for the whole stream and kept in ``frames``, so a connection
+    added mid-stream, such as a late single-flight subscriber or a reconnecting client, is
+    first replayed the frames it missed under their original ``seq``.
+    """
+
+    def __init__(self, make_pipeline):
+        """
+        :param make_pipeline: Callable returning a SendPipeline for a connection ID.
+        """
+        self.make_pipeline = make_pipeline
+        self.pipelines = {}
+        self.frames = []
+
+    def add_connection(self, connection_id, after_seq=0):
+        if connection_id in self.pipelines:
+            return
+        pipeline = self.make_pipeline(connection_id)
+        for seq, frame_type, content in self.frames[after_seq:]:
+            pipeline.submit(content, frame_type, seq)
+        self.pipelines[connection_id] = pipeline
+
+    def submit(self, content, frame_type='response'):
+        seq = len(self.frames) + 1
+        self.frames.append((seq, frame_type, content))
+        for pipeline in self.pipelines.values():
+            pipeline.submit(content, frame_type, seq)
+        return seq
+
+    def all_gone(self):
+        return all(pipeline.gone.is_set() for pipeline in self.pipelines.values())
+
+    @property
+    def send_seconds(self):
+        return sum(pipeline.send_seconds for pipeline in self.pipelines.values())
+
+    def close(self):
+        """Waits for every pipeline; returns the errors of frames that were not posted."""
+        errors = []
+        for pipeline in self.pipelines.values():
+            errors.extend(pipeline.close())
+        return errors
+
+class FrameCoalescer:
+    """Buffers streamed text deltas and posts them to the client as fewer, larger frames.
+
+    The first delta is flushed immediately so time-to-first-token is unaffected; after that
+    a frame is sent whenever the buffer reaches ``flush_bytes`` or ``flush_interval_ms`` has
+    elapsed since the previous frame.
+    """
+
+    def __init__(self, send_frame, flush_bytes=STREAM_FLUSH_BYTES, flush_interval_ms=STREAM_FLUSH_INTERVAL_MS, clock=time.monotonic):
+        """
+        :param send_frame: Callable receiving the coalesced text of one frame.
+        :param flush_bytes: Buffered text size that triggers a flush.
+        :param flush_interval_ms: Maximum time between frames while text is buffered.
+        :param clock: Monotonic clock returning seconds.
+        """
+        self.send_frame = send_frame
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.clock = clock
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._last_flush = None
+        self.deltas_received = 0
+        self.frames_sent = 0
+        self.unbatched_bytes = 0
+        self.bytes_sent = 0
+
+    def add(self, text):
+        if not text:
+            return
+        self.deltas_received += 1
+        self.unbatched_bytes += len(encode_frame(text).encode('utf-8'))
+        self._buffer.append(text)
+        self._buffered_bytes += len(text.encode('utf-8'))
+
+        if self._last_flush is None or self.due():
+            self.flush()
+
+    def due(self):
+        if not self._buffer:
+            return False
+        if self._buffered_bytes >= self.flush_bytes:
+            return True
+        return self.clock() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        self._last_flush = self.clock()
+        if not self._buffer:
+            return
+        content = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered_bytes = 0
+        self.frames_sent += 1
+        self.bytes_sent += len(encode_frame(content).encode('utf-8'))
+        self.send_frame(content)
+
+    def stats(self):
+        return {
+            'deltasReceived': self.deltas_received,
+            'framesSent': self.frames_sent,
+            'framesSaved': self.deltas_received - self.frames_sent,
+            'bytesSent': self.bytes_sent,
+            'bytesSaved': self.unbatched_bytes - self.bytes_sent
+        }
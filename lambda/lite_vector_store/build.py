@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from botocore.exceptions import ClientError
+from event_helpers import provisioning_handler
+from store import chunk_text, document_text, embed, index_prefix, normalize, s3
+
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', '300'))
+CHUNK_OVERLAP_PERCENTAGE = int(os.environ.get('CHUNK_OVERLAP_PERCENTAGE', '20'))
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', '8'))
+
+@provisioning_handler("building lite index", catch=(ClientError,))
+def handler(event, context):
+    """Builds a chatbot's lite knowledge base from its staged documents.
+
+    Chunks every document under documents/<chatbotId>/, embeds the chunks in parallel and
+    publishes the vectors and chunk texts as a new index version. Used by provisioning and
+    by sync_knowledge_base after the document set changed.
+    """
+    chatbot_id = event['chatbotId']
+    bucket = os.environ['DOCUMENTS_BUCKET']
+
+    chunks = []
+    for key in staged_documents(bucket, chatbot_id):
+        text = document_text(key, s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+        if text is None:
+            print(f"Skipping {key}: not a text document")
+            continue
+        chunks.extend({'text': chunk, 'source': key}
+                      for chunk in chunk_text(text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_PERCENTAGE))
+
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as executor:
+        embeddings = list(executor.map(lambda chunk: embed(chunk['text']), chunks))
+
+    version = publish(bucket, chatbot_id, embeddings, chunks)
+    return {
+        'statusCode': 200,
+        'chatbotId': chatbot_id,
+        'version': version,
+        'chunks': len(chunks)
+    }
+
+def staged_documents(bucket, chatbot_id):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"documents/{chatbot_id}/"):
+        for item in page.get('Contents', []):
+            yield item['Key']
+
+def publish(bucket, chatbot_id, embeddings, chunks):
+    """Uploads a new index version, then switches the pointer to it."""
+    version = f"{chatbot_id}-{int(time.time() * 1000)}"
+    vectors = normalize(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(vectors, dtype=np.float32))
+    s3.put_object(Bucket=bucket, Key=f"{index_prefix(chatbot_id, version)}/vectors.npy", Body=buffer.getvalue())
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{index_prefix(chatbot_id, version)}/chunks.jsonl",
+        Body=''.join(json.dumps(chunk) + '\n' for chunk in chunks).encode('utf-8')
+    )
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{index_prefix(chatbot_id)}/current.json",
+        Body=json.dumps({'version': version, 'chunks': len(chunks), 'dimension': int(vectors.shape[1])}).encode('utf-8')
+    )
+    print(f"Published lite index {version} with {len(chunks)} chunks")
+    return version
@@ -0,0 +1,41 @@
+import json
+import os
+from store import LiteIndexCache, embed
+
+LITE_ACTION_GROUP_PREFIX = 'lite-kb-'
+LITE_TOP_K = int(os.environ.get('LITE_TOP_K', '5'))
+
+# Loaded indexes survive across invocations of a warm instance
+indexes = LiteIndexCache(os.environ.get('DOCUMENTS_BUCKET'))
+
+def handler(event, context):
+    """Agent action group over a chatbot's lite knowledge base: top-k passages for a query.
+
+    The action group is named ``lite-kb-<chatbotId>``, so the chatbot comes from the event
+    without a lookup.
+    """
+    print(f"Received event: {json.dumps(event)}")
+    action_group = event['actionGroup']
+    parameters = {parameter['name']: parameter['value'] for parameter in event.get('parameters', [])}
+    chatbot_id = (event.get('sessionAttributes') or {}).get('chatbotId') or action_group[len(LITE_ACTION_GROUP_PREFIX):]
+
+    index = indexes.get(chatbot_id)
+    if index is None:
+        body = "No documents have been indexed for this chatbot yet."
+    else:
+        results = index.search(embed(parameters['query'], input_type='search_query'), int(parameters.get('k', LITE_TOP_K)))
+        body = '\n\n'.join(f"[{os.path.basename(chunk['source'])}] {chunk['text']}" for _, chunk in results) \
+            or "No relevant passages found."
+
+    return {
+        'messageVersion': '1.0',
+        'response': {
+            'actionGroup': action_group,
+            'function': event['function'],
+            'functionResponse': {
+                'responseBody': {'TEXT': {'body': body}}
+            }
+        },
+        'sessionAttributes': event.get('sessionAttributes', {}),
+        'promptSessionAttributes': event.get('promptSessionAttributes', {})
+    }
@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from aws_clients import lazy_client
+
+s3 = lazy_client('s3')
+bedrock_runtime = lazy_client('bedrock-runtime')
+
+# Lite knowledge bases live in the documents bucket: lite-index/<chatbotId>/current.json points
+# at an immutable version directory holding vectors.npy (L2-normalized float32 rows) and
+# chunks.jsonl (one chunk per row), so a rebuild never exposes a half-written index
+LITE_INDEX_PREFIX = 'lite-index'
+LOCAL_DIR = '/tmp/lite-index'
+LITE_INDEX_MAX_CHATBOTS = int(os.environ.get('LITE_INDEX_MAX_CHATBOTS', '16'))
+LITE_INDEX_REFRESH_SECONDS = int(os.environ.get('LITE_INDEX_REFRESH_SECONDS', '60'))
+
+def index_prefix(chatbot_id, version=None):
+    prefix = f"{LITE_INDEX_PREFIX}/{chatbot_id}"
+    return f"{prefix}/{version}" if version else prefix
+
+def embed(text, input_type='search_document'):
+    """Embeds text with EMBEDDING_MODEL_ARN, the model OpenSearch-backed knowledge bases use too."""
+    model_id = os.environ['EMBEDDING_MODEL_ARN']
+    if 'cohere.' in model_id:
+        body = {'texts': [text], 'input_type': input_type}
+    else:
+        body = {'inputText': text}
+    response = bedrock_runtime.invoke_model(
+        modelId=model_id,
+        contentType='application/json',
+        accept='application/json',
+        body=json.dumps(body)
+    )
+    result = json.loads(response['body'].read())
+    return result['embeddings'][0] if 'embeddings' in result else result['embedding']
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+class LiteIndex:
+    """One chatbot's chunk embeddings, memory-mapped from /tmp and searched by dot product."""
+
+    def __init__(self, version, vectors, chunks):
+        self.version = version
+        self.vectors = vectors
+        self.chunks = chunks
+        self.checked_at = time.monotonic()
+
+    def search(self, query_embedding, k):
+        """Returns ``[(score, chunk)]`` for the k chunks with the highest cosine similarity."""
+        if len(self.chunks) == 0:
+            return []
+        scores = self.vectors @ normalize(query_embedding)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[row]), self.chunks[row]) for row in top]
+
+class LiteIndexCache:
+    """Per-instance LRU of loaded indexes; the version pointer is re-read at most once a minute."""
+
+    def __init__(self, bucket, max_chatbots=LITE_INDEX_MAX_CHATBOTS):
+        self.bucket = bucket
+        self.max_chatbots = max_chatbots
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chatbot_id):
+        with self.lock:
+            index = self.indexes.get(chatbot_id)
+            if index is not None:
+                self.indexes.move_to_end(chatbot_id)
+                if time.monotonic() - index.checked_at < LITE_INDEX_REFRESH_SECONDS:
+                    return index
+
+        pointer = self.read_pointer(chatbot_id)
+        if pointer is None:
+            return None
+        if index is not None and index.version == pointer['version']:
+            index.checked_at = time.monotonic()
+            return index
+
+        index = self.load(chatbot_id, pointer['version'])
+        with self.lock:
+            previous = self.indexes.pop(chatbot_id, None)
+            self.indexes[chatbot_id] = index
+            evicted = [previous] if previous is not None else []
+            while len(self.indexes) > self.max_chatbots:
+                evicted.append(self.indexes.popitem(last=False)[1])
+        for old in evicted:
+            # Free /tmp; the memory map stays valid for searches still holding the old index
+            shutil.rmtree(os.path.join(LOCAL_DIR, old.version), ignore_errors=True)
+        return index
+
+    def read_pointer(self, chatbot_id):
+        try:
+            response = s3.get_object(Bucket=self.bucket, Key=f"{index_prefix(chatbot_id)}/current.json")
+        except s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def load(self, chatbot_id, version):
+        local_dir = os.path.join(LOCAL_DIR, version)
+        os.makedirs(local_dir, exist_ok=True)
+        vectors_path = os.path.join(local_dir, 'vectors.npy')
+        s3.download_file(self.bucket, f"{index_prefix(chatbot_id, version)}/vectors.npy", vectors_path)
+        body = s3.get_object(Bucket=self.bucket, Key=f"{index_prefix(chatbot_id, version)}/chunks.jsonl")['Body']
+        chunks = [json.loads(line) for line in body.iter_lines() if line]
+        # Memory-map instead of reading, so only the pages a search touches are loaded
+        vectors = np.load(vectors_path, mmap_mode='r')
+        print(f"Loaded lite index {version} for chatbot {chatbot_id} with {len(chunks)} chunks")
+        return LiteIndex(version, vectors, chunks)
+
+def chunk_text(text, max_tokens, overlap_percentage):
+    """Splits text into overlapping windows of about max_tokens words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, max_tokens - max_tokens * overlap_percentage // 100)
+    return [' '.join(words[start:start + max_tokens]) for start in range(0, max(1, len(words) - max_tokens + step), step)]
+
+def document_text(key, body):
+    """Plain text of a staged document; binary formats are left to OpenSearch-backed knowledge bases."""
+    extension = os.path.splitext(key)[1].lower()
+    if extension in ('.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx'):
+        return None
+    text = body.decode('utf-8', errors='replace')
+    if extension in ('.html', '.htm'):
+        text = re.sub(r'<(script|style)\b.*?</\1>', ' ', text, flags=re.S | re.I)
+        text = re.sub(r'<[^>]+>', ' ', text)
+    return text
@@ -1,16 +1,32 @@
+import hashlib
 import json
 import os
-import boto3
+import posixpath
+import urllib.parse
+from botocore.exceptions import ClientError
+from aws_clients import lazy_client
 
-stepfunctions = boto3.client('stepfunctions')
+stepfunctions = lazy_client('stepfunctions')
+s3 = lazy_client('s3')
+
+# 'auto' gives chatbots with a small document set a lite knowledge base (embeddings memory-mapped
+# by a retrieval Lambda) instead of an OpenSearch Serverless collection; 'opensearch' or 'lite' force one
+KNOWLEDGE_BASE_BACKEND = os.environ.get('KNOWLEDGE_BASE_BACKEND', 'auto')
+LITE_MAX_DOCUMENTS = int(os.environ.get('LITE_MAX_DOCUMENTS', '25'))
+LITE_MAX_BYTES = int(os.environ.get('LITE_MAX_BYTES', str(5 * 1024 * 1024)))
+# Formats the lite store's document_text reads as text; anything else, such as PDF or Office
+# files, needs the parsing of an OpenSearch-backed knowledge base
+LITE_TEXT_EXTENSIONS = ('.txt', '.md', '.markdown', '.csv', '.json', '.html', '.htm')
 
 def handler(event, context):
     print(f"Received event: {json.dumps(event)}")
 
+    if 'Records' in event:
+        return start_bulk_provisioning(event['Records'])
+
     # Extract chatbot details from the event
     detail = event['detail']
     chatbot_id = detail['chatbotId']  # Changed from 'id' to 'chatbotId'
-    project_id = detail['projectId']
 
     if detail['type'] != 'BEDROCK_AGENT':
         print(f"Chatbot {chatbot_id} is not a Bedrock Agent. Skipping agent creation.")
@@ -20,14 +36,7 @@ def handler(event, context):
         # Start the Step Functions workflow
         response = stepfunctions.start_execution(
             stateMachineArn=os.environ['STATE_MACHINE_ARN'],
-            input=json.dumps({
-                'chatbotId': chatbot_id,
-                'projectId': project_id,
-                'name': detail['name'],
-                'description': detail['description'],
-                'language': detail['language'],
-                'documents': detail['documents']
-            })
+            input=json.dumps(execution_input(detail))
         )
         print(f"Step Functions execution started: {response['executionArn']}")
         return {
@@ -39,4 +48,98 @@ def handler(event, context):
         return {
             'statusCode': 500,
             'body': json.dumps(f"Error starting Bedrock Agent creation process: {str(e)}")
-        }
\ No newline at end of file
+        }
+
+def execution_input(detail):
+    return {
+        'chatbotId': detail['chatbotId'],
+        'projectId': detail['projectId'],
+        'name': detail['name'],
+        'description': detail['description'],
+        'language': detail['language'],
+        # Thousands of documents would not fit in a 256 KB execution input; steps read the manifest
+        'documentsManifest': write_document_manifest(detail['chatbotId'], detail['documents']),
+        # Optional k-NN index profile: latency, recall or memory
+        'indexProfile': detail.get('indexProfile'),
+        'knowledgeBaseBackend': knowledge_base_backend(detail)
+    }
+
+def knowledge_base_backend(detail):
+    backend = detail.get('knowledgeBaseBackend') or KNOWLEDGE_BASE_BACKEND
+    if backend != 'auto':
+        return backend
+    documents = detail.get('documents') or []
+    if len(documents) > LITE_MAX_DOCUMENTS:
+        return 'opensearch'
+    if not all(document_extension(document) in LITE_TEXT_EXTENSIONS for document in documents):
+        return 'opensearch'
+    # Documents may declare their size; the document count bounds the ones that do not
+    return 'opensearch' if declared_bytes(documents) > LITE_MAX_BYTES else 'lite'
+
+def declared_bytes(documents):
+    return sum(int(document.get('size') or 0) for document in documents or [] if isinstance(document, dict))
+
+def document_extension(document):
+    """Lower-cased file extension of a document given as a URL string or an object with a name or source."""
+    if isinstance(document, str):
+        name = document
+    else:
+        name = document.get('name') or document.get('s3Uri') or document.get('url') or document.get('uri') or ''
+    return posixpath.splitext(urllib.parse.urlparse(name).path)[1].lower()
+
+def write_document_manifest(chatbot_id, documents):
+    """Stores the chatbot's document list in S3 as a JSON array for the staging Map to read."""
+    bucket = os.environ['DOCUMENTS_BUCKET']
+    key = f"manifests/{chatbot_id}/documents.json"
+    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(documents or []).encode('utf-8'),
+                  ContentType='application/json')
+    # Shared collections are filled up to a byte limit by the sizes the documents declare
+    return {'bucket': bucket, 'key': key, 'count': len(documents or []), 'declaredBytes': declared_bytes(documents)}
+
+def start_bulk_provisioning(records):
+    """Starts one bulk execution for a batch of queued ChatbotCreated events.
+
+    The bulk state machine provisions the chatbots through a distributed Map with capped
+    concurrency. The execution name is derived from the SQS message IDs, so a redelivered
+    batch does not start a second execution. A record that cannot be read or prepared is
+    reported on its own and redelivered; the rest of the batch is provisioned.
+    """
+    chatbots = {}
+    message_ids = []
+    failures = []
+    for record in records:
+        try:
+            detail = json.loads(record['body'])['detail']
+            if detail.get('type') != 'BEDROCK_AGENT':
+                print(f"Chatbot {detail.get('chatbotId')} is not a Bedrock Agent. Skipping agent creation.")
+                continue
+            # Duplicate events for the same chatbot in one batch provision it once
+            chatbots[detail['chatbotId']] = execution_input(detail)
+            message_ids.append(record['messageId'])
+        except Exception as e:
+            print(f"Error preparing chatbot from message {record['messageId']}: {str(e)}")
+            failures.append({'itemIdentifier': record['messageId']})
+
+    if not chatbots:
+        return {'batchItemFailures': failures}
+
+    batch_hash = hashlib.sha256(''.join(sorted(message_ids)).encode()).hexdigest()
+    try:
+        response = stepfunctions.start_execution(
+            stateMachineArn=os.environ['BULK_STATE_MACHINE_ARN'],
+            name=f"bulk-{batch_hash[:64]}",
+            input=json.dumps({'chatbots': list(chatbots.values())})
+        )
+        print(f"Bulk provisioning of {len(chatbots)} chatbots started: {response['executionArn']}")
+        return {'batchItemFailures': failures}
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ExecutionAlreadyExists':
+            print(f"Error starting bulk provisioning execution: {e.response['Error']['Message']}")
+            return {'batchItemFailures': failures + [{'itemIdentifier': message_id} for message_id in message_ids]}
+        # A redelivered batch whose execution already started; it is not a failure
+        print(f"Bulk provisioning execution for this batch already exists: bulk-{batch_hash[:64]}")
+        return {'batchItemFailures': failures}
+    except Exception as e:
+        # Leave the batch's chatbots on the queue; SQS redelivers them after the visibility timeout
+        print(f"Error starting bulk provisioning execution: {str(e)}")
+        return {'batchItemFailures': failures + [{'itemIdentifier': message_id} for message_id in message_ids]}
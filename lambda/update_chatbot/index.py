@@ -1,49 +1,58 @@
-import json
-import os
-import boto3
+from datetime import datetime, timezone
+from decimal import Decimal
 from botocore.exceptions import ClientError
+from aws_clients import lazy_table
+from chatbot_settings import CHATBOT_TUNING_ATTRIBUTES
+from event_helpers import provisioning_handler, response, step_body
 
-dynamodb = boto3.resource('dynamodb')
-chatbot_table = dynamodb.Table(os.environ['CHATBOT_TABLE_NAME'])
-agent_table = dynamodb.Table(os.environ['AGENT_TABLE_NAME'])
+chatbot_table = lazy_table('CHATBOT_TABLE_NAME')
+agent_table = lazy_table('AGENT_TABLE_NAME')
 
+@provisioning_handler("updating Chatbot and Agent details")
 def handler(event, context):
-    print(f"Received event: {json.dumps(event)}")
-
     chatbot_id = event['chatbotId']
     project_id = event['projectId']
-    agent_id = event['agentId']
-    agent_arn = event['agentArn']
-    agent_alias_id = event['agentAliasId']
+    agent_info = agent_details(event)
 
-    try:
-        # Update chatbot with agent details
-        update_chatbot(chatbot_id, project_id, agent_id, agent_arn, agent_alias_id)
+    # Store agent details in a separate table, bumping the routing version
+    routing_version = store_agent_details(agent_info)
+
+    # Update chatbot with agent details and the routing version clients pass back to
+    # invoke_bedrock_agent, which invalidates its cached routing for older versions
+    update_chatbot(chatbot_id, project_id, agent_info['agentId'], agent_info['agentArn'],
+                   agent_info['agentAliasId'], routing_version)
 
-        # Store agent details in a separate table
-        store_agent_details(event)
+    return response(200, "Chatbot and Agent details updated successfully")
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps("Chatbot and Agent details updated successfully")
-        }
-    except Exception as e:
-        print(f"Error updating Chatbot and Agent details: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f"Error updating Chatbot and Agent details: {str(e)}")
-        }
+def agent_details(event):
+    """Collects the agent record from the outputs of the earlier provisioning steps."""
+    agent = step_body(event, 'createAgent')
+    agent_alias = step_body(event, 'agentAlias')
+    agent_info = {
+        **agent,
+        'chatbotId': event['chatbotId'],
+        'projectId': event['projectId'],
+        'agentAliasId': agent_alias['agentAliasId'],
+        'createdAt': agent_alias.get('createdAt') or datetime.now(timezone.utc).isoformat(),
+        'actionGroups': [action_group['actionGroupId'] for action_group in step_body(event, 'actionGroup')]
+    }
+    # Lite chatbots skip the knowledge base step
+    if 'knowledgeBase' in event:
+        agent_info['knowledgeBaseId'] = step_body(event, 'knowledgeBase')['knowledgeBase']['knowledgeBaseId']
+    return agent_info
 
-def update_chatbot(chatbot_id, project_id, agent_id, agent_arn, agent_alias_id):
+def update_chatbot(chatbot_id, project_id, agent_id, agent_arn, agent_alias_id, routing_version):
     try:
         chatbot_table.update_item(
             Key={'id': chatbot_id, 'projectId': project_id},
-            UpdateExpression="set agentId = :a, agentArn = :b, agentAliasId = :c, status = :s",
+            UpdateExpression="set agentId = :a, agentArn = :b, agentAliasId = :c, #status = :s, routingVersion = :v",
+            ExpressionAttributeNames={'#status': 'status'},
             ExpressionAttributeValues={
                 ':a': agent_id,
                 ':b': agent_arn,
                 ':c': agent_alias_id,
-                ':s': 'ACTIVE'
+                ':s': 'ACTIVE',
+                ':v': routing_version
             },
             ReturnValues="UPDATED_NEW"
         )
@@ -53,19 +62,35 @@ def update_chatbot(chatbot_id, project_id, agent_id, agent_arn, agent_alias_id):
         raise
 
 def store_agent_details(agent_info):
+    attributes = {
+        'projectId': agent_info['projectId'],
+        'agentId': agent_info['agentId'],
+        'agentArn': agent_info['agentArn'],
+        'agentAliasId': agent_info['agentAliasId'],
+        'foundationModel': agent_info.get('foundationModel'),
+        'knowledgeBaseId': agent_info.get('knowledgeBaseId'),
+        'actionGroups': agent_info.get('actionGroups', []),
+        'status': 'ACTIVE',
+        'createdAt': agent_info['createdAt']
+    }
+    # Per-chatbot admission limits and semantic cache threshold, when the chatbot record sets them
+    attributes.update({name: Decimal(str(agent_info[name])) for name in CHATBOT_TUNING_ATTRIBUTES if name in agent_info})
+    names = {f"#f{i}": name for i, name in enumerate(attributes)}
+    values = {f":f{i}": value for i, value in enumerate(attributes.values())}
+    values[':one'] = 1
+
     try:
-        agent_table.put_item(Item={
-            'chatbotId': agent_info['chatbotId'],
-            'projectId': agent_info['projectId'],
-            'agentId': agent_info['agentId'],
-            'agentArn': agent_info['agentArn'],
-            'agentAliasId': agent_info['agentAliasId'],
-            'knowledgeBaseId': agent_info.get('knowledgeBaseId'),
-            'actionGroups': agent_info.get('actionGroups', []),
-            'status': 'ACTIVE',
-            'createdAt': agent_info['createdAt']
-        })
-        print(f"Agent details stored for chatbot {agent_info['chatbotId']}")
+        # Every write bumps the version so cached routings in invoke_bedrock_agent can be invalidated
+        updated = agent_table.update_item(
+            Key={'chatbotId': agent_info['chatbotId']},
+            UpdateExpression="set " + ", ".join(f"#f{i} = :f{i}" for i in range(len(attributes))) + " add #version :one",
+            ExpressionAttributeNames={**names, '#version': 'version'},
+            ExpressionAttributeValues=values,
+            ReturnValues="UPDATED_NEW"
+        )
+        routing_version = updated['Attributes']['version']
+        print(f"Agent details stored for chatbot {agent_info['chatbotId']} at version {routing_version}")
+        return routing_version
     except ClientError as e:
         print(f"Error storing Agent details: {e.response['Error']['Message']}")
         raise
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Shared, lazily created boto3 clients and DynamoDB tables for the Lambda handlers.
+
+Handlers declare what they use at module level, e.g. ``bedrock_agent = lazy_client('bedrock-agent')``
+or ``chatbot_table = lazy_table('CHATBOT_TABLE_NAME')``. Nothing is created, and boto3 is not even
+imported, until the first attribute access, so a route that never touches a client never pays
+for it. Clients are memoized per service and settings: modules of one function that use the
+same service share one client and its connection pool.
+"""
+import os
+import threading
+
+# Connection reuse and retries applied to every client; a client can override them through ``client``
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+AWS_RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')
+AWS_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('AWS_CONNECT_TIMEOUT_SECONDS', '2'))
+AWS_READ_TIMEOUT_SECONDS = float(os.environ.get('AWS_READ_TIMEOUT_SECONDS', '60'))
+
+# boto3 sessions are not thread-safe, so clients are created under one lock
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+def client_config(**overrides):
+    """botocore Config with keep-alive, a pool sized for threaded handlers and adaptive retries."""
+    from botocore.config import Config
+    settings = {
+        'max_pool_connections': AWS_MAX_POOL_CONNECTIONS,
+        'retries': {'max_attempts': AWS_MAX_ATTEMPTS, 'mode': AWS_RETRY_MODE},
+        'connect_timeout': AWS_CONNECT_TIMEOUT_SECONDS,
+        'read_timeout': AWS_READ_TIMEOUT_SECONDS,
+        'tcp_keepalive': True,
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+def session():
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session()
+        return _session
+
+def client(service_name, endpoint_url=None, **config_overrides):
+    """Memoized client for ``service_name``; ``config_overrides`` are passed to ``client_config``."""
+    key = (service_name, endpoint_url, repr(sorted(config_overrides.items())))
+    found = _clients.get(key)
+    if found is None:
+        with _lock:
+            found = _clients.get(key)
+            if found is None:
+                found = session().client(service_name, endpoint_url=endpoint_url,
+                                         config=client_config(**config_overrides))
+                _clients[key] = found
+    return found
+
+def resource(service_name):
+    found = _resources.get(service_name)
+    if found is None:
+        with _lock:
+            found = _resources.get(service_name)
+            if found is None:
+                found = session().resource(service_name, config=client_config())
+                _resources[service_name] = found
+    return found
+
+def table(table_name):
+    found = _tables.get(table_name)
+    if found is None:
+        with _lock:
+            found = _tables.get(table_name)
+            if found is None:
+                found = resource('dynamodb').Table(table_name)
+                _tables[table_name] = found
+    return found
+
+class Lazy:
+    """Stands in for a client or table until it is first used, then forwards to it."""
+
+    __slots__ = ('_factory', '_target')
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            target = self._target = self._factory()
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __repr__(self):
+        return f"Lazy({self._target!r})" if self._target is not None else "Lazy(<not created>)"
+
+def lazy_client(service_name, endpoint_url_env=None, **config_overrides):
+    """Client created on first use; ``endpoint_url_env`` names an env var holding its endpoint URL."""
+    return Lazy(lambda: client(
+        service_name,
+        endpoint_url=os.environ[endpoint_url_env] if endpoint_url_env else None,
+        **config_overrides
+    ))
+
+def lazy_table(table_name_env):
+    """DynamoDB table named by the ``table_name_env`` env var, resolved on first use."""
+    return Lazy(lambda: table(os.environ[table_name_env]))
+
+def warm(*lazies):
+    """Creates the given clients and tables now, e.g. during a provisioned-concurrency init."""
+    for lazy in lazies:
+        if lazy is not None:
+            lazy._resolve()
+
+def created():
+    """Names of the clients and tables created so far in this process."""
+    return [key[0] for key in _clients] + [f"table:{name}" for name in _tables]
@@ -1,17 +1,19 @@
-import boto3
 from botocore.exceptions import ClientError
 import logging
+from aws_clients import client, lazy_client
+from retry_policies import AGENT_TRANSITION, PROVISIONING_RETRIES
 
 logger = logging.getLogger(__name__)
 
 class BedrockAgentWrapper:
     """Encapsulates Amazon Bedrock Agent actions."""
 
-    def __init__(self, bedrock_agent_client):
+    def __init__(self, bedrock_agent_client=None):
         """
-        :param bedrock_agent_client: A Boto3 Bedrock Agent client.
+        :param bedrock_agent_client: A Boto3 Bedrock Agent client. Defaults to the shared client
+                                     from aws_clients, created on first use.
         """
-        self.bedrock_agent_client = bedrock_agent_client
+        self.bedrock_agent_client = bedrock_agent_client or lazy_client('bedrock-agent', retries=PROVISIONING_RETRIES)
 
     def create_agent(self, agent_name, instruction, foundation_model, role_arn):
         """
@@ -89,6 +91,30 @@ class BedrockAgentWrapper:
         else:
             return agent_alias
 
+    def find_agent_alias(self, name, agent_id):
+        """
+        Looks up an alias of an agent by name, e.g. one created by an earlier run.
+
+        :param name: The name of the alias.
+        :param agent_id: The unique identifier of the agent.
+        :return: Details about the alias, or None if the agent has no alias with that name.
+        """
+        request = {'agentId': agent_id, 'maxResults': 100}
+        try:
+            while True:
+                response = self.bedrock_agent_client.list_agent_aliases(**request)
+                for summary in response['agentAliasSummaries']:
+                    if summary['agentAliasName'] == name:
+                        return self.bedrock_agent_client.get_agent_alias(
+                            agentId=agent_id, agentAliasId=summary['agentAliasId']
+                        )['agentAlias']
+                if not response.get('nextToken'):
+                    return None
+                request['nextToken'] = response['nextToken']
+        except ClientError as e:
+            logger.error(f"Couldn't list agent aliases. {e}")
+            raise
+
     def prepare_agent(self, agent_id):
         """
         Creates a DRAFT version of the agent that can be used for internal testing.
@@ -97,7 +123,8 @@ class BedrockAgentWrapper:
         :return: The response from Agents for Bedrock if successful, otherwise raises an exception.
         """
         try:
-            prepared_agent_details = self.bedrock_agent_client.prepare_agent(agentId=agent_id)
+            # Retried while the agent is still being created or updated
+            prepared_agent_details = AGENT_TRANSITION.call(self.bedrock_agent_client.prepare_agent, agentId=agent_id)
         except ClientError as e:
             logger.error(f"Couldn't prepare agent. {e}")
             raise
@@ -137,7 +164,7 @@ class BedrockAgentWrapper:
         :param input_text: The input text to send to the agent.
         :return: The response from the agent.
         """
-        bedrock_runtime_client = boto3.client('bedrock-runtime')
+        bedrock_runtime_client = client('bedrock-agent-runtime')
         try:
             response = bedrock_runtime_client.invoke_agent(
                 agentId=agent_id,
@@ -0,0 +1,6 @@
+"""Per-chatbot settings the provisioning steps carry from the chatbot record to the agent record."""
+
+# Token bucket limits read by invoke_bedrock_agent's admission control
+ADMISSION_LIMIT_ATTRIBUTES = ('admissionRate', 'admissionBurst', 'projectAdmissionRate', 'projectAdmissionBurst')
+# Optional per-chatbot settings: the admission limits and the semantic cache threshold
+CHATBOT_TUNING_ATTRIBUTES = ADMISSION_LIMIT_ATTRIBUTES + ('semanticCacheThreshold',)
@@ -0,0 +1,42 @@
+"""Event parsing and response envelopes shared by the provisioning handlers."""
+import functools
+import json
+from botocore.exceptions import ClientError
+
+def response(status_code, body):
+    """The ``{'statusCode', 'body'}`` envelope the state machine passes between steps."""
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body, default=str)
+    }
+
+def step_body(event, step):
+    """Parsed body of an earlier step's Lambda result, e.g. ``step_body(event, 'createAgent')['agentId']``."""
+    return json.loads(event[step]['Payload']['body'])
+
+def error_message(error):
+    if isinstance(error, ClientError):
+        return error.response['Error']['Message']
+    return str(error)
+
+def provisioning_handler(action, catch=(Exception,)):
+    """Logs the event and turns failures into envelopes: 400 for a missing event key, 500 otherwise.
+
+    ``action`` completes the error message, e.g. ``"preparing Agent"``. Exceptions outside
+    ``catch`` propagate, so Step Functions retries them.
+    """
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            print(f"Received event: {json.dumps(event)}")
+            try:
+                return handler(event, context)
+            except KeyError as e:
+                print(f"Error accessing key in event: {e}")
+                return response(400, f"Missing key in event: {e}")
+            except catch as e:
+                message = error_message(e)
+                print(f"Error {action}: {message}")
+                return response(500, f"Error {action}: {message}")
+        return wrapper
+    return decorate
@@ -0,0 +1,46 @@
+"""Retry policies shared by the handlers.
+
+Transport-level retries (throttling, 5xx and connection errors) are left to botocore and set per
+client through ``aws_clients``: the chat path fails fast so the client can be told to back off
+instead of the stream stalling, while provisioning rides out control-plane throttling.
+``RetryPolicy`` covers what botocore does not retry, such as Bedrock rejecting a change to an
+agent that is still being created or updated.
+"""
+import os
+import random
+import time
+from botocore.exceptions import ClientError
+
+CHAT_RETRIES = {'max_attempts': int(os.environ.get('CHAT_MAX_ATTEMPTS', '2')), 'mode': 'standard'}
+PROVISIONING_RETRIES = {'max_attempts': int(os.environ.get('PROVISIONING_MAX_ATTEMPTS', '8')), 'mode': 'adaptive'}
+
+class RetryPolicy:
+    """Retries an operation on the given error codes with decorrelated jitter between attempts."""
+
+    def __init__(self, error_codes, max_attempts=5, base_delay=1.0, max_delay=20.0, sleep=time.sleep):
+        self.error_codes = frozenset(error_codes)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def call(self, operation, *args, **kwargs):
+        delay = self.base_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return operation(*args, **kwargs)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code not in self.error_codes or attempt == self.max_attempts:
+                    raise
+                delay = min(self.max_delay, random.uniform(self.base_delay, delay * 3))
+                print(f"{code} on attempt {attempt} of {self.max_attempts}, retrying in {delay:.1f}s")
+                self.sleep(delay)
+
+# Bedrock answers ConflictException while an agent is CREATING, PREPARING or UPDATING
+AGENT_TRANSITION = RetryPolicy(
+    {'ConflictException'},
+    max_attempts=int(os.environ.get('AGENT_TRANSITION_MAX_ATTEMPTS', '6')),
+    base_delay=2.0,
+    max_delay=30.0
+)
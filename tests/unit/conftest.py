@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LAMBDA_ROOT = os.path.join(ROOT, "lambda")
+SHARED_RUNTIME = os.path.join(ROOT, "lib", "python")
+
+# Handlers read these at import or first use; clients are lazy, so nothing reaches AWS
+TEST_ENVIRONMENT = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "CHATBOT_TABLE_NAME": "chatbots",
+    "AGENT_TABLE_NAME": "agents",
+    "PROVISIONING_LEDGER_TABLE_NAME": "provisioning-ledger",
+    "DOCUMENTS_BUCKET": "documents",
+    "WEBSOCKET_API_ENDPOINT": "https://example.execute-api.us-east-1.amazonaws.com/prod",
+    "STATE_MACHINE_ARN": "arn:aws:states:us-east-1:123456789012:stateMachine:provisioning",
+    "BULK_STATE_MACHINE_ARN": "arn:aws:states:us-east-1:123456789012:stateMachine:bulk",
+}
+for name, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+if SHARED_RUNTIME not in sys.path:
+    sys.path.insert(0, SHARED_RUNTIME)
+
+def load_lambda_module(directory, module):
+    """Imports ``module`` from lambda/<directory>.
+
+    Handler directories reuse module names such as ``index``, so modules loaded from other
+    directories are dropped first; modules already imported by a test keep working.
+    """
+    path = os.path.join(LAMBDA_ROOT, directory)
+    for name, loaded in list(sys.modules.items()):
+        source = getattr(loaded, "__file__", None) or ""
+        if source.startswith(LAMBDA_ROOT + os.sep) and os.path.dirname(source) != path:
+            del sys.modules[name]
+    sys.path[:] = [entry for entry in sys.path if not entry.startswith(LAMBDA_ROOT + os.sep)]
+    sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+def client_error(code, message="error", operation="Operation"):
+    from botocore.exceptions import ClientError
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+@pytest.fixture
+def lambda_module():
+    return load_lambda_module
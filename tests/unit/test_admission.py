@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+admission = load_lambda_module("invoke_bedrock_agent", "admission")
+
+AGENT = {"projectId": "project-1", "admissionRate": 1, "admissionBurst": 2}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeBucketTable:
+    """Bucket items by key; honours the limiter's conditions on ``updatedAt``."""
+
+    def __init__(self):
+        self.items = {}
+        self.reads = self.writes = 0
+        self.error = None
+
+    def get_item(self, Key, ProjectionExpression, ConsistentRead):
+        self.reads += 1
+        if self.error:
+            raise client_error(self.error)
+        item = self.items.get(Key["chatbotId"])
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        self.writes += 1
+        if self.error:
+            raise client_error(self.error)
+        item, values = self.items.get(Key["chatbotId"]), ExpressionAttributeValues
+        if (item is not None) if ":prev" not in values else (item is None or item["updatedAt"] != values[":prev"]):
+            raise client_error("ConditionalCheckFailedException")
+        self.items[Key["chatbotId"]] = {"tokens": values[":t"], "updatedAt": values[":u"]}
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def table():
+    return FakeBucketTable()
+
+def limiter(table, clock):
+    return admission.TokenBucketLimiter(table, clock=clock)
+
+def test_burst_is_admitted_then_the_caller_is_told_when_to_retry(table, clock):
+    instance = limiter(table, clock)
+
+    assert instance.admit("c1", AGENT) == (0, None)
+    assert instance.admit("c1", AGENT) == (0, None)
+    retry_after, scope = instance.admit("c1", AGENT)
+    assert scope == "chatbot" and retry_after == pytest.approx(1.0)
+
+    clock.now += 1
+    assert instance.admit("c1", AGENT) == (0, None)
+
+def test_an_empty_local_estimate_rejects_without_calling_dynamodb(table, clock):
+    instance = limiter(table, clock)
+    for _ in range(3):
+        instance.admit("c1", AGENT)
+    reads, writes = table.reads, table.writes
+
+    assert instance.admit("c1", AGENT)[0] > 0
+    assert (table.reads, table.writes) == (reads, writes)
+
+def test_instances_share_the_bucket(table, clock):
+    first, second = limiter(table, clock), limiter(table, clock)
+
+    assert first.admit("c1", AGENT) == (0, None)
+    clock.now += 0.001
+    # The second instance has no local state yet; its conditional write sees the first's token
+    assert second.admit("c1", AGENT) == (0, None)
+    assert first.admit("c1", AGENT)[1] == "chatbot"
+
+def test_project_bucket_limits_its_chatbots_together(table, clock):
+    instance = limiter(table, clock)
+    agent = {"projectId": "project-1", "admissionRate": 100, "admissionBurst": 100,
+             "projectAdmissionRate": 1, "projectAdmissionBurst": 1}
+
+    assert instance.admit("c1", agent) == (0, None)
+    assert instance.admit("c2", agent)[1] == "project"
+
+def test_project_rejection_gives_the_chatbot_token_back(table, clock):
+    instance = limiter(table, clock)
+    agent = {"projectId": "project-1", "admissionRate": 1, "admissionBurst": 2,
+             "projectAdmissionRate": 1, "projectAdmissionBurst": 1}
+
+    assert instance.admit("c1", agent) == (0, None)
+    assert instance.admit("c1", agent)[1] == "project"
+    assert table.items["bucket#chatbot#c1"]["tokens"] == 1
+
+    clock.now += 1
+    # The refunded token and the refilled project bucket admit the next invocation
+    assert instance.admit("c1", agent) == (0, None)
+    assert table.items["bucket#chatbot#c1"]["tokens"] == 1
+
+def test_limiter_fails_open_when_dynamodb_is_unavailable(table, clock):
+    table.error = "ProvisionedThroughputExceededException"
+
+    assert limiter(table, clock).admit("c1", AGENT) == (0, None)
+
+def test_zero_rate_disables_a_bucket(table, clock):
+    assert limiter(table, clock).admit("c1", dict(AGENT, admissionRate=0, projectAdmissionRate=0)) == (0, None)
+    assert table.writes == 0
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+answer_cache = load_lambda_module("invoke_bedrock_agent", "answer_cache")
+
+AGENT = {"agentAliasId": "ALIAS1", "version": 3}
+
+class FakeCacheTable:
+    """Items by cacheKey, counting the writes each test causes."""
+
+    def __init__(self):
+        self.items = {}
+        self.writes = 0
+
+    def get_item(self, Key, ProjectionExpression=None, ConsistentRead=False):
+        item = self.items.get(Key["cacheKey"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None):
+        self.writes += 1
+        if ConditionExpression and Item["cacheKey"] in self.items:
+            raise client_error("ConditionalCheckFailedException")
+        self.items[Item["cacheKey"]] = dict(Item)
+
+def new_cache(table):
+    return answer_cache.ResponseCache(table, memory_entries=8)
+
+def test_prompt_variants_share_a_key():
+    assert answer_cache.ResponseCache.key("c1", AGENT, "What is  the Refund policy?") == \
+        answer_cache.ResponseCache.key("c1", AGENT, "what is the refund policy")
+    assert answer_cache.ResponseCache.key("c1", AGENT, "refund policy") != \
+        answer_cache.ResponseCache.key("c1", dict(AGENT, version=4), "refund policy")
+
+def test_first_turn_is_claimed_once_across_instances():
+    table = FakeCacheTable()
+    first, other = new_cache(table), new_cache(table)
+
+    assert first.claim_first_turn("conn-1")
+    assert not first.claim_first_turn("conn-1")
+    assert not other.claim_first_turn("conn-1")
+
+def test_later_turns_do_not_write():
+    table = FakeCacheTable()
+    new_cache(table).claim_first_turn("conn-1")
+
+    for _ in range(3):
+        assert not new_cache(table).claim_first_turn("conn-1")
+    assert table.writes == 1
+
+def test_answers_are_read_through_to_memory():
+    table = FakeCacheTable()
+    writer = new_cache(table)
+    writer.put("key", "c1", "The answer")
+
+    reader = new_cache(table)
+    assert reader.get("key") == ("The answer", "DynamoDB")
+    assert reader.get("key") == ("The answer", "Memory")
+
+def test_expired_items_are_misses():
+    table = FakeCacheTable()
+    table.items["key"] = {"cacheKey": "key", "answer": "Old", "expiresAt": int(time.time()) - 1}
+
+    assert new_cache(table).get("key") == (None, None)
+
+def test_empty_and_oversized_answers_are_not_stored():
+    table = FakeCacheTable()
+    cache = new_cache(table)
+    cache.put("empty", "c1", "")
+    cache.put("large", "c1", "x" * (answer_cache.MAX_CACHED_ANSWER_BYTES + 1))
+
+    assert table.items == {}
+    assert cache.get("large") == (None, None)
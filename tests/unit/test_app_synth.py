@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("aws_cdk")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="module")
+def cloud_assembly(tmp_path_factory):
+    outdir = tmp_path_factory.mktemp("cdk.out")
+    result = subprocess.run(
+        [sys.executable, "app.py"],
+        cwd=ROOT,
+        env={**os.environ, "CDK_OUTDIR": str(outdir)},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-4000:]
+    return outdir
+
+def template(outdir, stack_name):
+    with open(os.path.join(outdir, f"{stack_name}.template.json")) as template_file:
+        return json.load(template_file)
+
+def test_every_stack_synthesizes(cloud_assembly):
+    for stack_name in ("DatabaseStack", "LambdaStack", "StateMachineStack", "WebSocketApiStack",
+                       "ProvisioningQueueStack", "EventBridgeStack", "CustomResourceStack"):
+        assert template(cloud_assembly, stack_name)["Resources"]
+
+def test_bulk_provisioning_links_child_executions(cloud_assembly):
+    resources = template(cloud_assembly, "ProvisioningQueueStack")["Resources"]
+    definitions = [json.dumps(resource["Properties"]["DefinitionString"])
+                   for resource in resources.values() if resource["Type"] == "AWS::StepFunctions::StateMachine"]
+    assert any("AWS_STEP_FUNCTIONS_STARTED_BY_EXECUTION_ID" in definition for definition in definitions)
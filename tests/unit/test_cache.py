@@ -0,0 +1,48 @@
+from tests.unit.conftest import load_lambda_module
+
+cache = load_lambda_module("invoke_bedrock_agent", "cache")
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_their_ttl():
+    clock = Clock()
+    entries = cache.TTLCache(max_entries=4, ttl_seconds=10, clock=clock)
+    entries.put("a", 1)
+    entries.put("b", 2, ttl_seconds=1)
+
+    clock.now = 5
+    assert entries.get("a") == 1
+    assert entries.get("b") is None
+    clock.now = 10
+    assert entries.get("a", "gone") == "gone"
+    assert len(entries) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    entries = cache.TTLCache(max_entries=2, ttl_seconds=10, clock=Clock())
+    entries.put("a", 1)
+    entries.put("b", 2)
+    entries.get("a")
+    entries.put("c", 3)
+
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+
+def test_none_is_a_cached_value():
+    entries = cache.TTLCache(max_entries=2, ttl_seconds=10, clock=Clock())
+    entries.put("negative", None)
+
+    assert entries.get("negative", cache.MISSING) is None
+    assert entries.get("unknown", cache.MISSING) is cache.MISSING
+    assert (entries.hits, entries.misses) == (1, 1)
+
+def test_invalidate_reports_whether_anything_was_dropped():
+    entries = cache.TTLCache(max_entries=2, ttl_seconds=10, clock=Clock())
+    entries.put("a", 1)
+
+    assert entries.invalidate("a")
+    assert not entries.invalidate("a")
@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seconds each handler module may take to import in a fresh interpreter; IMPORT_BUDGET_SCALE
+# loosens them on slow machines. The chat path gets the tightest budget.
+DEFAULT_BUDGET_SECONDS = 1.0
+BUDGETS = {
+    ("invoke_bedrock_agent", "index"): 0.6,
+    ("lite_vector_store", "index"): 1.5,
+    ("lite_vector_store", "build"): 1.5,
+}
+IMPORT_BUDGET_SCALE = float(os.environ.get("IMPORT_BUDGET_SCALE", "1"))
+
+# Heavy packages a handler must not import while it loads, only once a request needs them
+DEFERRED_IMPORTS = {
+    ("invoke_bedrock_agent", "index"): ("boto3", "numpy"),
+}
+
+HANDLER_MODULES = [
+    ("associate_knowledge_base", "index"),
+    ("check_collection_status", "index"),
+    ("check_collection_status", "poller"),
+    ("create_action_group", "index"),
+    ("create_agent", "index"),
+    ("create_agent_alias", "index"),
+    ("create_knowledge_base", "index"),
+    ("create_opensearch_collection", "index"),
+    ("create_opensearch_collection", "pool"),
+    ("ingest_documents", "index"),
+    ("ingest_documents", "staging"),
+    ("ingest_documents", "sync"),
+    ("invoke_bedrock_agent", "index"),
+    ("lite_vector_store", "build"),
+    ("lite_vector_store", "index"),
+    ("prepare_agent", "index"),
+    ("trigger_bedrock_agent_creation", "index"),
+    ("update_chatbot", "index"),
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+__import__(sys.argv[1])
+seconds = time.perf_counter() - started
+import aws_clients
+print(json.dumps({'seconds': seconds, 'created': aws_clients.created(), 'modules': sorted(sys.modules)}))
+"""
+
+def import_handler(directory, module):
+    environment = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([
+            os.path.join(ROOT, "lambda", directory),
+            os.path.join(ROOT, "lib", "python"),
+            *filter(None, [os.environ.get("PYTHONPATH")]),
+        ]),
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "CHATBOT_TABLE_NAME": "chatbots",
+        "AGENT_TABLE_NAME": "agents",
+        "RESPONSE_CACHE_TABLE_NAME": "response-cache",
+        "STREAM_SESSION_TABLE_NAME": "stream-sessions",
+        "COLLECTION_POOL_TABLE_NAME": "collection-pool",
+        "READINESS_TABLE_NAME": "readiness",
+        "PROVISIONING_LEDGER_TABLE_NAME": "provisioning-ledger",
+        "DOCUMENTS_BUCKET": "documents",
+        "WEBSOCKET_API_ENDPOINT": "https://example.execute-api.us-east-1.amazonaws.com/prod",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, module],
+        cwd=os.path.join(ROOT, "lambda", directory),
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+@pytest.mark.parametrize("directory,module", HANDLER_MODULES, ids=[f"{d}.{m}" for d, m in HANDLER_MODULES])
+def test_handler_import_stays_within_budget(directory, module):
+    if directory == "lite_vector_store":
+        pytest.importorskip("numpy")
+    probe = import_handler(directory, module)
+
+    # Clients and tables are created on first use, never while the module loads
+    assert probe["created"] == []
+    for package in DEFERRED_IMPORTS.get((directory, module), ()):
+        assert package not in probe["modules"], f"{package} is imported at module load"
+
+    budget = BUDGETS.get((directory, module), DEFAULT_BUDGET_SECONDS) * IMPORT_BUDGET_SCALE
+    print(f"{directory}.{module}: imported in {probe['seconds'] * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    assert probe["seconds"] < budget
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tests.unit.conftest import ROOT, load_lambda_module
+
+index_profiles = load_lambda_module("create_opensearch_collection", "index_profiles")
+
+spec = importlib.util.spec_from_file_location("benchmark", os.path.join(ROOT, "benchmarks", "index_profiles.py"))
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+class ExactBackend:
+    """Brute-force search standing in for an ANN library; ``misses`` drops that many true neighbours."""
+
+    name = "exact"
+    engine = "nmslib"
+    supports_quantization = False
+
+    def __init__(self, misses=0):
+        self.misses = misses
+
+    def build(self, corpus, m, ef_construction, quantized):
+        return corpus
+
+    def memory_bytes(self, index):
+        return index.nbytes
+
+    def search(self, index, query, k, ef_search):
+        order = np.argsort(((index - query) ** 2).sum(axis=1))
+        return np.concatenate([order[:k - self.misses], order[-self.misses:] if self.misses else []]).astype(np.int64)
+
+@pytest.fixture
+def corpus(monkeypatch):
+    monkeypatch.setattr(benchmark, "M_VALUES", (8,))
+    monkeypatch.setattr(benchmark, "EF_CONSTRUCTION_VALUES", (128,))
+    monkeypatch.setattr(benchmark, "EF_SEARCH_VALUES", (32,))
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(210, 8)).astype(np.float32)
+    return vectors[:200], vectors[200:]
+
+def test_ground_truth_matches_brute_force(corpus):
+    vectors, queries = corpus
+    truth = benchmark.ground_truth(vectors, queries, k=5, batch_size=3)
+
+    for query, expected in zip(queries, truth):
+        assert list(expected) == list(np.argsort(((vectors - query) ** 2).sum(axis=1))[:5])
+
+@pytest.mark.parametrize("misses, recall", [(0, 1.0), (2, 0.6)])
+def test_recall_counts_the_true_neighbours_found(corpus, misses, recall):
+    vectors, queries = corpus
+    truth = benchmark.ground_truth(vectors, queries, k=5)
+
+    [result] = benchmark.run(ExactBackend(misses), vectors, queries, truth, k=5)
+    assert result["recall"] == pytest.approx(recall)
+
+def test_profiles_name_the_engine_that_was_measured(corpus):
+    vectors, queries = corpus
+    results = benchmark.run(ExactBackend(), vectors, queries, benchmark.ground_truth(vectors, queries, k=5), k=5)
+    profiles, _ = benchmark.choose_profiles(results, min_recall=0.95)
+
+    assert {profile["engine"] for profile in profiles.values()} == {"nmslib"}
+
+def test_nmslib_profiles_set_ef_search_on_the_index(monkeypatch):
+    monkeypatch.setitem(index_profiles.INDEX_PROFILES, "measured",
+                        {"engine": "nmslib", "space_type": "l2", "m": 16, "ef_construction": 128, "ef_search": 64})
+    def method_parameters(body):
+        return body["mappings"]["properties"]["bedrock_embedding"]["method"]["parameters"]
+    body = index_profiles.index_body("measured", 1024)
+
+    assert body["settings"]["index"]["knn.algo_param.ef_search"] == 64
+    assert "ef_search" not in method_parameters(body)
+    assert method_parameters(index_profiles.index_body("latency", 1024))["ef_search"] == 64
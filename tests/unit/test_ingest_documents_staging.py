@@ -0,0 +1,59 @@
+import socket
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import load_lambda_module
+from tests.unit.test_ingest_documents_sync import CHATBOT_ID, FakeS3
+
+staging = load_lambda_module("ingest_documents", "staging")
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    fake.put("sources", "a.pdf", b"a")
+    monkeypatch.setattr(staging, "s3", fake)
+    monkeypatch.setattr(staging, "DOCUMENT_SOURCE_BUCKETS", frozenset({"sources"}))
+    return fake
+
+@pytest.mark.parametrize("source", [
+    "file:///etc/passwd",
+    "ftp://example.com/a.pdf",
+    "http://example.com/a.pdf",
+    "s3://documents/documents/other-chatbot/a.pdf",
+    "https:///a.pdf",
+])
+def test_sources_outside_the_allowlist_are_rejected(s3, source):
+    with pytest.raises(ValueError):
+        staging.check_source(source)
+
+def test_allowed_sources_pass(s3):
+    assert staging.check_source("s3://sources/a.pdf").netloc == "sources"
+    assert staging.check_source("https://example.com/a.pdf").hostname == "example.com"
+
+@pytest.mark.parametrize("address", ["169.254.169.254", "10.0.0.5", "127.0.0.1", "100.64.0.1", "::1",
+                                     "fe80::1", "::ffff:192.168.1.1"])
+def test_hosts_resolving_to_non_public_addresses_are_refused(monkeypatch, address):
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, port, type=0: [(family, type, 6, "", (address, port))])
+    with pytest.raises(ValueError):
+        staging.public_address("example.com", 443)
+
+def test_public_host_resolves(monkeypatch):
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, port, type=0: [(socket.AF_INET, type, 6, "", ("93.184.215.14", port))])
+    assert staging.public_address("example.com", 443) == "93.184.215.14"
+
+def test_redirects_are_checked_against_the_allowlist(s3):
+    handler = staging.CheckedRedirectHandler()
+    with pytest.raises(ValueError):
+        handler.redirect_request(None, None, 302, "Found", {}, "http://169.254.169.254/latest/meta-data/")
+
+def test_batch_with_failed_documents_fails_after_seeding_the_rest(s3):
+    event = {"BatchInput": {"chatbotId": CHATBOT_ID}, "Items": ["s3://sources/a.pdf", "file:///etc/passwd"]}
+
+    with pytest.raises(staging.DocumentStagingError, match="1 of 2 documents"):
+        staging.handler(event, None)
+
+    seeded = [key for bucket, key in s3.objects if key.startswith(staging.seed_manifest_prefix(CHATBOT_ID))]
+    assert len(seeded) == 1
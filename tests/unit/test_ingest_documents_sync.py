@@ -0,0 +1,151 @@
+import hashlib
+import io
+import json
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+sync = load_lambda_module("ingest_documents", "sync")
+staging = load_lambda_module("ingest_documents", "staging")
+ingestion = load_lambda_module("ingest_documents", "index")
+
+BUCKET = "documents"
+CHATBOT_ID = "chatbot-1"
+
+class Body(io.BytesIO):
+    def iter_lines(self):
+        return iter(self.getvalue().splitlines())
+
+class FakeS3:
+    """Objects as ``(bucket, key) -> (body, etag)``; the ETag changes whenever the content does."""
+
+    def __init__(self):
+        self.objects = {}
+        self.writes = []
+
+    def put(self, bucket, key, body):
+        self.objects[(bucket, key)] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise client_error("404", "Not Found", "HeadObject")
+        return {"ETag": self.objects[(Bucket, Key)][1]}
+
+    def copy(self, copy_source, bucket, key, Config=None):
+        self.writes.append(key)
+        self.objects[(bucket, key)] = self.objects[(copy_source["Bucket"], copy_source["Key"])]
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise client_error("NoSuchKey", "Not Found", "GetObject")
+        return {"Body": Body(self.objects[(Bucket, Key)][0])}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.put(Bucket, Key, Body)
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            self.objects.pop((Bucket, item["Key"]), None)
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for bucket, key in fake.objects if bucket == Bucket and key.startswith(Prefix))
+                yield {"Contents": [{"Key": key} for key in keys]}
+        return Paginator()
+
+class FakeLedger:
+    def get_item(self, Key, ConsistentRead=False):
+        if Key["step"] != "knowledgeBase":
+            return {}
+        body = json.dumps({"knowledgeBase": {"knowledgeBaseId": "KB1"}})
+        return {"Item": {"output": json.dumps({"statusCode": 200, "body": body})}}
+
+class FakeBedrockAgent:
+    def __init__(self, conflicts=0):
+        self.conflicts = conflicts
+        self.started = 0
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise client_error("ConflictException", "A job is already running", "StartIngestionJob")
+        self.started += 1
+        return {"ingestionJob": {"ingestionJobId": f"job-{self.started}", "status": "STARTING"}}
+
+    def list_ingestion_jobs(self, **request):
+        return {"ingestionJobSummaries": [{"ingestionJobId": "job-running", "status": "IN_PROGRESS"}]}
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    for name in ("a", "b", "c"):
+        fake.put("sources", f"{name}.pdf", f"{name} v1".encode())
+    monkeypatch.setattr(sync, "s3", fake)
+    monkeypatch.setattr(staging, "s3", fake)
+    monkeypatch.setattr(staging, "DOCUMENT_SOURCE_BUCKETS", frozenset({"sources"}))
+    monkeypatch.setattr(sync, "ledger_table", FakeLedger())
+    monkeypatch.setattr(sync, "ensure_data_source", lambda knowledge_base_id, chatbot_id, chunking=None: "DS1")
+    monkeypatch.setattr(sync.INGESTION_SLOT, "sleep", lambda seconds: None)
+    return fake
+
+@pytest.fixture
+def bedrock_agent(monkeypatch):
+    fake = FakeBedrockAgent()
+    monkeypatch.setattr(ingestion, "bedrock_agent", fake)
+    return fake
+
+def sources(*names):
+    return [f"s3://sources/{name}.pdf" for name in names]
+
+def stage(documents):
+    return staging.handler({"BatchInput": {"chatbotId": CHATBOT_ID}, "Items": documents}, None)
+
+def run_sync(documents):
+    return sync.handler({"detail": {"chatbotId": CHATBOT_ID, "documents": documents}}, None)
+
+def test_first_sync_after_staging_uploads_nothing_unchanged(s3, bedrock_agent):
+    stage(sources("a", "b"))
+    s3.writes.clear()
+
+    summary = run_sync(sources("a", "b"))
+
+    assert (summary["added"], summary["changed"], summary["unchanged"]) == (0, 0, 2)
+    assert s3.writes == []
+    assert bedrock_agent.started == 0
+
+def test_sync_uploads_changes_and_removes_deleted_documents(s3, bedrock_agent):
+    stage(sources("a", "b"))
+    s3.put("sources", "a.pdf", b"a v2")
+    s3.writes.clear()
+
+    summary = run_sync(sources("a", "c"))
+
+    assert (summary["added"], summary["changed"], summary["deleted"]) == (1, 1, 1)
+    assert sorted(s3.writes) == sorted(staging.staged_key(CHATBOT_ID, source) for source in sources("a", "c"))
+    assert (BUCKET, staging.staged_key(CHATBOT_ID, sources("b")[0])) not in s3.objects
+    assert sorted(sync.read_hash_manifest(BUCKET, CHATBOT_ID)) == sources("a", "c")
+    assert summary["ingestionJobId"] == "job-1"
+
+def test_sync_waits_for_a_running_job_instead_of_reusing_it(s3, monkeypatch):
+    bedrock_agent = FakeBedrockAgent(conflicts=2)
+    monkeypatch.setattr(ingestion, "bedrock_agent", bedrock_agent)
+
+    summary = run_sync(sources("a"))
+
+    assert summary["ingestionJobId"] == "job-1"
+
+def test_manifest_is_not_written_while_another_job_holds_the_data_source(s3, monkeypatch):
+    monkeypatch.setattr(ingestion, "bedrock_agent", FakeBedrockAgent(conflicts=100))
+
+    with pytest.raises(Exception):
+        run_sync(sources("a"))
+
+    assert (BUCKET, sync.hash_manifest_key(CHATBOT_ID)) not in s3.objects
+    # The retried invocation sees the same difference
+    assert sync.read_hash_manifest(BUCKET, CHATBOT_ID) == {}
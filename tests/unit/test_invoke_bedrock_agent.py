@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+invoke = load_lambda_module("invoke_bedrock_agent", "index")
+sessions = load_lambda_module("invoke_bedrock_agent", "sessions")
+
+def test_agents_are_invoked_through_the_agent_runtime():
+    assert invoke.bedrock_agent_runtime.meta.service_model.service_name == "bedrock-agent-runtime"
+    assert hasattr(invoke.bedrock_agent_runtime, "invoke_agent")
+
+def test_embeddings_keep_the_model_runtime():
+    assert invoke.bedrock_runtime.meta.service_model.service_name == "bedrock-runtime"
+    assert hasattr(invoke.bedrock_runtime, "invoke_model")
+
+class FakeSessionTable:
+    """Session and frame items by ``(sessionToken, sk)``; enough of DynamoDB for one session's turns."""
+
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None, **request):
+        key, values = (Key["sessionToken"], Key["sk"]), ExpressionAttributeValues
+        item = self.items.get(key)
+        if UpdateExpression.startswith("set connectionId = :c, #status"):
+            item = self.items[key] = dict(item or Key, turn=(item or {}).get("turn", 0) + 1)
+            item.update(connectionId=values[":c"], status=values[":s"], resumeFrom=0, leaseUntil=values[":l"],
+                        bedrockSessionId=item.get("bedrockSessionId", values[":b"]))
+        elif item is None:
+            raise client_error("ConditionalCheckFailedException")
+        elif UpdateExpression == "set connectionId = :c, resumeFrom = :r":
+            item.update(connectionId=values[":c"], resumeFrom=values[":r"])
+        elif UpdateExpression == "set #status = :s":
+            if item["turn"] != values[":t"]:
+                raise client_error("ConditionalCheckFailedException")
+            item["status"] = values[":s"]
+        return {"Attributes": dict(item)}
+
+    def batch_writer(self):
+        table = self
+
+        class Batch:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def put_item(self, Item):
+                table.items[(Item["sessionToken"], Item["sk"])] = Item
+        return Batch()
+
+    def query(self, KeyConditionExpression, ProjectionExpression):
+        token, sk_range = (condition.get_expression()["values"] for condition in
+                           KeyConditionExpression.get_expression()["values"])
+        low, high = sk_range[1:]
+        return {"Items": [item for (item_token, sk), item in sorted(self.items.items())
+                          if item_token == token[1] and low <= sk <= high]}
+
+class FakeResponseCache:
+    def __init__(self, answers):
+        self.answers = answers
+
+    def get(self, cache_key):
+        return self.answers.get(cache_key.rsplit("#", 1)[0]), "exact"
+
+def message(connection_id, body):
+    return {"requestContext": {"connectionId": connection_id, "routeKey": "sendMessage"}, "body": json.dumps(body)}
+
+def test_resume_after_a_cache_hit_replays_the_cached_answer(monkeypatch):
+    sent = []
+    registry = sessions.SessionRegistry(FakeSessionTable())
+    monkeypatch.setattr(invoke, "session_registry", registry)
+    monkeypatch.setattr(invoke, "response_cache", FakeResponseCache({"c1#A#1": "Refunds within 30 days"}))
+    monkeypatch.setattr(invoke, "single_flight", None)
+    monkeypatch.setattr(invoke, "semantic_cache", None)
+    monkeypatch.setattr(invoke, "get_agent_details", lambda chatbot_id, min_version=None: {"agentAliasId": "A", "version": 1})
+    monkeypatch.setattr(invoke, "send_to_connection", lambda connection_id, payload: sent.append((connection_id, json.loads(payload))))
+    monkeypatch.setattr(invoke, "STREAM_FLUSH_BYTES", 8)
+
+    response = invoke.handler(message("first", {"chatbotId": "c1", "inputText": "Refunds?", "sessionToken": "token-1"}), None)
+    assert json.loads(response["body"]) == "Agent answer served from cache"
+    answer = sorted(frame["seq"] for connection, frame in sent if connection == "first")
+    assert answer == [1, 2, 3, 4]
+
+    # The client dropped before reading the answer and resumes on a new connection
+    response = invoke.handler(message("second", {"action": "resume", "sessionToken": "token-1", "resumeFrom": 2}), None)
+    assert json.loads(response["body"]) == "Agent answer resumed"
+    assert [frame for connection, frame in sent if connection == "second"] == [
+        {"type": "response", "content": "0 days", "seq": 3},
+        {"type": "end", "content": None, "seq": 4},
+    ]
+    assert registry.table.items[("token-1", "session")]["status"] == sessions.COMPLETE
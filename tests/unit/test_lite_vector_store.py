@@ -0,0 +1,118 @@
+import io
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import load_lambda_module
+
+store = load_lambda_module("lite_vector_store", "store")
+build = load_lambda_module("lite_vector_store", "build")
+action_group = load_lambda_module("lite_vector_store", "index")
+
+BUCKET = "documents"
+CHATBOT_ID = "chatbot-1"
+VOCABULARY = ("refund", "shipping", "warranty")
+
+def embed(text, input_type="search_document"):
+    """Counts of a few topic words, so the nearest chunk is the one about the query's topic."""
+    words = text.lower().split()
+    return [words.count(word) + 0.01 for word in VOCABULARY]
+
+class Body(io.BytesIO):
+    def iter_lines(self):
+        return iter(self.getvalue().splitlines())
+
+class FakeS3:
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": Body(self.objects[Key])}
+
+    def download_file(self, bucket, key, path):
+        with open(path, "wb") as f:
+            f.write(self.objects[key])
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": key} for key in sorted(fake.objects) if key.startswith(Prefix)]}
+        return Paginator()
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    fake = FakeS3()
+    monkeypatch.setattr(store, "s3", fake)
+    monkeypatch.setattr(build, "s3", fake)
+    monkeypatch.setattr(build, "embed", embed)
+    monkeypatch.setattr(action_group, "embed", embed)
+    monkeypatch.setattr(store, "LOCAL_DIR", str(tmp_path))
+    monkeypatch.setenv("DOCUMENTS_BUCKET", BUCKET)
+    return fake
+
+def stage(s3, name, text):
+    s3.objects[f"documents/{CHATBOT_ID}/{name}"] = text.encode("utf-8")
+
+def ask(query):
+    event = {"actionGroup": f"lite-kb-{CHATBOT_ID}", "function": "search",
+             "parameters": [{"name": "query", "value": query}, {"name": "k", "value": "1"}]}
+    return action_group.handler(event, None)["response"]["functionResponse"]["responseBody"]["TEXT"]["body"]
+
+def test_chunks_overlap_and_cover_the_whole_text():
+    words = [f"w{i}" for i in range(25)]
+    chunks = store.chunk_text(" ".join(words), max_tokens=10, overlap_percentage=20)
+
+    assert [chunk.split()[0] for chunk in chunks] == ["w0", "w8", "w16"]
+    assert chunks[-1].split()[-1] == "w24"
+    assert store.chunk_text("   ", 10, 20) == []
+
+def test_binary_documents_are_skipped_and_html_is_stripped():
+    assert store.document_text("a.pdf", b"%PDF") is None
+    assert store.document_text("a.html", b"<p>Hi<script>x()</script></p>").split() == ["Hi"]
+
+def test_built_index_answers_with_the_closest_chunk(s3, monkeypatch):
+    monkeypatch.setattr(action_group, "indexes", store.LiteIndexCache(BUCKET))
+    stage(s3, "refunds.txt", "Every refund is paid within 30 days")
+    stage(s3, "shipping.html", "<p>Standard shipping takes 2 days</p>")
+    stage(s3, "manual.pdf", "binary")
+
+    result = build.handler({"chatbotId": CHATBOT_ID}, None)
+    assert result["chunks"] == 2
+
+    assert ask("how long does shipping take") == "[shipping.html] Standard shipping takes 2 days"
+    assert ask("refund please").startswith("[refunds.txt]")
+
+def test_cache_picks_up_a_rebuilt_index(s3, monkeypatch):
+    cache = store.LiteIndexCache(BUCKET)
+    stage(s3, "refunds.txt", "refund policy")
+    build.handler({"chatbotId": CHATBOT_ID}, None)
+    first = cache.get(CHATBOT_ID)
+    assert cache.get(CHATBOT_ID) is first
+
+    stage(s3, "warranty.txt", "warranty terms")
+    monkeypatch.setattr(build.time, "time", lambda: 2e9)
+    build.handler({"chatbotId": CHATBOT_ID}, None)
+    monkeypatch.setattr(store, "LITE_INDEX_REFRESH_SECONDS", 0)
+
+    rebuilt = cache.get(CHATBOT_ID)
+    assert rebuilt.version != first.version and len(rebuilt.chunks) == 2
+    # The old version's memory map still serves searches already holding it
+    assert first.search(embed("refund"), 1)[0][1]["text"] == "refund policy"
+
+def test_chatbot_without_an_index_is_told_so(s3, monkeypatch):
+    monkeypatch.setattr(action_group, "indexes", store.LiteIndexCache(BUCKET))
+
+    assert ask("anything") == "No documents have been indexed for this chatbot yet."
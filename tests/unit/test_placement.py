@@ -0,0 +1,116 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+placement = load_lambda_module("create_opensearch_collection", "placement")
+
+class FakePoolTable:
+    """Collection pool items by name; understands the allocator's conditional updates."""
+
+    def __init__(self, *items):
+        self.items = {item["collectionName"]: dict(item) for item in items}
+        self.before_update = None
+
+    def query(self, IndexName, KeyConditionExpression, **request):
+        status = KeyConditionExpression.get_expression()["values"][1]
+        return {"Items": [dict(item) for item in self.items.values() if item["status"] == status]}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues, **request):
+        if self.before_update:
+            self.before_update(self)
+        item = self.items[Key["collectionName"]]
+        values = ExpressionAttributeValues
+        if UpdateExpression.startswith("add"):
+            if item["status"] != values[":shared"] or item["indexCount"] >= values[":max_indexes"] \
+                    or item.get("sizeBytes", 0) > values[":room"]:
+                raise client_error("ConditionalCheckFailedException")
+            item["indexCount"] += values[":one"]
+            item["sizeBytes"] = item.get("sizeBytes", 0) + values[":size"]
+            item["chatbots"] = item["chatbots"] | values[":c"]
+        else:
+            if item["status"] != values[":from"]:
+                raise client_error("ConditionalCheckFailedException")
+            item.update(status=values[":shared"], indexCount=values[":one"], sizeBytes=values[":size"],
+                        chatbots=values[":c"])
+        return {"Attributes": dict(item)}
+
+    def put_item(self, Item):
+        self.items[Item["collectionName"]] = dict(Item)
+
+def shared(name, *chatbots, size=0):
+    return {"collectionName": name, "status": placement.SHARED, "indexCount": len(chatbots), "sizeBytes": size,
+            "chatbots": set(chatbots)}
+
+def allocator(table, max_indexes=2, max_bytes=100):
+    return placement.PlacementAllocator(table, "status-index", max_indexes=max_indexes, max_bytes=max_bytes)
+
+def test_fullest_collection_with_room_is_filled_first():
+    table = FakePoolTable(shared("a", "c1"), shared("b"), shared("full", "c2", "c3"))
+
+    assert allocator(table).allocate("new")["collectionName"] == "a"
+    assert table.items["a"]["indexCount"] == 2
+
+def test_rerun_finds_its_collection_even_once_it_is_full():
+    table = FakePoolTable(shared("a", "c1", "c2"), shared("b"))
+
+    assert allocator(table).allocate("c2")["collectionName"] == "a"
+    assert table.items["a"]["indexCount"] == 2
+    assert table.items["b"]["indexCount"] == 0
+
+def test_concurrent_placement_moves_on_to_the_next_collection():
+    table = FakePoolTable(shared("a", "c1"), shared("b"))
+
+    def fill_a(table):
+        table.items["a"].update(indexCount=2, chatbots={"c1", "other"})
+        table.before_update = None
+    table.before_update = fill_a
+
+    assert allocator(table).allocate("new")["collectionName"] == "b"
+
+def test_declared_sizes_fill_a_collection_before_its_index_limit():
+    table = FakePoolTable(shared("a", "c1", size=70), shared("b", size=20))
+
+    assert allocator(table, max_indexes=5).allocate("new", 40)["collectionName"] == "b"
+    assert table.items["b"]["sizeBytes"] == 60
+    assert allocator(table, max_indexes=5).allocate("small", 30)["collectionName"] == "a"
+    assert allocator(table, max_indexes=5).allocate("large", 90) is None
+
+def test_no_room_returns_none():
+    table = FakePoolTable(shared("a", "c1", "c2"))
+
+    assert allocator(table).allocate("new") is None
+
+def test_adopt_claims_a_warm_collection_once():
+    table = FakePoolTable({"collectionName": "warm", "status": "AVAILABLE"})
+
+    assert allocator(table).adopt("warm", "c1", from_status="AVAILABLE")["chatbots"] == {"c1"}
+    assert allocator(table).adopt("warm", "c2", from_status="AVAILABLE") is None
+
+def test_vector_index_names_are_valid_and_distinct():
+    first, second = placement.vector_index_name("Chatbot_ONE" * 10), placement.vector_index_name("chatbot-one" * 10)
+    assert first != second
+    assert first == first.lower() and len(first) <= 52
+
+class FakeCollections:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def batch_get_collection(self, names):
+        return {"collectionDetails": [{"name": name, "status": self.statuses[name]} for name in names]}
+
+def test_pool_run_goes_on_past_a_collection_whose_index_fails(monkeypatch):
+    pool = load_lambda_module("create_opensearch_collection", "pool")
+    available = []
+
+    def create_index(collection_name):
+        if collection_name == "broken":
+            raise OSError("connection reset")
+    monkeypatch.setattr(pool, "opensearch_serverless", FakeCollections({"broken": "ACTIVE", "ready": "ACTIVE"}))
+    monkeypatch.setattr(pool, "query_status", lambda status: [{"collectionName": "broken"}, {"collectionName": "ready"}])
+    monkeypatch.setattr(pool, "create_index", create_index)
+    monkeypatch.setattr(pool, "mark_available", available.append)
+
+    assert pool.promote_ready_collections() == (["ready"], [])
+    assert available == ["ready"]
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("aws_cdk")
+
+from bedrock_agent_project.provisioning_graph import ProvisioningGraph
+
+def graph_of(*steps):
+    """Builds a graph from ``(name, depends_on, estimated_seconds)``; a ``~`` prefix marks placeholders."""
+    graph = ProvisioningGraph()
+    for name, depends_on, seconds in steps:
+        placeholder = name.startswith("~")
+        graph.add(name.lstrip("~"), None if placeholder else name, depends_on, estimated_seconds=seconds)
+    return graph
+
+def provisioning(readiness_waits=False):
+    """The shape of the chatbot provisioning workflow, with its placeholder waits in poll mode."""
+    wait = "" if readiness_waits else "~"
+    return graph_of(
+        ("collection", [], 5),
+        ("collectionReady", ["collection"], 300),
+        ("createAgent", [], 5),
+        (f"{wait}agentReady", ["createAgent"], 10),
+        ("knowledgeBase", ["collectionReady"], 5),
+        (f"{wait}knowledgeBaseReady", ["knowledgeBase"], 30),
+        ("associateKnowledgeBase", ["knowledgeBaseReady", "agentReady"], 3),
+        ("liteIndex", ["stageDocuments"], 30),
+        ("actionGroup", ["agentReady"], 5),
+        ("prepareAgent", ["associateKnowledgeBase", "actionGroup"], 5),
+        (f"{wait}agentPrepared", ["prepareAgent"], 30),
+        ("agentAlias", ["agentPrepared"], 5),
+        ("updateChatbot", ["agentAlias"], 1),
+        ("stageDocuments", [], 60),
+        ("ingestion", ["knowledgeBaseReady", "stageDocuments"], 5),
+        (f"{wait}ingestionComplete", ["ingestion"], 600),
+    )
+
+def test_unrelated_steps_run_in_parallel_and_chains_in_series():
+    graph = graph_of(("a", [], 1), ("b", ["a"], 1), ("c", [], 1))
+
+    assert graph.plan() == ("parallel", [("series", ["a", "b"]), "c"])
+    assert graph.describe() == "((a -> b) | c)"
+
+def test_placeholders_pass_their_dependencies_on():
+    graph = graph_of(("a", [], 1), ("~ready", ["a"], 30), ("b", ["ready"], 1))
+
+    assert graph.dependencies() == {"a": set(), "b": {"a"}}
+    assert graph.plan() == ("series", ["a", "b"])
+
+def test_cycles_and_unknown_steps_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        graph_of(("a", ["b"], 1), ("b", ["a"], 1)).plan()
+    with pytest.raises(ValueError, match="unknown step"):
+        graph_of(("a", ["missing"], 1)).plan()
+
+@pytest.mark.parametrize("readiness_waits", [False, True])
+def test_plan_respects_every_dependency(readiness_waits):
+    graph = provisioning(readiness_waits)
+    dependencies = graph.dependencies()
+    waits = graph.waits(graph.plan())
+
+    assert set(waits) == set(dependencies)
+    for name, depends_on in dependencies.items():
+        assert depends_on <= waits[name], name
+
+@pytest.mark.parametrize("readiness_waits", [False, True])
+def test_knowledge_base_starts_right_after_the_collection_is_ready(readiness_waits):
+    graph = provisioning(readiness_waits)
+    plan = graph.plan()
+
+    assert graph.waits(plan)["knowledgeBase"] == {"collection", "collectionReady"}
+    assert graph.plan_seconds(plan) == graph.critical_path()[0]
+
+def test_critical_path_follows_the_longest_chain():
+    seconds, steps = provisioning(readiness_waits=True).critical_path()
+
+    assert seconds == 945
+    assert steps == ["collection", "collectionReady", "knowledgeBase", "knowledgeBaseReady",
+                     "ingestion", "ingestionComplete"]
@@ -0,0 +1,296 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+CHATBOT = {
+    "id": "chatbot-1",
+    "projectId": "project-1",
+    "name": "Support",
+    "description": "Answers support questions",
+    # Numbers read from DynamoDB are Decimals
+    "admissionRate": Decimal("5"),
+    "semanticCacheThreshold": Decimal("0.9"),
+}
+CREATED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+class FakeBedrockAgent:
+    """The slice of the bedrock-agent API the provisioning steps call; names conflict like Bedrock's."""
+
+    def __init__(self):
+        self.agents = {}
+        self.knowledge_bases = {}
+        self.action_groups = {}
+        self.aliases = {}
+        self.associations = []
+        self.prepared = []
+
+    @staticmethod
+    def conflict_on(existing, name):
+        if name in existing:
+            raise client_error("ConflictException", f"{name} already exists")
+
+    def create_agent(self, agentName, **params):
+        self.conflict_on({agent["agentName"] for agent in self.agents.values()}, agentName)
+        agent_id = f"AGENT{len(self.agents)}"
+        self.agents[agent_id] = {"agentId": agent_id, "agentName": agentName,
+                                 "agentArn": f"arn:aws:bedrock:::agent/{agent_id}"}
+        return {"agent": self.agents[agent_id]}
+
+    def list_agents(self, **request):
+        return {"agentSummaries": list(self.agents.values())}
+
+    def get_agent(self, agentId):
+        return {"agent": self.agents[agentId]}
+
+    def create_knowledge_base(self, name, **params):
+        self.conflict_on({kb["name"] for kb in self.knowledge_bases.values()}, name)
+        knowledge_base_id = f"KB{len(self.knowledge_bases)}"
+        self.knowledge_bases[knowledge_base_id] = {"knowledgeBaseId": knowledge_base_id, "name": name,
+                                                   "createdAt": CREATED_AT}
+        return {"knowledgeBase": self.knowledge_bases[knowledge_base_id]}
+
+    def list_knowledge_bases(self, **request):
+        return {"knowledgeBaseSummaries": list(self.knowledge_bases.values())}
+
+    def get_knowledge_base(self, knowledgeBaseId):
+        return {"knowledgeBase": self.knowledge_bases[knowledgeBaseId]}
+
+    def list_agent_versions(self, agentId, **request):
+        return {"agentVersionSummaries": [{"agentVersion": "DRAFT"}]}
+
+    def create_agent_action_group(self, agentId, actionGroupName, **params):
+        self.conflict_on({group["actionGroupName"] for group in self.action_groups.values()}, actionGroupName)
+        action_group_id = f"AG{len(self.action_groups)}"
+        self.action_groups[action_group_id] = {"actionGroupId": action_group_id, "actionGroupName": actionGroupName}
+        return {"agentActionGroup": self.action_groups[action_group_id]}
+
+    def list_agent_action_groups(self, **request):
+        return {"actionGroupSummaries": list(self.action_groups.values())}
+
+    def get_agent_action_group(self, actionGroupId, **request):
+        return {"agentActionGroup": self.action_groups[actionGroupId]}
+
+    def associate_agent_knowledge_base(self, agentId, agentVersion, knowledgeBaseId, description):
+        self.associations.append((agentId, agentVersion, knowledgeBaseId))
+        return {"agentKnowledgeBase": {"knowledgeBaseId": knowledgeBaseId}}
+
+    def prepare_agent(self, agentId):
+        self.prepared.append(agentId)
+        return {"agentId": agentId, "agentStatus": "PREPARING", "preparedAt": CREATED_AT}
+
+    def create_agent_alias(self, agentAliasName, agentId):
+        self.conflict_on({alias["agentAliasName"] for alias in self.aliases.values()}, agentAliasName)
+        alias_id = f"ALIAS{len(self.aliases)}"
+        self.aliases[alias_id] = {"agentAliasId": alias_id, "agentAliasName": agentAliasName,
+                                  "agentId": agentId, "createdAt": CREATED_AT}
+        return {"agentAlias": self.aliases[alias_id]}
+
+    def list_agent_aliases(self, agentId, **request):
+        return {"agentAliasSummaries": list(self.aliases.values())}
+
+    def get_agent_alias(self, agentId, agentAliasId):
+        return {"agentAlias": self.aliases[agentAliasId]}
+
+class FakeOpenSearchServerless:
+    def batch_get_collection(self, names):
+        return {"collectionDetails": [{"name": names[0], "status": "ACTIVE"}]}
+
+class FakeLambda:
+    def list_functions(self, MaxItems):
+        return {"Functions": [{"FunctionArn": "arn:aws:lambda:::function:actions"}]}
+
+class FakeTable:
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.updates = []
+
+    def get_item(self, Key):
+        return {"Item": self.items[0]} if self.items else {}
+
+    def update_item(self, **request):
+        self.updates.append(request)
+        return {"Attributes": {"version": len(self.updates)}}
+
+@pytest.fixture
+def bedrock_agent():
+    return FakeBedrockAgent()
+
+@pytest.fixture
+def handlers(monkeypatch, bedrock_agent):
+    """Each step's handler module, wired to the fakes."""
+    monkeypatch.setenv("AGENT_ROLE_ARN", "arn:aws:iam:::role/agent")
+    monkeypatch.setenv("KNOWLEDGE_BASE_ROLE_ARN", "arn:aws:iam:::role/knowledge-base")
+    monkeypatch.setenv("EMBEDDING_MODEL_ARN", "arn:aws:bedrock:::foundation-model/embed")
+    chatbot_table = FakeTable([CHATBOT])
+    modules = {}
+
+    modules["createAgent"] = load_lambda_module("create_agent", "index")
+    monkeypatch.setattr(modules["createAgent"], "bedrock_agent", bedrock_agent)
+    monkeypatch.setattr(modules["createAgent"], "chatbot_table", chatbot_table)
+
+    modules["knowledgeBase"] = load_lambda_module("create_knowledge_base", "index")
+    monkeypatch.setattr(modules["knowledgeBase"], "bedrock_agent", bedrock_agent)
+    monkeypatch.setattr(modules["knowledgeBase"], "opensearch_serverless", FakeOpenSearchServerless())
+
+    modules["actionGroup"] = load_lambda_module("create_action_group", "index")
+    monkeypatch.setattr(modules["actionGroup"], "bedrock_agent", bedrock_agent)
+    monkeypatch.setattr(modules["actionGroup"], "lambda_client", FakeLambda())
+
+    for step, directory in (("associateKnowledgeBase", "associate_knowledge_base"),
+                            ("prepareAgent", "prepare_agent"),
+                            ("agentAlias", "create_agent_alias")):
+        modules[step] = load_lambda_module(directory, "index")
+        monkeypatch.setattr(modules[step].agents, "bedrock_agent_client", bedrock_agent)
+
+    modules["updateChatbot"] = load_lambda_module("update_chatbot", "index")
+    monkeypatch.setattr(modules["updateChatbot"], "chatbot_table", chatbot_table)
+    monkeypatch.setattr(modules["updateChatbot"], "agent_table", FakeTable())
+    return modules
+
+def execution_input():
+    return {
+        "chatbotId": CHATBOT["id"],
+        "projectId": CHATBOT["projectId"],
+        "name": CHATBOT["name"],
+        "description": CHATBOT["description"],
+        "language": "en",
+        "knowledgeBaseBackend": "opensearch",
+        "opensearchCollection": {"Payload": {"collectionArn": "arn:aws:aoss:::collection/kb-1",
+                                             "vectorIndexName": "bedrock-kb-index"}},
+    }
+
+def run_step(state, handlers, step):
+    """Runs a step the way the LambdaInvoke task does, its result at ``$.<step>``."""
+    result = handlers[step].handler(json.loads(json.dumps(state)), None)
+    assert result["statusCode"] == 200, result["body"]
+    state[step] = {"ExecutedVersion": "$LATEST", "StatusCode": 200, "Payload": result}
+    return json.loads(result["body"])
+
+STEPS = ("createAgent", "knowledgeBase", "actionGroup", "associateKnowledgeBase", "prepareAgent",
+         "agentAlias", "updateChatbot")
+
+def test_steps_read_earlier_results_from_the_execution_state(handlers, bedrock_agent):
+    state = execution_input()
+    for step in STEPS:
+        run_step(state, handlers, step)
+
+    assert bedrock_agent.associations == [("AGENT0", "DRAFT", "KB0")]
+    assert bedrock_agent.prepared == ["AGENT0"]
+    assert bedrock_agent.aliases["ALIAS0"]["agentAliasName"] == "Alias-Support"
+
+    agent_record, chatbot_record = handlers["updateChatbot"].agent_table.updates[0], handlers["updateChatbot"].chatbot_table.updates[0]
+    stored = dict(zip(agent_record["ExpressionAttributeNames"].values(), agent_record["ExpressionAttributeValues"].values()))
+    assert stored["agentAliasId"] == "ALIAS0"
+    assert stored["knowledgeBaseId"] == "KB0"
+    assert stored["actionGroups"] == ["AG0"]
+    assert stored["admissionRate"] == 5
+    assert stored["semanticCacheThreshold"] == Decimal("0.9")
+    assert chatbot_record["ExpressionAttributeValues"][":c"] == "ALIAS0"
+
+def test_rerun_steps_find_the_resources_an_earlier_run_created(handlers, bedrock_agent):
+    first = execution_input()
+    for step in STEPS:
+        run_step(first, handlers, step)
+
+    # A re-run that lost its ledger entries, e.g. after failing between a call and its record
+    second = execution_input()
+    for step in STEPS:
+        run_step(second, handlers, step)
+
+    assert len(bedrock_agent.agents) == len(bedrock_agent.knowledge_bases) == len(bedrock_agent.aliases) == 1
+    assert len(bedrock_agent.action_groups) == 1
+    for step in ("createAgent", "knowledgeBase", "actionGroup", "agentAlias"):
+        assert second[step]["Payload"]["body"] == first[step]["Payload"]["body"]
+
+def test_missing_step_result_is_reported_not_raised(handlers):
+    state = execution_input()
+    result = handlers["prepareAgent"].handler(state, None)
+    assert result["statusCode"] == 400
+
+class FakeCollections:
+    """Collections by name, each tagged with the owner that created it."""
+
+    def __init__(self, owners):
+        self.owners = dict(owners)
+
+    def create_security_policy(self, **request):
+        pass
+
+    def create_access_policy(self, **request):
+        pass
+
+    def create_vpc_endpoint(self, name, **request):
+        return {"vpcEndpoint": {"id": f"vpce-{name}"}}
+
+    def create_collection(self, name, tags, **request):
+        if name in self.owners:
+            raise client_error("ConflictException", f"{name} already exists")
+        self.owners[name] = tags[0]["value"]
+        return {"createCollectionDetail": {"arn": f"arn:aws:aoss:::collection/{name}"}}
+
+    def batch_get_collection(self, names):
+        return {"collectionDetails": [{"arn": f"arn:aws:aoss:::collection/{names[0]}"}]}
+
+    def list_tags_for_resource(self, resourceArn):
+        return {"tags": [{"key": "chatbotId", "value": self.owners[resourceArn.rsplit("/", 1)[1]]}]}
+
+@pytest.fixture
+def collections(monkeypatch):
+    module = load_lambda_module("create_opensearch_collection", "index")
+    monkeypatch.setenv("VPC_ID", "vpc-1")
+    monkeypatch.setenv("SUBNET_IDS", "subnet-1")
+    monkeypatch.setenv("SECURITY_GROUP_ID", "sg-1")
+    return module
+
+def test_collection_names_fit_the_policy_name_limit(collections):
+    name = collections.create_unique_name("a" * 36)
+    assert len(f"{name}-data-access-policy") <= 32
+    assert name == collections.create_unique_name("a" * 36)
+
+def test_rerun_reuses_its_own_collection(monkeypatch, collections):
+    fake = FakeCollections({collections.create_unique_name("chatbot-1"): "chatbot-1"})
+    monkeypatch.setattr(collections, "opensearch_serverless", fake)
+
+    name, _, _ = collections.start_collection("chatbot-1")
+    assert name == collections.create_unique_name("chatbot-1")
+
+def test_name_held_by_another_chatbot_moves_to_the_next_candidate(monkeypatch, collections):
+    fake = FakeCollections({collections.create_unique_name("chatbot-1"): "chatbot-2"})
+    monkeypatch.setattr(collections, "opensearch_serverless", fake)
+
+    name, _, _ = collections.start_collection("chatbot-1")
+    assert name == collections.create_unique_name("chatbot-1", attempt=1)
+    assert fake.owners[name] == "chatbot-1"
+
+def test_index_request_is_signed_with_its_payload_hash(monkeypatch, collections):
+    sent = []
+
+    class Response:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def read(self):
+            return b"{}"
+
+    def urlopen(request, timeout):
+        sent.append(request)
+        return Response()
+    monkeypatch.setenv("EMBEDDING_DIMENSION", "1024")
+    monkeypatch.setattr(collections, "get_collection_endpoint", lambda name: "abc.us-east-1.aoss.amazonaws.com")
+    monkeypatch.setattr(collections.urllib.request, "urlopen", urlopen)
+
+    collections.create_index("collection-1")
+
+    headers = {name.lower(): value for name, value in sent[0].header_items()}
+    assert headers["x-amz-content-sha256"] == hashlib.sha256(sent[0].data).hexdigest()
+    assert "x-amz-content-sha256" in headers["authorization"].split("SignedHeaders=")[1].split(",")[0]
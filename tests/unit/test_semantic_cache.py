@@ -0,0 +1,108 @@
+import shutil
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+semantic_cache = load_lambda_module("invoke_bedrock_agent", "semantic_cache")
+semantic_cache.load_numpy()
+
+class FakeS3:
+    """Snapshot objects kept as local files, so uploads and downloads go through real paths."""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key):
+        self.objects[key] = self.root / key.replace("/", "_")
+        shutil.copyfile(path, self.objects[key])
+
+    def download_file(self, bucket, key, path):
+        if key not in self.objects:
+            raise client_error("404", "Not Found", "HeadObject")
+        shutil.copyfile(self.objects[key], path)
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = self.root / Key.replace("/", "_")
+        self.objects[Key].write_bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error("NoSuchKey", "Not Found", "GetObject")
+        return {"Body": self.objects[Key].open("rb")}
+
+def test_search_returns_the_closest_answer_above_the_threshold():
+    index = semantic_cache.SemanticIndex(dimension=2, capacity=4)
+    index.add([1.0, 0.0], "east")
+    index.add([0.0, 3.0], "north")
+
+    assert index.search([0.9, 0.1], threshold=0.9) == ("east", pytest.approx(0.9939, abs=1e-4))
+    answer, similarity = index.search([1.0, 1.0], threshold=0.9)
+    assert answer is None and similarity == pytest.approx(0.7071, abs=1e-4)
+
+def test_search_of_an_empty_index_misses():
+    index = semantic_cache.SemanticIndex(dimension=2, capacity=4)
+    assert index.search([1.0, 0.0], threshold=0.0)[0] is None
+
+def test_full_index_overwrites_the_oldest_entry():
+    index = semantic_cache.SemanticIndex(dimension=2, capacity=2)
+    for answer, vector in (("first", [1.0, 0.0]), ("second", [0.0, 1.0]), ("third", [-1.0, 0.0])):
+        index.add(vector, answer)
+
+    assert index.count == 2
+    assert index.search([1.0, 0.0], threshold=0.5)[0] is None
+    assert index.search([-1.0, 0.0], threshold=0.5)[0] == "third"
+
+def test_index_loaded_from_a_read_only_map_can_still_grow(tmp_path):
+    path = tmp_path / "vectors.npy"
+    np.save(path, semantic_cache.SemanticIndex.normalize([[1.0, 0.0]]))
+    index = semantic_cache.SemanticIndex.from_arrays(np.load(path, mmap_mode="r"), ["east"], 1, capacity=4)
+
+    index.add([0.0, 1.0], "north")
+    assert index.search([0.0, 1.0], threshold=0.9)[0] == "north"
+    assert index.search([1.0, 0.0], threshold=0.9)[0] == "east"
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SNAPSHOT_DIR", str(tmp_path / "local"))
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_SNAPSHOT_EVERY", 1)
+    (tmp_path / "remote").mkdir()
+    return FakeS3(tmp_path / "remote")
+
+def test_snapshot_is_one_object_and_loading_keeps_earlier_maps_intact(s3):
+    embed = semantic_cache.HashingEmbedder(dimension=64)
+
+    writer = semantic_cache.SemanticCache(embed, s3_client=s3, bucket="cache")
+    writer.store("c1/A/1", embed("refund policy"), "Refunds within 30 days")
+    assert list(s3.objects) == ["semantic-cache/c1/A/1/snapshot.npz"]
+
+    first = semantic_cache.SemanticCache(embed, s3_client=s3, bucket="cache")
+    mapped = first.get_index("c1/A/1").vectors
+    loaded = np.array(mapped)
+    writer.store("c1/A/1", embed("shipping times"), "Ships in 2 days")
+    second = semantic_cache.SemanticCache(embed, s3_client=s3, bucket="cache")
+
+    # Maps of the earlier snapshot keep reading the vectors they were loaded with
+    assert np.array_equal(mapped, loaded)
+    assert second.get_index("c1/A/1").vectors.shape == (2, 64)
+    assert second.lookup("c1/A/1", "Refund policy?", threshold=0.9)[0] == "Refunds within 30 days"
+    assert second.lookup("c1/A/1", "shipping times", threshold=0.9)[0] == "Ships in 2 days"
+
+def test_wrapped_index_resumes_overwriting_its_oldest_entry(s3):
+    embed = semantic_cache.HashingEmbedder(dimension=64)
+    writer = semantic_cache.SemanticCache(embed, s3_client=s3, bucket="cache", capacity=2)
+    for prompt in ("refund policy", "shipping times", "warranty terms"):
+        writer.store("c1/A/1", embed(prompt), prompt)
+
+    reader = semantic_cache.SemanticCache(embed, s3_client=s3, bucket="cache", capacity=2)
+    assert reader.get_index("c1/A/1").next_slot == 1
+    reader.store("c1/A/1", embed("opening hours"), "opening hours")
+
+    # "shipping times" was the oldest entry left, so it is the one replaced
+    assert reader.lookup("c1/A/1", "shipping times", threshold=0.9)[0] is None
+    assert reader.lookup("c1/A/1", "warranty terms", threshold=0.9)[0] == "warranty terms"
+    assert reader.lookup("c1/A/1", "opening hours", threshold=0.9)[0] == "opening hours"
@@ -0,0 +1,105 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+sessions = load_lambda_module("invoke_bedrock_agent", "sessions")
+
+TOKEN = "token-1"
+
+class Clock:
+    def __init__(self, now=1000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeSessionTable:
+    """The session item of one token; understands the registry's updates and their conditions."""
+
+    def __init__(self):
+        self.item = None
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None, **request):
+        values = ExpressionAttributeValues
+        item = self.item
+        if UpdateExpression.startswith("set connectionId = :c, #status"):
+            item = self.item = dict(item or Key, turn=(item or {}).get("turn", 0) + 1)
+            item.update(connectionId=values[":c"], status=values[":s"], resumeFrom=0, leaseUntil=values[":l"],
+                        bedrockSessionId=item.get("bedrockSessionId", values[":b"]))
+        elif item is None:
+            raise client_error("ConditionalCheckFailedException")
+        elif UpdateExpression == "set connectionId = :c, resumeFrom = :r":
+            item.update(connectionId=values[":c"], resumeFrom=values[":r"])
+        elif UpdateExpression == "set leaseUntil = :l":
+            if item["turn"] != values[":t"] or item["status"] != values[":s"]:
+                raise client_error("ConditionalCheckFailedException")
+            item["leaseUntil"] = values[":l"]
+        elif UpdateExpression == "set #status = :failed":
+            if item["turn"] != values[":t"] or item["status"] != values[":s"] or item["leaseUntil"] >= values[":now"]:
+                raise client_error("ConditionalCheckFailedException")
+            item["status"] = values[":failed"]
+        else:
+            if item["turn"] != values[":t"]:
+                raise client_error("ConditionalCheckFailedException")
+            item["status"] = values[":s"]
+        return {"Attributes": dict(item)}
+
+    def get_item(self, Key, ConsistentRead=False, **request):
+        return {"Item": dict(self.item)} if self.item else {}
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def registry(clock):
+    return sessions.SessionRegistry(FakeSessionTable(), lease_seconds=30, clock=clock)
+
+def test_resume_while_the_producer_renews_its_lease_keeps_streaming(registry, clock):
+    turn = registry.begin_turn(TOKEN, "first")["turn"]
+    for _ in range(3):
+        clock.now += 20
+        registry.heartbeat(TOKEN, turn)
+
+    session = registry.resume(TOKEN, "second", 4)
+    assert session["status"] == sessions.STREAMING
+    assert registry.attached_connection(TOKEN) == ("second", 4)
+
+def test_resume_fails_a_turn_whose_producer_stopped_renewing(registry, clock):
+    registry.begin_turn(TOKEN, "first")
+    clock.now += 31
+
+    assert registry.resume(TOKEN, "second", 4)["status"] == sessions.FAILED
+    # A later resume replays the failed turn rather than waiting again
+    assert registry.resume(TOKEN, "third", 4)["status"] == sessions.FAILED
+
+def test_heartbeat_does_not_revive_a_finished_or_newer_turn(registry, clock):
+    turn = registry.begin_turn(TOKEN, "first")["turn"]
+    registry.finish_turn(TOKEN, turn)
+    registry.heartbeat(TOKEN, turn)
+    assert registry.table.item["status"] == sessions.COMPLETE
+
+    registry.begin_turn(TOKEN, "first")
+    clock.now += 31
+    registry.heartbeat(TOKEN, turn)
+    assert registry.resume(TOKEN, "second", 0)["status"] == sessions.FAILED
+
+def test_turn_renewed_between_read_and_expiry_is_left_streaming(registry, clock):
+    turn = registry.begin_turn(TOKEN, "first")["turn"]
+    clock.now += 31
+    session = dict(registry.table.item)
+    registry.heartbeat(TOKEN, turn)
+
+    assert registry.expire_turn(session)["status"] == sessions.STREAMING
+
+def test_sessions_from_before_leases_are_not_failed(registry, clock):
+    registry.begin_turn(TOKEN, "first")
+    del registry.table.item["leaseUntil"]
+    clock.now += 3600
+
+    assert registry.resume(TOKEN, "second", 0)["status"] == sessions.STREAMING
+
+def test_resume_of_an_unknown_session_returns_none(registry):
+    assert registry.resume(TOKEN, "second", 0) is None
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error
+
+import event_helpers
+import retry_policies
+
+class Operation:
+    """Fails with the given error codes in turn, then returns ``done``."""
+
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        if self.codes:
+            raise client_error(self.codes.pop(0))
+        return f"done {value}"
+
+def policy(**options):
+    delays = []
+    return retry_policies.RetryPolicy({"ConflictException"}, sleep=delays.append, **options), delays
+
+def test_retries_listed_errors_with_bounded_jittered_delays():
+    retry, delays = policy(max_attempts=5, base_delay=1.0, max_delay=4.0)
+    operation = Operation("ConflictException", "ConflictException", "ConflictException")
+
+    assert retry.call(operation, "x") == "done x"
+    assert operation.calls == 4
+    assert len(delays) == 3 and all(1.0 <= delay <= 4.0 for delay in delays)
+
+def test_other_errors_are_raised_at_once():
+    retry, delays = policy()
+    operation = Operation("ValidationException")
+
+    with pytest.raises(Exception, match="ValidationException"):
+        retry.call(operation, "x")
+    assert operation.calls == 1 and delays == []
+
+def test_last_attempt_raises_the_error():
+    retry, delays = policy(max_attempts=2)
+    operation = Operation("ConflictException", "ConflictException")
+
+    with pytest.raises(Exception, match="ConflictException"):
+        retry.call(operation, "x")
+    assert operation.calls == 2 and len(delays) == 1
+
+def test_response_envelope_serializes_boto3_timestamps():
+    envelope = event_helpers.response(200, {"createdAt": datetime(2026, 1, 1, tzinfo=timezone.utc)})
+
+    assert envelope["statusCode"] == 200
+    assert json.loads(envelope["body"]) == {"createdAt": "2026-01-01 00:00:00+00:00"}
+
+def test_step_body_reads_an_earlier_step_result():
+    event = {"createAgent": {"StatusCode": 200, "Payload": event_helpers.response(200, {"agentId": "A1"})}}
+
+    assert event_helpers.step_body(event, "createAgent") == {"agentId": "A1"}
+
+def test_provisioning_handler_turns_failures_into_envelopes():
+    @event_helpers.provisioning_handler("preparing Agent", catch=(ValueError,))
+    def handler(event, context):
+        if event.get("fail") == "value":
+            raise ValueError("bad input")
+        if event.get("fail") == "runtime":
+            raise RuntimeError("retry me")
+        return event_helpers.response(200, event_helpers.step_body(event, "createAgent"))
+
+    assert handler({}, None) == event_helpers.response(400, "Missing key in event: 'createAgent'")
+    assert handler({"fail": "value"}, None) == event_helpers.response(500, "Error preparing Agent: bad input")
+    # Exceptions outside ``catch`` reach Step Functions, which retries them
+    with pytest.raises(RuntimeError):
+        handler({"fail": "runtime"}, None)
+    assert handler.__name__ == "handler"
+
+def test_client_errors_are_reported_by_their_message():
+    @event_helpers.provisioning_handler("creating Agent")
+    def handler(event, context):
+        raise client_error("ConflictException", "Agent is being updated")
+
+    assert json.loads(handler({}, None)["body"]) == "Error creating Agent: Agent is being updated"
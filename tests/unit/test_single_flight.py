@@ -0,0 +1,143 @@
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+single_flight = load_lambda_module("invoke_bedrock_agent", "single_flight")
+
+KEY = "prompt-1"
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class FakeLeaseTable:
+    """Lease items by cacheKey; understands SingleFlight's updates and their conditions."""
+
+    def __init__(self):
+        self.items = {}
+        self.on_read = None
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues):
+        existing = self.items.get(Item["cacheKey"])
+        if existing and existing["leaseUntil"] >= ExpressionAttributeValues[":now"]:
+            raise client_error("ConditionalCheckFailedException")
+        self.items[Item["cacheKey"]] = dict(Item, sessions=dict(Item["sessions"]))
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None, **request):
+        item, values = self.items.get(Key["cacheKey"]), ExpressionAttributeValues
+        if item is None:
+            raise client_error("ConditionalCheckFailedException")
+        if UpdateExpression.startswith("add subscribers :c"):
+            if item["leaseUntil"] < values[":now"] or "done" in item:
+                raise client_error("ConditionalCheckFailedException")
+            item["subscribers"] = item.get("subscribers", set()) | values[":c"]
+            if ":s" in values:
+                item["sessions"][request["ExpressionAttributeNames"]["#cid"]] = values[":s"]
+        elif UpdateExpression == "add attached :c":
+            if values[":cid"] not in item.get("subscribers", set()):
+                raise client_error("ConditionalCheckFailedException")
+            item["attached"] = item.get("attached", set()) | values[":c"]
+        elif UpdateExpression.startswith("delete subscribers :c"):
+            if values[":cid"] in item.get("attached", set()) or "done" in item:
+                raise client_error("ConditionalCheckFailedException")
+            item["subscribers"] = item.get("subscribers", set()) - values[":c"]
+            item["sessions"].pop(values[":cid"], None)
+        elif UpdateExpression.startswith("set leaseUntil"):
+            if "done" in item:
+                raise client_error("ConditionalCheckFailedException")
+            item["leaseUntil"] = item["expiresAt"] = values[":l"]
+        else:
+            item.update(done=True, leaseUntil=0)
+        return {"Attributes": dict(item)}
+
+    def get_item(self, Key, ProjectionExpression=None, ConsistentRead=False):
+        if self.on_read:
+            self.on_read(self)
+        item = self.items.get(Key["cacheKey"])
+        return {"Item": dict(item)} if item else {}
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def flight(clock):
+    return single_flight.SingleFlight(FakeLeaseTable(), lease_seconds=30, follower_wait_seconds=10,
+                                      clock=clock, sleep=clock.sleep)
+
+def test_second_request_follows_the_first(flight):
+    assert flight.join(KEY, "a") == single_flight.LEADER
+    assert flight.join(KEY, "b") == single_flight.FOLLOWER
+    assert flight.subscribers(KEY) == {"b": None}
+
+def test_follower_session_turn_is_handed_to_the_leader(flight):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b", {"sessionToken": "token-b", "turn": 3, "bedrockSessionId": "ignored"})
+    flight.join(KEY, "c")
+
+    assert flight.release(KEY) == {"b": {"sessionToken": "token-b", "turn": 3}, "c": None}
+
+def test_follower_waits_until_the_leader_attaches_it(flight, clock):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b")
+
+    def leader_attaches(table):
+        if clock.now >= 1000.2:
+            flight.attach(KEY, "b")
+    flight.table.on_read = leader_attaches
+
+    assert flight.wait_for_leader(KEY, "b")
+    assert clock.now < 1001
+
+def test_follower_of_a_crashed_leader_withdraws_once_the_lease_lapses(flight, clock):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b")
+    clock.now += 31
+
+    assert not flight.wait_for_leader(KEY, "b")
+    assert flight.subscribers(KEY) == {}
+    # The next identical prompt leads instead of following the dead leader
+    assert flight.join(KEY, "c") == single_flight.LEADER
+
+def test_follower_wait_is_bounded_while_the_leader_renews(flight, clock):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b")
+    flight.table.on_read = lambda table: flight.heartbeat(KEY)
+
+    assert not flight.wait_for_leader(KEY, "b")
+    assert 1009 < clock.now <= 1010
+    # The leader no longer attaches a follower that withdrew
+    assert not flight.attach(KEY, "b")
+
+def test_follower_attached_while_withdrawing_is_served_by_the_leader(flight, clock):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b")
+    clock.now += 31
+    flight.attach(KEY, "b")
+
+    assert not flight.withdraw(KEY, "b")
+    assert flight.wait_for_leader(KEY, "b")
+
+def test_release_hands_the_remaining_subscribers_to_the_leader(flight):
+    flight.join(KEY, "a")
+    flight.join(KEY, "b")
+
+    assert flight.release(KEY) == {"b": None}
+    assert flight.wait_for_leader(KEY, "b")
+    assert flight.join(KEY, "c") == single_flight.LEADER
+
+def test_heartbeat_keeps_the_lease_past_its_first_term(flight, clock):
+    flight.join(KEY, "a")
+    clock.now += 25
+    flight.heartbeat(KEY)
+    clock.now += 25
+
+    assert flight.join(KEY, "b") == single_flight.FOLLOWER
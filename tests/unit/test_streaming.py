@@ -0,0 +1,134 @@
+import json
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from tests.unit.conftest import load_lambda_module
+
+streaming = load_lambda_module("invoke_bedrock_agent", "streaming")
+
+class ImmediatePool:
+    """Runs each submitted send on the calling thread, so frames are posted in order."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def frames(posted):
+    return [json.loads(payload) for payload in posted]
+
+def test_first_delta_is_sent_at_once_and_later_ones_are_coalesced():
+    sent, clock = [], Clock()
+    coalescer = streaming.FrameCoalescer(sent.append, flush_bytes=10, flush_interval_ms=100, clock=clock)
+
+    coalescer.add("Hi")
+    coalescer.add(" there")
+    assert sent == ["Hi"]
+
+    coalescer.add(" friend")
+    assert sent == ["Hi", " there friend"]
+
+def test_buffered_text_is_due_after_the_interval():
+    sent, clock = [], Clock()
+    coalescer = streaming.FrameCoalescer(sent.append, flush_bytes=1000, flush_interval_ms=100, clock=clock)
+    coalescer.add("a")
+    coalescer.add("b")
+
+    clock.now = 0.05
+    assert not coalescer.due()
+    clock.now = 0.1
+    assert coalescer.due()
+    coalescer.flush()
+    assert sent == ["a", "b"]
+    assert coalescer.stats()["framesSaved"] == 0
+
+def test_pipeline_numbers_frames_in_submission_order():
+    posted = []
+    pipeline = streaming.SendPipeline(posted.append, pool=ImmediatePool())
+    pipeline.submit("a")
+    pipeline.submit(None, frame_type="end")
+
+    assert pipeline.close() == []
+    assert frames(posted) == [{"type": "response", "content": "a", "seq": 1},
+                              {"type": "end", "content": None, "seq": 2}]
+
+def test_gone_connection_drops_later_frames():
+    def post(payload):
+        raise streaming.ConnectionGone()
+    pipeline = streaming.SendPipeline(post, pool=ImmediatePool())
+    pipeline.submit("a")
+    pipeline.submit("b")
+
+    assert pipeline.gone.is_set()
+    assert pipeline.frames_dropped == 1
+    assert pipeline.close() == []
+
+def test_close_returns_send_errors_instead_of_raising():
+    def post(payload):
+        raise ValueError("throttled")
+    pipeline = streaming.SendPipeline(post, pool=ImmediatePool())
+    pipeline.submit("a")
+
+    errors = pipeline.close()
+    assert [str(error) for error in errors] == ["throttled"]
+
+def test_close_keeps_the_exception_already_in_flight():
+    release = threading.Event()
+
+    def post(payload):
+        release.wait(5)
+        raise ValueError("send failed")
+    pipeline = streaming.SendPipeline(post)
+
+    with pytest.raises(RuntimeError, match="stream failed"):
+        try:
+            pipeline.submit("a")
+            release.set()
+            raise RuntimeError("stream failed")
+        finally:
+            pipeline.close()
+    assert len(pipeline.errors) == 1
+
+def test_fan_out_replays_missed_frames_to_a_late_connection():
+    posted = {}
+
+    def make_pipeline(connection_id):
+        posted[connection_id] = []
+        return streaming.SendPipeline(posted[connection_id].append, pool=ImmediatePool())
+    fan_out = streaming.FanOut(make_pipeline)
+    fan_out.add_connection("first")
+    fan_out.submit("a")
+    fan_out.submit("b")
+    fan_out.add_connection("late", after_seq=1)
+    fan_out.submit(None, frame_type="end")
+
+    assert fan_out.close() == []
+    assert [frame["seq"] for frame in frames(posted["first"])] == [1, 2, 3]
+    assert [frame["seq"] for frame in frames(posted["late"])] == [2, 3]
+
+def test_background_reader_yields_idle_and_reraises_errors():
+    def events():
+        yield "a"
+        blocked.wait(5)
+        raise ValueError("stream broke")
+    blocked = threading.Event()
+
+    reader = streaming.read_in_background(events(), idle_timeout=0.01)
+    assert next(reader) == "a"
+    assert next(reader) is streaming.IDLE
+    blocked.set()
+    with pytest.raises(ValueError, match="stream broke"):
+        for item in reader:
+            pass
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from tests.unit.conftest import client_error, load_lambda_module
+
+trigger = load_lambda_module("trigger_bedrock_agent_creation", "index")
+
+class FakeStepFunctions:
+    def __init__(self, error=None):
+        self.error = error
+        self.started = []
+
+    def start_execution(self, **request):
+        if self.error:
+            raise self.error
+        self.started.append(request)
+        return {"executionArn": f"arn:aws:states:::execution:{request['name']}"}
+
+def records(*message_ids):
+    return [{
+        "messageId": message_id,
+        "body": json.dumps({"detail": {"type": "BEDROCK_AGENT", "chatbotId": message_id}})
+    } for message_id in message_ids]
+
+@pytest.fixture
+def batch(monkeypatch):
+    monkeypatch.setattr(trigger, "execution_input", lambda detail: {"chatbotId": detail["chatbotId"]})
+    return records("m-1", "m-2")
+
+def test_batch_starts_one_execution_named_after_its_messages(monkeypatch, batch):
+    stepfunctions = FakeStepFunctions()
+    monkeypatch.setattr(trigger, "stepfunctions", stepfunctions)
+
+    assert trigger.start_bulk_provisioning(batch) == {"batchItemFailures": []}
+    assert trigger.start_bulk_provisioning(list(reversed(batch))) == {"batchItemFailures": []}
+    assert stepfunctions.started[0]["name"] == stepfunctions.started[1]["name"]
+
+def test_redelivered_batch_is_not_a_failure(monkeypatch, batch):
+    monkeypatch.setattr(trigger, "stepfunctions", FakeStepFunctions(client_error("ExecutionAlreadyExists")))
+
+    assert trigger.start_bulk_provisioning(batch) == {"batchItemFailures": []}
+
+def test_failed_start_returns_every_message(monkeypatch, batch):
+    monkeypatch.setattr(trigger, "stepfunctions", FakeStepFunctions(client_error("ThrottlingException")))
+
+    assert trigger.start_bulk_provisioning(batch) == {
+        "batchItemFailures": [{"itemIdentifier": "m-1"}, {"itemIdentifier": "m-2"}]
+    }
+
+def test_poison_records_fail_alone_and_the_rest_are_provisioned(monkeypatch):
+    stepfunctions = FakeStepFunctions()
+    monkeypatch.setattr(trigger, "stepfunctions", stepfunctions)
+
+    def execution_input(detail):
+        if detail["chatbotId"] == "m-3":
+            raise client_error("SlowDown", operation="PutObject")
+        return {"chatbotId": detail["chatbotId"]}
+    monkeypatch.setattr(trigger, "execution_input", execution_input)
+    batch = records("m-1", "m-3", "m-4")
+    batch.insert(1, {"messageId": "m-2", "body": "not json"})
+
+    assert trigger.start_bulk_provisioning(batch) == {
+        "batchItemFailures": [{"itemIdentifier": "m-2"}, {"itemIdentifier": "m-3"}]
+    }
+    assert json.loads(stepfunctions.started[0]["input"]) == {"chatbots": [{"chatbotId": "m-1"}, {"chatbotId": "m-4"}]}
+
+@pytest.mark.parametrize("documents, backend", [
+    (["https://example.com/faq.html", {"s3Uri": "s3://docs/Refunds.TXT", "size": 100}], "lite"),
+    (["https://example.com/faq.html", "s3://docs/manual.pdf"], "opensearch"),
+    ([{"url": "https://example.com/download?id=7", "name": "prices.xlsx"}], "opensearch"),
+    (["https://example.com/faq"], "opensearch"),
+    ([{"s3Uri": "s3://docs/notes.md", "size": 10 * 1024 * 1024}], "opensearch"),
+])
+def test_auto_backend_picks_lite_only_for_small_text_documents(documents, backend):
+    assert trigger.knowledge_base_backend({"documents": documents}) == backend